@@ -0,0 +1,47 @@
+"""
+Production settings for HotelApp: the development settings, with templates
+compiled once per process and, for a public-facing deployment, without the
+apps and middleware only staff use.
+
+``gunicorn.conf.py`` selects this module. With its ``preload_app`` the
+master process imports the project and warms it up (``hotel/warmup.py``)
+before forking, so the workers share that memory copy-on-write instead of
+each building its own.
+
+``HOTEL_PUBLIC_SITE=1`` leaves out the admin, the staff pages, sessions,
+authentication and messages, none of which the public pages use: guests are
+identified by phone number, not by logging in. Run the admin from a separate
+deployment without it.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import HOTEL_PUBLIC_SITE, INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+HOTEL_WARM_UP = True
+
+# Django caches compiled templates already when DEBUG is off; spelled out so
+# that this holds whatever DEBUG is, and for hotel/warmup.py to fill.
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', ['django.template.loaders.app_directories.Loader']),
+        ],
+    },
+}]
+
+if HOTEL_PUBLIC_SITE:
+    # Their middleware and context processors are named within them.
+    STAFF_APPS = (
+        'django.contrib.admin',
+        'django.contrib.auth',
+        'django.contrib.contenttypes',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+    )
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in STAFF_APPS]
+    MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith(STAFF_APPS)]
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        name for name in TEMPLATES[0]['OPTIONS']['context_processors'] if not name.startswith(STAFF_APPS)
+    ]
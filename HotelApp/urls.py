@@ -14,10 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 
 urlpatterns = [
     path('', include('hotel.urls')),
-    path('admin/', admin.site.urls),
 ]
+
+if not settings.HOTEL_PUBLIC_SITE:
+    from django.contrib import admin
+    urlpatterns.append(path('admin/', admin.site.urls))
@@ -0,0 +1,33 @@
+"""
+Performance benchmarks for the hotel app.
+
+Every module is runnable on its own, e.g. ``python -m benchmarks.room_search``.
+Benchmarks use their own SQLite file (``BENCH_DB``, by default
+``hotel_bench.sqlite3`` in the temp directory) so seeded data survives between
+runs and ``db.sqlite3`` is never touched.
+"""
+import os
+import tempfile
+
+
+def setup(db_name=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HotelApp.settings')
+    # One process: the shared file cache could hold another database's pages.
+    os.environ.setdefault('CACHE_BACKEND', 'locmem')
+    from django.conf import settings
+
+    name = db_name or os.environ.get('BENCH_DB') or os.path.join(tempfile.gettempdir(), 'hotel_bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = name
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return name
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,76 @@
+"""
+Occupancy and revenue analytics benchmark.
+
+    python -m benchmarks.analytics --rooms 2000 --years 5
+
+Seeds its own database (``hotel_analytics_bench.sqlite3`` in the temp
+directory) with ``--years`` of history for ``--rooms`` rooms, then times
+``analytics.report()`` over the whole history: cold (empty cache) for each
+grouping, warm, and after a booking lands (one month counted again). Exits
+non-zero when the cold report is over budget.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import setup
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rooms', type=int, default=2_000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1000.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    setup(os.environ.get('BENCH_DB') or os.path.join(tempfile.gettempdir(), 'hotel_analytics_bench.sqlite3'))
+    from django.core.cache import cache
+    from hotel import analytics
+    from hotel.models import Booking, Guest, Room, RoomNight
+    from .datagen import ensure_seeded
+
+    # Stays average 4 nights and the year averages 67.5% occupancy.
+    bookings = int(args.rooms * args.years * 365 * 0.675 / 4)
+    started = time.perf_counter()
+    if ensure_seeded(args.rooms, bookings, seed=args.seed):
+        print(f'seeded {args.rooms} rooms / {bookings} bookings in {time.perf_counter() - started:.1f}s')
+    first = RoomNight.objects.order_by('date').values_list('date', flat=True).first()
+    end = date.today() + timedelta(days=1)
+    start = max(first, end - timedelta(days=round(args.years * 365.25)))
+    print(f'{RoomNight.objects.count()} room nights, reporting {start} to {end}')
+
+    worst = 0
+    for by in [None, *analytics.GROUPS]:
+        cache.clear()
+        (days, totals), cold = timed(analytics.report, start, end, by=by)
+        _, warm = timed(analytics.report, start, end, by=by)
+        worst = max(worst, cold)
+        total = totals[0] if by is None else max(totals, key=lambda row: row['nights'])
+        print(f'report by={by}: rows={len(days)} cold={cold:.0f}ms warm={warm:.0f}ms '
+              f'occupancy={total["occupancy"]} adr={total["adr"]} revpar={total["revpar"]}')
+
+    # A booking invalidates only the months its stay covers.
+    room = Room.objects.order_by('pk').first()
+    check_in = room.get_available_periods()[0][0]
+    Booking.objects.reserve(room, check_in, check_in + timedelta(days=1), guest=Guest.objects.first())
+    _, updated = timed(analytics.report, start, end)
+    print(f'report after a new booking: {updated:.0f}ms')
+
+    if worst > args.budget_ms:
+        print(f'FAIL: cold report took {worst:.0f}ms, over the {args.budget_ms:.0f}ms budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
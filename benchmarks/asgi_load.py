@@ -0,0 +1,209 @@
+"""
+WSGI vs ASGI load comparison.
+
+    python -m benchmarks.asgi_load --bookings 20000 --workers 2 --concurrency 32
+
+Seeds its own database (``hotel_load.sqlite3`` in the temp directory), then
+for each profile starts gunicorn on it and drives a mixed workload for
+``--duration`` seconds:
+
+* ``wsgi`` -- ``gunicorn HotelApp.wsgi`` with sync workers, every view sync.
+* ``asgi`` -- ``gunicorn HotelApp.asgi -k uvicorn_worker.UvicornWorker``,
+  with the async views of ``hotel/views/asynchronous.py``.
+
+``--concurrency`` client coroutines each send one request at a time, on a
+new connection (the sync worker closes it after every response anyway).
+Reads are room searches, room pages, the API and guest booking lists; a
+``--writes`` fraction of requests post a booking. Prints requests per
+second and p50/p99 latency per profile. The client shares the machine with
+the server, so compare profiles run together, not across machines.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from . import percentile, setup
+
+PROFILES = {
+    'wsgi': ['HotelApp.wsgi:application'],
+    'asgi': ['HotelApp.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+# Any 32 letters: CSRF only checks that the cookie and form tokens match.
+CSRF_TOKEN = 'loadtest' * 4
+
+
+def read_request(rng, room_ids, phones):
+    """A weighted random read: path and query parameters."""
+    check_in = date.today() + timedelta(days=rng.randrange(30))
+    check_out = check_in + timedelta(days=rng.randint(1, 5))
+    return rng.choices([
+        ('/rooms/', {'room_type': rng.choice(['single', 'double', 'suite'])}),
+        ('/rooms/', {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}),
+        (f'/rooms/{rng.choice(room_ids)}/', {}),
+        ('/api/rooms/', {'min_capacity': rng.randint(1, 4), 'available': 'true'}),
+        (f'/api/rooms/{rng.choice(room_ids)}/periods/', {}),
+        ('/bookings/', {'phone': rng.choice(phones)}),
+    ], weights=[3, 2, 3, 1, 2, 2])[0]
+
+
+def write_request(rng, room_ids):
+    """A booking form post, for one night that may already be taken."""
+    check_in = date.today() + timedelta(days=rng.randrange(30))
+    n = rng.randrange(10 ** 6)
+    return f'/rooms/{rng.choice(room_ids)}/book/', {
+        'csrfmiddlewaretoken': CSRF_TOKEN,
+        'first_name': 'Load', 'last_name': f'Guest{n}',
+        'email': f'load{n}@bench.example', 'phone': f'+380{600000000 + n}',
+        'check_in_date': check_in.isoformat(),
+        'check_out_date': (check_in + timedelta(days=1)).isoformat(),
+    }
+
+
+async def send(port, method, path, params):
+    """Status code of one HTTP/1.1 request on a fresh connection."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = b''
+    headers = ['Host: localhost', 'Connection: close']
+    if method == 'GET':
+        if params:
+            path += '?' + urlencode(params)
+    else:
+        body = urlencode(params).encode()
+        headers += [
+            'Content-Type: application/x-www-form-urlencoded',
+            f'Content-Length: {len(body)}',
+            f'Cookie: csrftoken={CSRF_TOKEN}',
+        ]
+    writer.write('\r\n'.join([f'{method} {path} HTTP/1.1', *headers, '', '']).encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def drive(port, args, room_ids, phones, seed):
+    """Run the workload for ``args.duration`` seconds after a warmup:
+    ``(latencies in ms, {status: count}, failures)``."""
+    started = time.perf_counter()
+    warm_until = started + args.warmup
+    stop_at = warm_until + args.duration
+    latencies, statuses, failures = [], {}, []
+
+    async def client(n):
+        rng = random.Random(f'{seed}:{n}')
+        while (now := time.perf_counter()) < stop_at:
+            if rng.random() < args.writes:
+                method, (path, params) = 'POST', write_request(rng, room_ids)
+            else:
+                method, (path, params) = 'GET', read_request(rng, room_ids, phones)
+            try:
+                status = await send(port, method, path, params)
+            except OSError as e:
+                failures.append(repr(e))
+                continue
+            if now >= warm_until:
+                latencies.append((time.perf_counter() - now) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(client(n) for n in range(args.concurrency)))
+    return latencies, statuses, failures
+
+
+def wait_for_port(port, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'server exited with {server.returncode}')
+        try:
+            asyncio.run(send(port, 'GET', '/rooms/', {}))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+def run_profile(name, args, db_name, room_ids, phones):
+    # Every profile starts from the seeded data: they send the same requests,
+    # so the second would otherwise find the first one's rooms booked.
+    profile_db = os.path.join(tempfile.mkdtemp(), f'hotel_load_{name}.sqlite3')
+    shutil.copyfile(db_name, profile_db)
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'HotelApp.settings',
+        'DATABASE_URL': f'sqlite:///{profile_db}',
+        # Shared by the workers, and only by this profile's.
+        'CACHE_BACKEND': 'file',
+        'CACHE_LOCATION': os.path.join(os.path.dirname(profile_db), 'cache'),
+        'HOTEL_PROFILE_LOG': os.path.join(tempfile.gettempdir(), f'hotel_load_{name}.jsonl'),
+    }
+    command = [
+        sys.executable, '-m', 'gunicorn', *PROFILES[name],
+        '--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers),
+        '--backlog', '2048', '--log-level', 'warning',
+    ]
+    server = subprocess.Popen(command, env=env)
+    try:
+        wait_for_port(args.port, server)
+        latencies, statuses, failures = asyncio.run(drive(args.port, args, room_ids, phones, args.seed))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+        'statuses': statuses,
+        'connection_errors': len(failures),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bookings', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds measured per profile.")
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--writes', type=float, default=0.1, help="Fraction of requests that book.")
+    parser.add_argument('--profile', action='append', choices=list(PROFILES), help="Run only these.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    db_name = os.environ.get('BENCH_DB') or os.path.join(tempfile.gettempdir(), 'hotel_load.sqlite3')
+    setup(db_name)
+    from django.db import connection
+    from hotel.models import Guest, Room
+    from .datagen import ensure_seeded
+
+    rooms = max(10, args.bookings // 100)
+    started = time.perf_counter()
+    if ensure_seeded(rooms, args.bookings, seed=args.seed):
+        print(f'seeded {rooms} rooms / {args.bookings} bookings in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+    room_ids = list(Room.objects.values_list('pk', flat=True))
+    phones = list(Guest.objects.exclude(phone=None).order_by('pk').values_list('phone', flat=True)[:1000])
+    connection.close()
+
+    results = {}
+    for name in args.profile or PROFILES:
+        results[name] = run_profile(name, args, db_name, room_ids, phones)
+        print(f'{name}: {json.dumps(results[name])}', file=sys.stderr)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
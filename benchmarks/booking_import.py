@@ -0,0 +1,91 @@
+"""
+Bulk booking import throughput benchmark.
+
+    python -m benchmarks.booking_import --rows 1000000
+
+Writes a deterministic CSV feed (back-to-back stays per room, mostly checked
+out history, about 1% of them overlapping on purpose), imports it with ``manage.py import_bookings``
+into a fresh database and reports rows per second. Exits non-zero when the
+rate is below ``--target``.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import setup
+
+
+def write_feed(path, rows, rooms, guests, seed):
+    from hotel.feeds import FIELDS
+
+    rng = random.Random(seed)
+    today = date.today()
+    # A stay and the gap before it average 4 days, so each room's timeline
+    # ends about two months out; stays that have ended are checked out.
+    start = today - timedelta(days=max(0, int(rows / rooms * 4) - 60))
+    days = [start + timedelta(days=rng.randrange(7)) for _ in range(rooms)]
+    with open(path, 'w', newline='') as feed:
+        writer = csv.writer(feed)
+        writer.writerow(FIELDS)
+        for n in range(rows):
+            room = n % rooms
+            check_in = days[room] + timedelta(days=rng.randrange(3))
+            if rng.random() < 0.01:
+                check_in -= timedelta(days=2)
+            check_out = check_in + timedelta(days=rng.randint(1, 5))
+            days[room] = max(days[room], check_out)
+            guest = rng.randrange(guests)
+            writer.writerow([
+                f'{room:06d}', f'guest{guest}@feed.example', f'Guest{guest}', f'Feed{guest % 997}',
+                f'+380{600000000 + guest}', check_in.isoformat(), check_out.isoformat(),
+                'checked_out' if check_out < today else '', rng.choice(['agent', 'phone']), '',
+            ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--rooms', type=int, default=2_000)
+    parser.add_argument('--guests', type=int, default=200_000)
+    parser.add_argument('--chunk-size', type=int, default=5_000)
+    parser.add_argument('--target', type=float, default=5_000, help="Minimum rows per second.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    db_name = os.path.join(tempfile.gettempdir(), 'hotel_import_bench.sqlite3')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
+    setup(db_name)
+    from django.core.management import call_command
+    from hotel.models import Booking, Hotel, Room
+
+    hotel = Hotel.objects.current()
+    Room.objects.bulk_create(
+        Room(hotel=hotel, room_number=f'{i:06d}', room_type=Room.RoomType.DOUBLE, capacity=2, price_per_night=1200)
+        for i in range(args.rooms)
+    )
+    feed = os.path.join(tempfile.gettempdir(), 'hotel_import_bench.csv')
+    started = time.perf_counter()
+    write_feed(feed, args.rows, args.rooms, args.guests, args.seed)
+    print(f'wrote {args.rows} rows in {time.perf_counter() - started:.1f}s')
+
+    started = time.perf_counter()
+    call_command('import_bookings', feed, '--chunk-size', str(args.chunk_size), '--rejects', feed + '.rejects.jsonl')
+    elapsed = time.perf_counter() - started
+    rate = args.rows / elapsed
+    print(f'booking import: rows={args.rows} imported={Booking.objects.count()} '
+          f'time={elapsed:.1f}s rate={rate:.0f} rows/s')
+    if rate < args.target:
+        print(f'FAIL: {rate:.0f} rows/s is below the {args.target:.0f} rows/s target')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Concurrent booking stress test.
+
+    python -m benchmarks.booking_stress --workers 8 --requests 400
+
+Several processes POST booking forms for the same rooms at the same time,
+each with its own database connection, like gunicorn workers would. Guests
+come back for more bookings, sometimes with a new phone number. With one
+room (the default) most requests contend for the same dates; ``--rooms 200``
+makes nearly every request a booking write. Fails if two active bookings
+overlap or throughput drops below ``--min-rps``.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import setup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help="total POSTs across all workers")
+    parser.add_argument('--min-rps', type=float, default=20.0)
+    parser.add_argument('--rooms', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    db_name = os.path.join(tempfile.mkdtemp(), 'stress.sqlite3')
+    setup(db_name)
+    from django.db import connection
+    from hotel.models import Hotel, Room
+
+    hotel = Hotel.objects.current()
+    rooms = Room.objects.bulk_create(
+        Room(hotel=hotel, room_number=f'S{n}', room_type='double', capacity=2, price_per_night=1000)
+        for n in range(args.rooms)
+    )
+    room_ids = [room.pk for room in rooms]
+    connection.close()
+
+    per_worker = args.requests // args.workers
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.workers) as pool:
+        results = pool.starmap(_worker, [(db_name, room_ids, per_worker, seed) for seed in range(args.workers)])
+    elapsed = time.perf_counter() - started
+
+    statuses, worker_metrics = {}, {}
+    for worker_statuses, snapshot in results:
+        for status, count in worker_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+        for name, value in snapshot.items():
+            merge = max if name.endswith('max_seconds') else lambda a, b: a + b
+            worker_metrics[name] = merge(worker_metrics.get(name, 0), value)
+
+    overlaps = sum(_count_overlaps(room_id) for room_id in room_ids)
+    total = per_worker * args.workers
+    rps = total / elapsed
+    from hotel.models import Booking
+
+    print(f'{total} POSTs in {elapsed:.2f}s ({rps:.0f} req/s), responses: {statuses}, '
+          f'bookings: {Booking.objects.count()}')
+    print('metrics: ' + ', '.join(f'{name}={value:g}' for name, value in worker_metrics.items()))
+
+    failed = False
+    if overlaps:
+        print(f'FAIL: {overlaps} overlapping active bookings')
+        failed = True
+    if rps < args.min_rps:
+        print(f'FAIL: {rps:.0f} req/s is below {args.min_rps:.0f}')
+        failed = True
+    return 1 if failed else 0
+
+
+def _worker(db_name, room_ids, count, seed):
+    setup(db_name)
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from hotel import metrics
+
+    setup_test_environment()
+    client = Client()
+    rng = random.Random(seed)
+    statuses = {}
+    for n in range(count):
+        check_in = date.today() + timedelta(days=rng.randrange(25))
+        guest = rng.randrange(20)
+        response = client.post(f'/rooms/{rng.choice(room_ids)}/book/', {
+            'first_name': 'Stress',
+            'last_name': f'Worker{seed}',
+            'email': f'stress{seed}-{guest}@bench.example',
+            'phone': f'050{guest:03d}{rng.randrange(10000):04d}',
+            'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=rng.randint(1, 3))).isoformat(),
+        })
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses, metrics.snapshot()
+
+
+def _count_overlaps(room_id):
+    from hotel.models import Booking
+
+    bookings = list(Booking.objects.active().filter(room_id=room_id).order_by('check_in_date')
+                    .values_list('check_in_date', 'check_out_date'))
+    return sum(1 for (_, end), (start, _) in zip(bookings, bookings[1:]) if start < end)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Deterministic synthetic data for benchmarks.
+
+Rooms get back-to-back stays separated by random gaps, running back in
+time from about ``horizon_days`` ahead, so the booking table has the same
+shape as a busy hotel: mostly checked-out history, some guests in house, and
+confirmed future stays. Gaps follow the season (see ``occupancy``), so
+summer and the New Year holidays are nearly full and January is quiet.
+"""
+import math
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from hotel.models import Booking, Guest, Hotel, RatePlan, Room, RoomNight
+
+BATCH_SIZE = 5000
+PRICES = {
+    Room.RoomType.SINGLE: 800,
+    Room.RoomType.DOUBLE: 1200,
+    Room.RoomType.SUITE: 2500,
+    Room.RoomType.FAMILY: 1800,
+    Room.RoomType.DELUXE: 3200,
+}
+CAPACITIES = {
+    Room.RoomType.SINGLE: 1,
+    Room.RoomType.DOUBLE: 2,
+    Room.RoomType.SUITE: 3,
+    Room.RoomType.FAMILY: 5,
+    Room.RoomType.DELUXE: 2,
+}
+
+
+def occupancy(day):
+    """Target share of a room's nights that are booked around ``day``."""
+    if (day.month, day.day) >= (12, 20) or (day.month, day.day) <= (1, 7):
+        return 0.9
+    # 90% in mid-July, 45% in mid-January.
+    return 0.675 + 0.225 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 196) / 365.25)
+
+
+def seed(rooms=100, bookings=1000, guests=None, seed=0, horizon_days=60):
+    """Fill an empty database. Returns the number of bookings created."""
+    rng = random.Random(seed)
+    today = date.today()
+    guests = guests or max(1, bookings // 10)
+    per_room = max(1, bookings // rooms)
+
+    room_types = list(PRICES)
+    hotel = Hotel.objects.current()
+    Room.objects.bulk_create(
+        (
+            Room(
+                hotel=hotel,
+                room_number=f'{i:06d}',
+                room_type=(room_type := rng.choice(room_types)),
+                capacity=CAPACITIES[room_type],
+                price_per_night=Decimal(PRICES[room_type] + rng.randrange(0, 500, 50)),
+                description=f'{room_type.label} room on floor {i // 100 + 1}',
+            )
+            for i in range(rooms)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Guest.objects.bulk_create(
+        (
+            Guest(
+                first_name=f'Guest{i}',
+                last_name=f'Bench{i % 997}',
+                email=f'guest{i}@bench.example',
+                phone=f'+380{500000000 + i}',
+                phone_normalized=f'+380{500000000 + i}',
+            )
+            for i in range(guests)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    room_ids = list(Room.objects.order_by('pk').values_list('pk', flat=True))
+    guest_ids = list(Guest.objects.order_by('pk').values_list('pk', flat=True))
+
+    batch = []
+    created = 0
+    for room_id in room_ids:
+        day = today + timedelta(days=horizon_days - rng.randrange(7))
+        for _ in range(per_room):
+            nights = rng.randint(1, 7)
+            # Gaps averaging nights * (1 - p) / p keep a share p of nights sold.
+            target = occupancy(day)
+            check_out = day - timedelta(days=round(rng.expovariate(target / (nights * (1 - target)))))
+            check_in = check_out - timedelta(days=nights)
+            day = check_in
+            batch.append(Booking(
+                hotel=hotel,
+                room_id=room_id,
+                guest_id=rng.choice(guest_ids),
+                check_in_date=check_in,
+                check_out_date=check_out,
+                status=_status(rng, today, check_in, check_out),
+                booking_channel=rng.choice(Booking.BookingChannel.values),
+            ))
+            if len(batch) >= BATCH_SIZE:
+                Booking.objects.bulk_create(batch)
+                RoomNight.objects.sync(batch, created=True)
+                created += len(batch)
+                batch = []
+    Booking.objects.bulk_create(batch)
+    RoomNight.objects.sync(batch, created=True)
+    return created + len(batch)
+
+
+def ensure_seeded(rooms, bookings, guests=None, **kwargs):
+    """Seed unless the database already holds a dataset of this size."""
+    if (
+        Room.objects.count() == rooms and Booking.objects.count() >= bookings * 0.9
+        and (guests is None or Guest.objects.count() == guests)
+    ):
+        return False
+    Booking.objects.all().delete()
+    Guest.objects.all().delete()
+    Room.objects.all().delete()
+    seed(rooms, bookings, guests=guests, **kwargs)
+    return True
+
+
+def ensure_rate_plan(name='Benchmark'):
+    """A plan with one rule of each kind, unless it exists: weekend and
+    summer surcharges, a holiday supplement and an occupancy premium."""
+    plan, created = RatePlan.objects.get_or_create(name=name)
+    if created:
+        year = date.today().year
+        plan.rules.create(weekdays='56', value=15)
+        for y in (year - 1, year, year + 1):
+            plan.rules.create(start_date=date(y, 6, 1), end_date=date(y, 9, 1), value=20)
+            plan.rules.create(start_date=date(y, 12, 24), end_date=date(y + 1, 1, 2), adjustment='amount', value=500)
+        plan.rules.create(min_occupancy=80, value=10)
+    return plan
+
+
+def _status(rng, today, check_in, check_out):
+    if rng.random() < 0.05:
+        return Booking.BookingStatus.CANCELED
+    if check_out < today:
+        return Booking.BookingStatus.CHECKED_OUT
+    if check_in <= today:
+        return Booking.BookingStatus.CHECKED_IN
+    return Booking.BookingStatus.CONFIRMED
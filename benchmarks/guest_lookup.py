@@ -0,0 +1,79 @@
+"""
+Guest booking lookup by phone benchmark.
+
+    python -m benchmarks.guest_lookup --guests 1000000
+
+Seeds its own database (``hotel_guest_bench.sqlite3`` in the temp directory)
+with a million guests, then renders ``BookingListView`` for random guests'
+phones written the ways people type them. Exits non-zero when p95 is over
+budget or a page takes more than one query.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from . import percentile, setup
+
+FORMATS = [
+    lambda digits: f'+380{digits}',
+    lambda digits: f'0{digits}',
+    lambda digits: f'(0{digits[:2]}) {digits[2:5]}-{digits[5:7]}-{digits[7:]}',
+    lambda digits: f'00380 {digits[:2]} {digits[2:]}',
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rooms', type=int, default=1_000)
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--guests', type=int, default=1_000_000)
+    parser.add_argument('--runs', type=int, default=500)
+    parser.add_argument('--budget-ms', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    setup(os.environ.get('BENCH_DB') or os.path.join(tempfile.gettempdir(), 'hotel_guest_bench.sqlite3'))
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+    from hotel.models import Guest, Hotel
+    from hotel.views.booking import BookingListView
+    from .datagen import ensure_seeded
+
+    started = time.perf_counter()
+    if ensure_seeded(args.rooms, args.bookings, guests=args.guests, seed=args.seed):
+        print(f'seeded {args.guests} guests / {args.bookings} bookings in {time.perf_counter() - started:.1f}s')
+
+    rng = random.Random(args.seed)
+    phones = list(Guest.objects.order_by('?').values_list('phone', flat=True)[:args.runs])
+    view = BookingListView.as_view()
+    factory = RequestFactory()
+    # What HotelMiddleware resolves for an unprefixed URL, once.
+    hotel = Hotel.objects.current()
+    samples, found, max_queries = [], 0, 0
+    for phone in phones:
+        typed = rng.choice(FORMATS)(phone.removeprefix('+380'))
+        request = factory.get('/bookings/', {'phone': typed})
+        request.hotel = hotel
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+            response.render()
+        samples.append((time.perf_counter() - started) * 1000)
+        found += bool(response.context_data['bookings'])
+        max_queries = max(max_queries, len(queries))
+
+    p50, p95 = percentile(samples, 50), percentile(samples, 95)
+    print(f'guest lookup: runs={len(samples)} with bookings={found} queries/page<={max_queries} '
+          f'p50={p50:.1f}ms p95={p95:.1f}ms max={max(samples):.1f}ms')
+    if p95 > args.budget_ms or max_queries > 1:
+        print(f'FAIL: p95 {p95:.1f}ms over {args.budget_ms:.0f}ms budget or more than one query per page')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Booking POST latency with post-booking work inline vs queued, and worker
+throughput per job type.
+
+    python -m benchmarks.jobs --bookings 300 --threads 2
+
+Posts ``--bookings`` booking forms, each for a free room night, twice:
+
+* ``inline`` -- ``HOTEL_JOBS_EAGER``: the confirmation email is sent and the
+  page cache invalidated before the response.
+* ``queued`` -- both are stored as jobs (``HOTEL_QUEUE_CACHE_INVALIDATION``),
+  then a ``--threads`` worker runs them in burst mode.
+
+Email goes to Django's in-memory backend, so the inline cost is rendering
+and building messages, not a mail server round trip; a real SMTP server
+widens the gap.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import percentile, setup
+
+
+def post_bookings(client, room_ids, count, offset):
+    latencies = []
+    for n in range(count):
+        room_id = room_ids[n % len(room_ids)]
+        check_in = date.today() + timedelta(days=offset + n // len(room_ids))
+        started = time.perf_counter()
+        response = client.post(f'/rooms/{room_id}/book/', {
+            'first_name': 'Bench', 'last_name': f'Guest{offset}-{n}',
+            'email': f'bench{offset}-{n}@bench.example', 'phone': f'+380{600000000 + offset * 10000 + n}',
+            'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=1)).isoformat(),
+        })
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 302, response.status_code
+    return latencies
+
+
+def summary(latencies):
+    return {
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bookings', type=int, default=300)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=1, help="Worker threads.")
+    args = parser.parse_args(argv)
+
+    setup(os.path.join(tempfile.mkdtemp(), 'jobs.sqlite3'))
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from hotel.jobs import Worker
+    from hotel.models import Hotel, Room
+
+    hotel = Hotel.objects.current()
+    rooms = Room.objects.bulk_create(
+        Room(hotel=hotel, room_number=f'J{n}', room_type='double', capacity=2, price_per_night=1000)
+        for n in range(args.rooms)
+    )
+    room_ids = [room.pk for room in rooms]
+    # Also switches email to the in-memory backend.
+    setup_test_environment()
+    client = Client()
+    nights = -(-args.bookings // args.rooms)
+    results = {}
+    with override_settings(HOTEL_JOBS_EAGER=True):
+        results['inline'] = summary(post_bookings(client, room_ids, args.bookings, 0))
+    with override_settings(HOTEL_QUEUE_CACHE_INVALIDATION=True):
+        results['queued'] = summary(post_bookings(client, room_ids, args.bookings, nights))
+        started = time.perf_counter()
+        stats = Worker(threads=args.threads, burst=True).run()
+        elapsed = time.perf_counter() - started
+
+    results['worker'] = {
+        name: {'done': done, 'failed': failed, 'jobs_per_s': round(done / seconds if seconds else 0, 1)}
+        for name, (done, failed, seconds) in sorted(stats.items())
+    }
+    results['worker']['elapsed_s'] = round(elapsed, 3)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Stay-window room search benchmark.
+
+    python -m benchmarks.room_search --rooms 10000 --bookings 1000000
+
+Seeds the benchmark database (once), then runs random check-in/check-out
+searches through ``RoomFilter`` the way ``RoomListView`` does: one page of
+ten rooms, sorted by the stay's total at the rates of a plan with weekend,
+seasonal and occupancy rules, plus the paginator count. Also reports how
+long compiling a year of the rate table takes, as after a rule change.
+Exits non-zero when p95 is over budget.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from . import percentile, setup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rooms', type=int, default=10_000)
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    setup()
+    from django.core.paginator import Paginator
+    from hotel.filters import RoomFilter
+    from hotel.analytics import month_starts
+    from hotel.models import Room
+    from hotel.pricing import compile_months
+    from .datagen import ensure_rate_plan, ensure_seeded
+
+    started = time.perf_counter()
+    if ensure_seeded(args.rooms, args.bookings, seed=args.seed):
+        print(f'seeded {args.rooms} rooms / {args.bookings} bookings in {time.perf_counter() - started:.1f}s')
+
+    ensure_rate_plan()
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    months = list(month_starts(today, today + timedelta(days=365)))
+    started = time.perf_counter()
+    compile_months(months)
+    print(f'rate table: compiled {len(months)} months in {(time.perf_counter() - started) * 1000:.0f}ms')
+    samples = []
+    for _ in range(args.runs):
+        check_in = today + timedelta(days=rng.randrange(30))
+        check_out = check_in + timedelta(days=rng.randint(1, 7))
+        started = time.perf_counter()
+        filterset = RoomFilter(
+            {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()},
+            queryset=Room.objects.all(),
+        )
+        page = Paginator(filterset.qs, 10).page(1)
+        list(page)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    p50, p95 = percentile(samples, 50), percentile(samples, 95)
+    print(f'room search: runs={args.runs} p50={p50:.1f}ms p95={p95:.1f}ms max={max(samples):.1f}ms')
+    if p95 > args.budget_ms:
+        print(f'FAIL: p95 {p95:.1f}ms exceeds budget {args.budget_ms:.0f}ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
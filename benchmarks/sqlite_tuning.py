@@ -0,0 +1,113 @@
+"""
+Mixed read/booking-write throughput with and without the SQLite tuning.
+
+    python -m benchmarks.sqlite_tuning --workers 8 --seconds 10
+
+Seeds one database, copies it for each configuration and runs the same
+workload against both: worker processes issue room searches and room detail
+GETs, with ``--write-ratio`` of requests being booking POSTs. "default" is
+SQLite's rollback journal with a new connection per request; "tuned" is the
+settings.py default (WAL, pragmas, persistent connections).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import percentile, setup
+
+CONFIGS = {
+    'default': {'SQLITE_TUNING': '0', 'DB_CONN_MAX_AGE': '0'},
+    'tuned': {'SQLITE_TUNING': '1', 'DB_CONN_MAX_AGE': '600'},
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--bookings', type=int, default=50_000)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    template = os.path.join(workdir, 'template.sqlite3')
+    os.environ.update(CONFIGS['default'])
+    setup(template)
+    from django.db import connection
+    from .datagen import seed
+
+    seed(args.rooms, args.bookings)
+    connection.close()
+
+    results = {}
+    for name, env in CONFIGS.items():
+        db_name = os.path.join(workdir, f'{name}.sqlite3')
+        shutil.copy(template, db_name)
+        os.environ.update(env)
+        with multiprocessing.get_context('spawn').Pool(args.workers) as pool:
+            runs = pool.starmap(_worker, [
+                (db_name, args.seconds, args.write_ratio, seed) for seed in range(args.workers)
+            ])
+        reads = [ms for run in runs for ms in run['read']]
+        writes = [ms for run in runs for ms in run['write']]
+        errors = sum(run['errors'] for run in runs)
+        results[name] = (len(reads) + len(writes)) / args.seconds
+        print(
+            f'{name:>8}: {results[name]:7.0f} req/s  '
+            f'reads p50={percentile(reads, 50):.1f}ms p95={percentile(reads, 95):.1f}ms  '
+            f'writes n={len(writes)} p50={percentile(writes, 50):.1f}ms p95={percentile(writes, 95):.1f}ms  '
+            f'errors={errors}'
+        )
+    print(f'speedup: {results["tuned"] / results["default"]:.2f}x')
+    shutil.rmtree(workdir)
+    return 0
+
+
+def _worker(db_name, seconds, write_ratio, seed):
+    setup(db_name)
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from hotel.models import Room
+
+    setup_test_environment()
+    client = Client()
+    rng = random.Random(seed)
+    room_ids = list(Room.objects.values_list('pk', flat=True))
+    timings = {'read': [], 'write': [], 'errors': 0}
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        check_in = date.today() + timedelta(days=rng.randrange(25))
+        check_out = check_in + timedelta(days=rng.randint(1, 4))
+        started = time.perf_counter()
+        if rng.random() < write_ratio:
+            kind = 'write'
+            response = client.post(f'/rooms/{rng.choice(room_ids)}/book/', {
+                'first_name': 'Load',
+                'last_name': f'Worker{seed}',
+                'email': f'load{seed}-{n}@bench.example',
+                'check_in_date': check_in.isoformat(),
+                'check_out_date': check_out.isoformat(),
+            })
+        elif rng.random() < 0.5:
+            kind = 'read'
+            response = client.get('/rooms/', {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()})
+        else:
+            kind = 'read'
+            response = client.get(f'/rooms/{rng.choice(room_ids)}/')
+        timings[kind].append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 500:
+            timings['errors'] += 1
+    return timings
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Gunicorn cold start, first responses and worker memory, per settings profile.
+
+    python -m benchmarks.startup --workers 4
+
+Seeds its own database (``hotel_startup.sqlite3`` in the temp directory),
+then for each profile starts ``gunicorn HotelApp.wsgi`` with
+``gunicorn.conf.py`` and reports:
+
+* ``cold_start_s`` -- from launch until every worker has loaded the app and
+  can serve.
+* ``first_response_ms`` -- the latency of the first request to each page,
+  sent as soon as the workers are up: what the first visitors after a
+  deploy or a worker restart wait.
+* per-worker memory after those requests, from ``/proc``: ``rss_mb`` counts
+  every page a worker maps, shared or not; ``private_mb`` only those no
+  other process maps, i.e. what each extra worker costs; ``pss_mb`` splits
+  the shared pages between the processes mapping them. ``total_pss_mb``
+  (master included) is the memory the whole server takes.
+
+The profiles:
+
+* ``before`` -- ``HotelApp.settings`` without ``preload_app``: every worker
+  imports Django and the project itself and compiles each template on its
+  first use.
+* ``after`` -- ``HotelApp.settings_production`` with ``preload_app``: the
+  master loads and warms up the app (``hotel/warmup.py``), workers are
+  forked from it.
+* ``public`` -- ``after`` with ``HOTEL_PUBLIC_SITE=1``: no admin, staff
+  pages, sessions or authentication.
+
+Linux only (``/proc``).
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from . import setup
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES = {
+    'before': {'DJANGO_SETTINGS_MODULE': 'HotelApp.settings', 'GUNICORN_PRELOAD': '0'},
+    'after': {'DJANGO_SETTINGS_MODULE': 'HotelApp.settings_production', 'GUNICORN_PRELOAD': '1'},
+    'public': {
+        'DJANGO_SETTINGS_MODULE': 'HotelApp.settings_production', 'GUNICORN_PRELOAD': '1',
+        'HOTEL_PUBLIC_SITE': '1',
+    },
+}
+# gunicorn.conf.py plus a hook recording when each worker is ready to serve.
+CONFIG = """
+exec(open({config!r}).read())
+
+
+def post_worker_init(worker):
+    import time
+    with open({ready!r}, 'a') as f:
+        f.write(f'{{worker.pid}} {{time.monotonic()}}\\n')
+"""
+
+
+def pages(room_id):
+    return ['/', '/rooms/', f'/rooms/{room_id}/', f'/rooms/{room_id}/book/', '/bookings/login/', '/api/rooms/']
+
+
+def memory(pid):
+    """``(rss, pss, private)`` of process ``pid`` in MB."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    private = fields['Private_Clean'] + fields['Private_Dirty']
+    return tuple(round(kb / 1024, 1) for kb in (fields['Rss'], fields['Pss'], private))
+
+
+def wait_for_workers(ready_file, workers, server, timeout=60):
+    """``({pid: ready time}, ...)`` once ``workers`` workers are up."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'server exited with {server.returncode}')
+        if os.path.exists(ready_file):
+            with open(ready_file) as f:
+                ready = dict(line.split() for line in f)
+            if len(ready) >= workers:
+                return {int(pid): float(at) for pid, at in ready.items()}
+        time.sleep(0.01)
+    raise RuntimeError('workers did not start')
+
+
+def get(port, path):
+    """Milliseconds to fetch ``path``, body included."""
+    started = time.perf_counter()
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=30) as response:
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f'{path}: {response.status}')
+    return (time.perf_counter() - started) * 1000
+
+
+def run_profile(name, args, db_name, room_id):
+    workdir = tempfile.mkdtemp()
+    ready_file = os.path.join(workdir, 'ready')
+    config = os.path.join(workdir, 'gunicorn.conf.py')
+    with open(config, 'w') as f:
+        f.write(CONFIG.format(config=os.path.join(BASE_DIR, 'gunicorn.conf.py'), ready=ready_file))
+    env = {
+        **os.environ,
+        **PROFILES[name],
+        'DATABASE_URL': f'sqlite:///{db_name}',
+        'CACHE_BACKEND': 'file',
+        'CACHE_LOCATION': os.path.join(workdir, 'cache'),
+        'HOTEL_PROFILE_LOG': os.path.join(workdir, 'requests.jsonl'),
+    }
+    command = [
+        sys.executable, '-m', 'gunicorn', 'HotelApp.wsgi', '-c', config,
+        '--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers), '--log-level', 'warning',
+    ]
+    launched = time.monotonic()
+    server = subprocess.Popen(command, env=env, cwd=BASE_DIR)
+    try:
+        ready = wait_for_workers(ready_file, args.workers, server)
+        cold_start = max(ready.values()) - launched
+        first_responses = {path: round(get(args.port, path), 1) for path in pages(room_id)}
+        workers = [memory(pid) for pid in ready]
+        master = memory(server.pid)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    return {
+        'cold_start_s': round(cold_start, 2),
+        'first_response_ms': first_responses,
+        'first_responses_total_ms': round(sum(first_responses.values()), 1),
+        'worker_rss_mb': round(sum(rss for rss, _, _ in workers) / len(workers), 1),
+        'worker_private_mb': round(sum(private for _, _, private in workers) / len(workers), 1),
+        'worker_pss_mb': round(sum(pss for _, pss, _ in workers) / len(workers), 1),
+        'total_pss_mb': round(master[1] + sum(pss for _, pss, _ in workers), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--bookings', type=int, default=10_000)
+    parser.add_argument('--profile', action='append', choices=list(PROFILES), help="Run only these.")
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args(argv)
+
+    db_name = os.environ.get('BENCH_DB') or os.path.join(tempfile.gettempdir(), 'hotel_startup.sqlite3')
+    setup(db_name)
+    from django.db import connection
+    from hotel.models import Room
+    from .datagen import ensure_seeded
+
+    rooms = max(10, args.bookings // 100)
+    started = time.perf_counter()
+    if ensure_seeded(rooms, args.bookings):
+        print(f'seeded {rooms} rooms / {args.bookings} bookings in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+    room_id = Room.objects.order_by('pk').values_list('pk', flat=True).first()
+    connection.close()
+
+    results = {}
+    for name in args.profile or PROFILES:
+        results[name] = run_profile(name, args, db_name, room_id)
+        print(f'{name}: {json.dumps(results[name])}', file=sys.stderr)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+End-to-end benchmark suite.
+
+    python -m benchmarks.suite --bookings 100000 --output results.json
+    python -m benchmarks.suite --bookings 10000 --baseline benchmarks/baseline.json
+
+Seeds its own database (``hotel_suite.sqlite3`` in the temp directory) with
+``datagen`` at any size from 100 to 1M bookings, one room per hundred
+bookings, then times each scenario in ``SCENARIOS`` through the Django test
+client, middleware and templates included. The cache is cleared before every
+sample, so the numbers are for the uncached path. The hotel registry
+(``hotel/tenants.py``) is loaded again before the clock starts: it is only
+looked up afresh after a hotel changes.
+
+Results are JSON: ``meta`` describing the run and, per scenario, p50, p95
+and mean milliseconds and the most queries a sample took. With
+``--baseline`` a scenario regresses when its ``--metric`` (p50 by default,
+which is steadier than the tail on a busy machine) is more than
+``--threshold`` (a fraction) and ``--min-delta-ms`` over the baseline's, or
+it takes more queries; any regression exits non-zero. Timings only compare on the same
+machine and ``--bookings``, so regenerate the baseline when either changes.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import percentile, setup
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    """Register ``func(suite, rng)``, which prepares one sample and returns
+    the callable to time."""
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+class Suite:
+    def __init__(self, seed):
+        from django.contrib.auth import get_user_model
+        from django.test import Client
+        from hotel.models import Guest, Room
+
+        self.client = Client(HTTP_HOST='localhost')
+        self.admin = Client(HTTP_HOST='localhost')
+        User = get_user_model()
+        user = User.objects.filter(username='bench').first() or User.objects.create_superuser(
+            'bench', 'bench@bench.example', None,
+        )
+        self.admin.force_login(user)
+        rng = random.Random(seed)
+        room_ids = list(Room.objects.order_by('pk').values_list('pk', flat=True))
+        self.room_ids = rng.sample(room_ids, min(len(room_ids), 200))
+        self.phones = list(Guest.objects.order_by('pk').values_list('phone', flat=True)[:1000])
+
+    def get(self, client, path, params=None):
+        response = client.get(path, params)
+        assert response.status_code == 200, (path, params, response.status_code)
+        return response
+
+
+@scenario
+def room_search(suite, rng):
+    from hotel.models import Room
+
+    params = rng.choice([
+        {'room_type': rng.choice(Room.RoomType.values)},
+        {'min_capacity': rng.randint(1, 4)},
+        {'min_price': 1000, 'max_price': rng.choice([2000, 3000])},
+    ])
+    return lambda: suite.get(suite.client, '/rooms/', params)
+
+
+@scenario
+def availability_filter(suite, rng):
+    check_in = date.today() + timedelta(days=rng.randrange(30))
+    check_out = check_in + timedelta(days=rng.randint(1, 7))
+    params = {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}
+    return lambda: suite.get(suite.client, '/rooms/', params)
+
+
+@scenario
+def booking_create(suite, rng):
+    from django.db import transaction
+    from hotel.models import Room
+
+    # A room with a free night, picked before the clock starts.
+    for room_id in rng.sample(suite.room_ids, len(suite.room_ids)):
+        periods = Room.objects.get(pk=room_id).get_available_periods()
+        if periods:
+            break
+    else:
+        raise RuntimeError("no room has a free night in the next 30 days")
+    check_in = periods[0][0]
+    n = rng.randrange(10 ** 6)
+    data = {
+        'check_in_date': check_in.isoformat(),
+        'check_out_date': (check_in + timedelta(days=1)).isoformat(),
+        'first_name': 'Suite', 'last_name': f'Guest{n}',
+        'email': f'suite{n}@bench.example', 'phone': f'+380{700000000 + n}',
+    }
+
+    def post():
+        # Roll back so every run sees the same data.
+        with transaction.atomic():
+            response = suite.client.post(f'/rooms/{room_id}/book/', data)
+            assert response.status_code == 302, (room_id, data, response.status_code)
+            transaction.set_rollback(True)
+    return post
+
+
+@scenario
+def booking_list_by_phone(suite, rng):
+    from .guest_lookup import FORMATS
+
+    phone = rng.choice(suite.phones).removeprefix('+380')
+    return lambda: suite.get(suite.client, '/bookings/', {'phone': rng.choice(FORMATS)(phone)})
+
+
+@scenario
+def available_periods(suite, rng):
+    from hotel.models import Room
+
+    room_ids = rng.sample(suite.room_ids, min(len(suite.room_ids), 10))
+    return lambda: Room.objects.filter(pk__in=room_ids).available_periods(30)
+
+
+@scenario
+def admin_booking_changelist(suite, rng):
+    params = rng.choice([{}, {'status__exact': 'confirmed'}, {'p': rng.randint(1, 5)}])
+    return lambda: suite.get(suite.admin, '/admin/hotel/booking/', params)
+
+
+@scenario
+def admin_guest_changelist(suite, rng):
+    params = rng.choice([{}, {'p': rng.randint(1, 5)}])
+    return lambda: suite.get(suite.admin, '/admin/hotel/guest/', params)
+
+
+def run_scenario(suite, name, runs, seed, warmup=5):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from hotel.tenants import hotels
+
+    rng = random.Random(f'{seed}:{name}')
+    samples, queries = [], 0
+    # Untimed warmup runs load templates, URL resolvers and SQLite pages.
+    for n in range(warmup + runs):
+        sample = SCENARIOS[name](suite, rng)
+        cache.clear()
+        hotels()
+        gc.collect()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            sample()
+            elapsed = (time.perf_counter() - started) * 1000
+        if n >= warmup:
+            samples.append(elapsed)
+            queries = max(queries, len(captured))
+    return {
+        'runs': runs,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'queries': queries,
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms, metric='p50_ms'):
+    """Report lines for every scenario in both runs, and whether any of them
+    regressed."""
+    lines, regressed = [], False
+    if baseline['meta'].get('bookings') != results['meta']['bookings']:
+        lines.append(
+            f"warning: baseline has {baseline['meta'].get('bookings')} bookings, "
+            f"this run {results['meta']['bookings']}"
+        )
+    for name, current in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            lines.append(f'{name}: not in baseline')
+            continue
+        delta = current[metric] - before[metric]
+        slower = delta > min_delta_ms and current[metric] > before[metric] * (1 + threshold)
+        more_queries = current['queries'] > before['queries']
+        status = 'REGRESSION' if slower or more_queries else 'ok'
+        regressed |= status != 'ok'
+        lines.append(
+            f"{name}: {metric.removesuffix('_ms')} {before[metric]:.1f} -> {current[metric]:.1f}ms "
+            f"({delta / before[metric]:+.0%}), queries {before['queries']} -> {current['queries']} {status}"
+        )
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bookings', type=int, default=10_000)
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help="Run only these.")
+    parser.add_argument('--output', '-o', help="Write the results JSON here as well as to stdout.")
+    parser.add_argument('--baseline', help="Results JSON to compare against.")
+    parser.add_argument('--metric', choices=['p50_ms', 'p95_ms', 'mean_ms'], default='p50_ms')
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown, as a fraction.")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="Ignore slowdowns smaller than this.")
+    args = parser.parse_args(argv)
+    if not 100 <= args.bookings <= 1_000_000:
+        parser.error("--bookings must be between 100 and 1000000")
+
+    setup(os.environ.get('BENCH_DB') or os.path.join(tempfile.gettempdir(), 'hotel_suite.sqlite3'))
+    import django
+    from hotel.models import Booking, Guest, Room
+    from .datagen import ensure_seeded
+
+    rooms = max(10, args.bookings // 100)
+    started = time.perf_counter()
+    if ensure_seeded(rooms, args.bookings, seed=args.seed):
+        print(f'seeded {rooms} rooms / {args.bookings} bookings in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+
+    suite = Suite(args.seed)
+    results = {
+        'meta': {
+            'bookings': args.bookings,
+            'rooms': Room.objects.count(),
+            'guests': Guest.objects.count(),
+            'stored_bookings': Booking.objects.count(),
+            'runs': args.runs,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+        },
+        'scenarios': {},
+    }
+    for name in args.scenario or SCENARIOS:
+        results['scenarios'][name] = run_scenario(suite, name, args.runs, args.seed)
+        print(f"{name}: {json.dumps(results['scenarios'][name])}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.threshold, args.min_delta_ms, args.metric)
+        print('\n'.join(lines), file=sys.stderr)
+        if regressed:
+            print('FAIL: regressions against the baseline', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
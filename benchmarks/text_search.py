@@ -0,0 +1,79 @@
+"""
+Full-text room search benchmark.
+
+    python -m benchmarks.text_search --rooms 100000
+
+Fills its own database with ``--rooms`` rooms whose descriptions are drawn
+from a small vocabulary (so common words match tens of thousands of rooms),
+then runs ``RoomFilter`` searches the way ``RoomListView`` does -- one page
+of ten rooms plus the capped count -- for one to three ``q`` words, with and
+without type and capacity filters. Exits non-zero when p95 is over budget.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from . import percentile, setup
+
+WORDS = (
+    'sea view balcony quiet garden city king queen twin bath jacuzzi mountain pool breakfast spacious '
+    'cozy modern classic terrace kitchen fireplace loft attic courtyard river sauna desk workspace'
+).split()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rooms', type=int, default=100_000)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--budget-ms', type=float, default=100.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    setup(os.path.join(tempfile.gettempdir(), f'hotel_text_search_{args.rooms}.sqlite3'))
+    from django.core.paginator import Paginator
+    from hotel.filters import RoomFilter
+    from hotel.models import Hotel, Room
+
+    rng = random.Random(args.seed)
+    if Room.objects.count() != args.rooms:
+        started = time.perf_counter()
+        Room.objects.all().delete()
+        room_types = Room.RoomType.values
+        hotel = Hotel.objects.current()
+        for offset in range(0, args.rooms, 5000):
+            Room.objects.bulk_create(
+                Room(
+                    hotel=hotel, room_number=f'{n:06d}', room_type=rng.choice(room_types), capacity=rng.randint(1, 5),
+                    price_per_night=rng.randrange(500, 3000, 50),
+                    description=' '.join(rng.choices(WORDS, k=rng.randint(5, 20))),
+                )
+                for n in range(offset, min(offset + 5000, args.rooms))
+            )
+        print(f'seeded {args.rooms} rooms in {time.perf_counter() - started:.1f}s')
+
+    samples, matched = [], []
+    for _ in range(args.runs):
+        params = {'q': ' '.join(rng.sample(WORDS, rng.randint(1, 3)))}
+        if rng.random() < 0.5:
+            params.update(room_type=rng.choice(Room.RoomType.values), min_capacity=rng.randint(1, 4))
+        started = time.perf_counter()
+        queryset = RoomFilter(params, queryset=Room.objects.all()).qs
+        page = Paginator(queryset, 10).page(1)
+        list(page)
+        samples.append((time.perf_counter() - started) * 1000)
+        matched.append(page.paginator.count)
+
+    p50, p95 = percentile(samples, 50), percentile(samples, 95)
+    print(f'text search: runs={args.runs} p50={p50:.1f}ms p95={p95:.1f}ms max={max(samples):.1f}ms '
+          f'median matches={percentile(matched, 50)}')
+    if p95 > args.budget_ms:
+        print(f'FAIL: p95 {p95:.1f}ms exceeds budget {args.budget_ms:.0f}ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings, read from the working directory by ``gunicorn
+HotelApp.wsgi`` (Procfile, Dockerfile).
+
+The app is loaded in the master and warmed up there (``preload_app`` with
+``HotelApp.settings_production``), then the workers are forked from it and
+share its memory copy-on-write. ``benchmarks/startup.py`` measures what this
+saves. ``GUNICORN_PRELOAD=0`` loads the app in each worker instead, e.g. to
+pick up code changes with ``kill -HUP`` rather than a restart.
+"""
+import gc
+import multiprocessing
+import os
+import sys
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HotelApp.settings_production')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def on_starting(server):
+    from django.conf import settings
+
+    # Page and ETag invalidation bumps counters kept in the cache
+    # (hotel/cache.py): workers with a cache each of their own would serve
+    # each other's stale pages.
+    if server.cfg.workers > 1 and settings.CACHES['default']['BACKEND'] == settings.CACHE_BACKENDS['locmem']:
+        sys.exit("CACHE_BACKEND=locmem is not shared between workers: use the file cache or WEB_CONCURRENCY=1.")
+
+
+def when_ready(server):
+    # Runs before the first fork. Moves everything loaded so far out of the
+    # collector's reach, so that collections in the workers do not write to
+    # (and so copy) the pages they share with the master.
+    gc.freeze()
@@ -1,7 +1,72 @@
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import ValidationError
 
-from .models import Room, Guest, Booking
+from .models import Hotel, Room, Guest, Booking, Job, RatePlan, RateRule
+from .signals import data_changed
 
+
+class GuestAdminForm(forms.ModelForm):
+    class Meta:
+        model = Guest
+        fields = '__all__'
+
+    def validate_unique(self):
+        # Adding a guest whose email is on file updates that guest instead,
+        # see GuestAdmin.save_model().
+        exclude = self._get_validation_exclusions()
+        if self.instance._state.adding:
+            exclude.add('email')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
+
+
+class GuestAdmin(admin.ModelAdmin):
+    form = GuestAdminForm
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return super().save_model(request, obj, form, change)
+        Guest.objects.upsert([obj])
+        data_changed(guests=[obj.pk])
+
+
+class HotelAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug']
+    prepopulated_fields = {'slug': ['name']}
+
+
+class BookingAdmin(admin.ModelAdmin):
+    list_display = ['id', 'room', 'guest', 'check_in_date', 'check_out_date', 'status', 'booking_channel']
+    list_filter = ['status', 'booking_channel']
+    # Copied from the room by Booking.save().
+    exclude = ['hotel']
+    # Room and guest __str__ on every row would otherwise cost a query each.
+    list_select_related = ['room', 'guest']
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['claimed_by', 'lease_expires', 'created_at', 'finished_at', 'last_error']
+
+
+class RateRuleInline(admin.TabularInline):
+    model = RateRule
+    extra = 1
+
+
+class RatePlanAdmin(admin.ModelAdmin):
+    list_display = ['name', 'priority', 'is_active']
+    list_editable = ['priority', 'is_active']
+    inlines = [RateRuleInline]
+
+
+admin.site.register(Hotel, HotelAdmin)
 admin.site.register(Room)
-admin.site.register(Guest)
-admin.site.register(Booking)
\ No newline at end of file
+admin.site.register(Guest, GuestAdmin)
+admin.site.register(Booking, BookingAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(RatePlan, RatePlanAdmin)
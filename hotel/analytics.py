@@ -0,0 +1,148 @@
+"""
+Occupancy and revenue analytics.
+
+Every figure is read from ``RoomNight``: each row is a sold night, earning
+the rate it was sold at. Per day, and optionally per room type or
+booking channel:
+
+* occupancy -- sold nights / rooms
+* ADR, average daily rate -- revenue / sold nights
+* RevPAR, revenue per available room -- revenue / rooms
+
+Figures are for one hotel, by default the current one (see
+``hotel/tenants.py``). Rooms are counted as they are now, as the hotel keeps
+no history of its inventory.
+
+Night counts come from one ``GROUP BY date, room type, channel`` query and
+are cached a month at a time under the ``month:<yyyy-mm>`` version counters
+(see ``hotel/cache.py``), so a new booking only makes the months its stay
+touches be counted again.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .cache import KEY_PREFIX, month_version, version_map
+from .models import Booking, Room, RoomNight
+from .tenants import get_hotel
+
+GROUPS = {
+    'room_type': Room.RoomType.values,
+    'channel': Booking.BookingChannel.values,
+}
+CACHE_TIMEOUT = 24 * 60 * 60
+CENT = Decimal('0.01')
+
+
+def month_starts(start, end):
+    """First day of every month overlapping ``[start, end)``."""
+    month = start.replace(day=1)
+    while month < end:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def night_counts(start, end, hotel):
+    """``{date: [(room_type, channel, nights, revenue), ...]}`` for the days
+    in ``[start, end)`` with any night sold at ``hotel``."""
+    months = list(month_starts(start, end))
+    current = version_map(['catalogue', *map(month_version, months)])
+    keys = {
+        f"{KEY_PREFIX}:analytics:{hotel.pk}:{month:%Y-%m}:{current['catalogue']}:{current[month_version(month)]}": month
+        for month in months
+    }
+    cached = cache.get_many(keys)
+    counts = {month: cached.get(key) for key, month in keys.items()}
+
+    missing = [month for month, days in counts.items() if days is None]
+    if missing:
+        for month in missing:
+            counts[month] = defaultdict(list)
+        condition = Q()
+        for range_start, range_end in _month_ranges(missing):
+            condition |= Q(date__gte=range_start, date__lt=range_end)
+        rows = (
+            RoomNight.objects.filter(condition, room__hotel=hotel)
+            .values_list('date', 'room_type', 'channel')
+            .annotate(nights=Count('*'), revenue=Sum('rate'))
+            .order_by()
+        )
+        for day, room_type, channel, nights, revenue in rows:
+            counts[day.replace(day=1)][day].append((room_type, channel, nights, revenue))
+        cache.set_many(
+            {key: dict(counts[month]) for key, month in keys.items() if month in missing},
+            timeout=CACHE_TIMEOUT,
+        )
+    return {
+        day: groups
+        for days in counts.values() for day, groups in days.items()
+        if start <= day < end
+    }
+
+
+def _month_ranges(months):
+    """Merge consecutive month starts into ``[start, end)`` date ranges."""
+    ranges = []
+    for month in sorted(months):
+        end = (month + timedelta(days=32)).replace(day=1)
+        if ranges and ranges[-1][1] == month:
+            ranges[-1][1] = end
+        else:
+            ranges.append([month, end])
+    return ranges
+
+
+def figures(rooms, nights, revenue):
+    return {
+        'rooms': rooms,
+        'nights': nights,
+        'revenue': revenue,
+        'occupancy': round(nights / rooms, 4) if rooms else None,
+        'adr': (revenue / nights).quantize(CENT) if nights else None,
+        'revpar': (revenue / rooms).quantize(CENT) if rooms else None,
+    }
+
+
+def report(start, end, by=None, hotel=None):
+    """Figures for every day in ``[start, end)`` and for the whole range, at
+    ``hotel`` (by default the current one).
+
+    With ``by`` (a key of ``GROUPS``) there is a row per day and group.
+    Returns ``(days, totals)``: dicts as made by ``figures()`` plus ``date``
+    and ``group`` keys.
+    """
+    if hotel is None:
+        hotel = get_hotel()
+    room_counts = dict(
+        Room.objects.filter(hotel=hotel).values_list('room_type').annotate(Count('pk')).order_by()
+    )
+    groups = GROUPS[by] if by else [None]
+    if by == 'room_type':
+        rooms = {room_type: room_counts.get(room_type, 0) for room_type in groups}
+    else:
+        rooms = dict.fromkeys(groups, sum(room_counts.values()))
+    position = {'room_type': 0, 'channel': 1}.get(by)
+
+    counts = night_counts(start, end, hotel)
+    days = []
+    totals = {group: [0, Decimal(0)] for group in groups}
+    for n in range((end - start).days):
+        day = start + timedelta(days=n)
+        sold = {group: [0, Decimal(0)] for group in groups}
+        for row in counts.get(day, ()):
+            group = sold[row[position] if by else None]
+            group[0] += row[2]
+            group[1] += row[3]
+        for group, (nights, revenue) in sold.items():
+            days.append({'date': day, 'group': group, **figures(rooms[group], nights, revenue)})
+            totals[group][0] += nights
+            totals[group][1] += revenue
+
+    nights_available = {group: count * (end - start).days for group, count in rooms.items()}
+    return days, [
+        {'group': group, **figures(nights_available[group], nights, revenue)}
+        for group, (nights, revenue) in totals.items()
+    ]
@@ -0,0 +1,158 @@
+"""
+In-process availability index.
+
+Keeps every active booking that has not ended yet as a sorted interval array
+per room, so "is room X free on day D / for stay R" is a bisect instead of a
+database round trip. The index is loaded lazily from ``Booking`` on first use
+and the rooms touched by each committed transaction are re-read by the hook
+in ``hotel/signals.py``.
+
+Each worker process holds its own copy and only sees writes made through that
+process, so it is off unless ``HOTEL_AVAILABILITY_INDEX`` is set. The booking
+write path still checks the database before saving.
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+from django.conf import settings
+
+
+class RoomIntervals:
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals)  # (check_in, check_out, booking_id)
+        self.starts = []
+        self.max_ends = []  # running max of check_out over intervals[:i + 1]
+        self._reindex()
+
+    def _reindex(self):
+        self.starts = [start for start, _, _ in self.intervals]
+        self.max_ends = []
+        for _, end, _ in self.intervals:
+            self.max_ends.append(max(end, self.max_ends[-1]) if self.max_ends else end)
+
+    def add(self, check_in, check_out, booking_id=None):
+        insort(self.intervals, (check_in, check_out, booking_id), key=lambda interval: interval[:2])
+        self._reindex()
+
+    def is_free_on(self, day):
+        i = bisect_right(self.starts, day)
+        return i == 0 or self.max_ends[i - 1] < day
+
+    def is_free(self, check_in, check_out):
+        i = bisect_left(self.starts, check_out)
+        return i == 0 or self.max_ends[i - 1] <= check_in
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self.rooms = {}
+        self.bookings = {}  # booking_id -> room_id
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            self.rooms.clear()
+            self.bookings.clear()
+            self._fill(self._active_bookings())
+
+    def reload_rooms(self, room_ids):
+        """Re-read the given rooms from the database in one query."""
+        room_ids = set(room_ids)
+        rows = list(self._active_bookings().filter(room__in=room_ids))
+        with self.lock:
+            for room_id in room_ids:
+                intervals = self.rooms.pop(room_id, None)
+                for _, _, booking_id in intervals.intervals if intervals else ():
+                    self.bookings.pop(booking_id, None)
+            self._fill(rows)
+
+    def _active_bookings(self):
+        from .models import Booking
+
+        return Booking.objects.active().filter(check_out_date__gte=date.today()).values_list(
+            'pk', 'room', 'check_in_date', 'check_out_date'
+        )
+
+    def _fill(self, rows):
+        touched = set()
+        for booking_id, room_id, check_in, check_out in rows:
+            self.rooms.setdefault(room_id, RoomIntervals()).intervals.append(
+                (check_in, check_out, booking_id)
+            )
+            self.bookings[booking_id] = room_id
+            touched.add(room_id)
+        for room_id in touched:
+            self.rooms[room_id].intervals.sort()
+            self.rooms[room_id]._reindex()
+
+    def is_free_on(self, room_id, day):
+        intervals = self.rooms.get(room_id)
+        return intervals is None or intervals.is_free_on(day)
+
+    def is_free(self, room_id, check_in, check_out):
+        intervals = self.rooms.get(room_id)
+        return intervals is None or intervals.is_free(check_in, check_out)
+
+    def bookings_between(self, room_ids, start, end):
+        """``(room_id, check_in, check_out)`` rows like the database query in
+        ``BookingQuerySet.available_periods``, ordered by room and check-in."""
+        rows = []
+        for room_id in sorted(room_ids):
+            intervals = self.rooms.get(room_id)
+            if intervals is None:
+                continue
+            stop = bisect_right(intervals.starts, end)
+            rows.extend(
+                (room_id, check_in, check_out)
+                for check_in, check_out, _ in intervals.intervals[:stop]
+                if check_out >= start
+            )
+        return rows
+
+    def diff(self):
+        """Differences between the index and the database, as strings."""
+        expected = {
+            booking_id: (room_id, check_in, check_out)
+            for booking_id, room_id, check_in, check_out in self._active_bookings()
+        }
+        with self.lock:
+            actual = {
+                booking_id: (room_id, check_in, check_out)
+                for room_id, intervals in self.rooms.items()
+                for check_in, check_out, booking_id in intervals.intervals
+                if check_out >= date.today()
+            }
+        problems = []
+        for booking_id in sorted(expected.keys() | actual.keys()):
+            if booking_id not in actual:
+                problems.append(f"booking {booking_id} missing from index: {expected[booking_id]}")
+            elif booking_id not in expected:
+                problems.append(f"booking {booking_id} in index but not active in database: {actual[booking_id]}")
+            elif expected[booking_id] != actual[booking_id]:
+                problems.append(f"booking {booking_id} differs: index {actual[booking_id]}, database {expected[booking_id]}")
+        return problems
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(load=True):
+    """The process-wide index, or None when it is disabled (or, with
+    ``load=False``, not loaded yet)."""
+    global _index
+    if not getattr(settings, 'HOTEL_AVAILABILITY_INDEX', False):
+        return None
+    if _index is None and load:
+        with _index_lock:
+            if _index is None:
+                index = AvailabilityIndex()
+                index.load()
+                _index = index
+    return _index
+
+
+def reset_index():
+    global _index
+    _index = None
@@ -0,0 +1,190 @@
+"""
+Rendered-page cache for the room catalogue.
+
+Cached pages are keyed by their normalized query parameters plus the current
+values of the version counters they depend on:
+
+* ``catalogue`` -- bumped by any room save/delete; every room list page.
+* ``room:<id>`` -- bumped by a save/delete of that room; its detail page.
+* ``day:<date>`` -- bumped by booking writes covering that date; room list
+  pages filtered by availability on or across that date.
+* ``month:<yyyy-mm>`` -- bumped with the ``day:`` counters of its dates;
+  the analytics in ``hotel/analytics.py``, cached a month at a time.
+* ``rates`` and ``rates:<yyyy-mm>`` -- bumped by rate rule changes, for
+  every night or for the nights of that month; stay searches and the rate
+  table in ``hotel/pricing.py``.
+* ``availability:<id>`` -- bumped by booking writes for that room.
+* ``guest:<id>`` -- bumped by changes to a guest or their bookings.
+* ``hotels`` -- bumped by any hotel save/delete; the hotel registry of
+  ``hotel/tenants.py``.
+
+The same counters back the API's ETags (``hotel/views/api.py``).
+
+Invalidation bumps counters rather than deleting keys, so old entries are
+simply never looked up again and expire on their own. Counters are stored in
+the same cache, so a backend shared between workers (``CACHE_BACKEND=file``)
+keeps every worker's pages consistent.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+
+from . import metrics
+from .forms import RoomFilterForm
+
+KEY_PREFIX = 'hotel'
+# Searches spanning more days than this are not cached.
+MAX_CACHED_STAY_DAYS = 62
+
+
+def room_version(room_id):
+    return f'room:{room_id}'
+
+
+def day_version(day):
+    return f'day:{day.isoformat()}'
+
+
+def month_version(day):
+    return f'month:{day:%Y-%m}'
+
+
+def rates_version(month=None):
+    """The counter of the rates of ``month``'s nights, or of every night."""
+    return f'rates:{month:%Y-%m}' if month else 'rates'
+
+
+def availability_version(room_id):
+    return f'availability:{room_id}'
+
+
+def guest_version(guest_id):
+    return f'guest:{guest_id}'
+
+
+def version_map(names):
+    """``{name: current value}`` of the version counters ``names``."""
+    keys = {f'{KEY_PREFIX}:v:{name}': name for name in names}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys.keys() - found.keys()}
+    if missing:
+        # A fresh, time-based start value can never match an evicted one.
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {name: found[key] for key, name in keys.items()}
+
+
+def versions(names):
+    current = version_map(names)
+    return [current[name] for name in sorted(current)]
+
+
+def bump(names):
+    for name in names:
+        try:
+            cache.incr(f'{KEY_PREFIX}:v:{name}')
+        except ValueError:
+            # Never read or already evicted: versions() starts it afresh.
+            pass
+
+
+def invalidate(rooms=(), days=(), availability=(), guests=(), rates=()):
+    """Drop cached pages for changed rooms, booking dates, room bookings,
+    guests and the rates of months (None for every month)."""
+    names = [day_version(day) for day in days]
+    names += {month_version(day) for day in days}
+    names += [availability_version(room_id) for room_id in availability]
+    names += [guest_version(guest_id) for guest_id in guests]
+    names += [rates_version(month) for month in rates]
+    if rooms:
+        names += ['catalogue'] + [room_version(room_id) for room_id in rooms]
+    bump(names)
+
+
+def normalized_params(data, names):
+    return sorted((name, value) for name in names for value in data.getlist(name) if value != '')
+
+
+def room_search_dependencies(data):
+    """Versions a room search with ``RoomFilter`` parameters ``data``
+    depends on, or None if it should not be cached."""
+    dependencies = ['catalogue']
+    form = RoomFilterForm(data)
+    form.is_valid()
+    check_in = form.cleaned_data.get('check_in')
+    check_out = form.cleaned_data.get('check_out')
+    if check_in and check_out and check_in < check_out:
+        if (check_out - check_in).days > MAX_CACHED_STAY_DAYS:
+            return None
+        dependencies += stay_dependencies(check_in, check_out)
+    if form.cleaned_data.get('only_available') or data.get('available') == 'true':
+        dependencies.append(day_version(timezone.localdate()))
+    return dependencies
+
+
+def stay_dependencies(check_in, check_out):
+    """Versions a search for the ``[check_in, check_out)`` stay depends on:
+    its nights' availability and rates."""
+    days = [check_in + timedelta(days=n) for n in range((check_out - check_in).days)]
+    months = {day.replace(day=1) for day in days}
+    return [*map(day_version, days), rates_version(), *map(rates_version, sorted(months))]
+
+
+class CachedPageMixin:
+    """Serve GET responses from the page cache.
+
+    Views declare what a page depends on with ``get_cache_dependencies()``
+    (None to skip the cache) and which query parameters matter with
+    ``cache_params``.
+    """
+    cache_params = ()
+
+    def get_cache_dependencies(self):
+        return []
+
+    def get_cache_key(self, dependencies):
+        params = normalized_params(self.request.GET, self.cache_params)
+        raw = repr((self.request.path, params, dependencies, versions(dependencies)))
+        return f'{KEY_PREFIX}:page:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    def get(self, request, *args, **kwargs):
+        key, content = self.cached_page()
+        if content is not None:
+            return HttpResponse(content)
+        return self.cache_response(key, super().get(request, *args, **kwargs))
+
+    def cached_page(self):
+        """``(key, content)`` for this request: key is None when the page is
+        not cached, content is None on a cache miss."""
+        dependencies = self.get_cache_dependencies()
+        if dependencies is None:
+            return None, None
+        name = type(self).__name__
+        key = self.get_cache_key(dependencies)
+        content = cache.get(key)
+        metrics.incr(f'cache.{name}.{"miss" if content is None else "hit"}')
+        return key, content
+
+    def cache_response(self, key, response):
+        if key is not None and response.status_code == 200:
+            response.add_post_render_callback(lambda rendered: cache.set(key, rendered.content))
+        return response
+
+
+class AsyncCachedPageMixin(CachedPageMixin):
+    """``CachedPageMixin`` for async views, which build the page in a
+    ``get_page()`` coroutine."""
+
+    async def get(self, request, *args, **kwargs):
+        # Cache backends are thread-safe and may block on I/O (the file
+        # backend does), so look up off the event loop and off the thread
+        # that runs ORM queries.
+        key, content = await sync_to_async(self.cached_page, thread_sensitive=False)()
+        if content is not None:
+            return HttpResponse(content)
+        return self.cache_response(key, await self.get_page(request, *args, **kwargs))
@@ -0,0 +1,217 @@
+"""
+Bulk booking feeds from channel managers and travel agents.
+
+A feed is CSV with a header row, or JSON lines, holding one booking per row
+with the columns in ``FIELDS``, for one hotel. Rooms are matched by
+``room_number`` and guests by ``email``; the feed's guest names and phones
+replace stored ones.
+
+``import_chunk`` costs the same handful of queries whether a chunk holds ten
+rows or ten thousand: one room lookup, a guest lookup and upsert, one room
+lock, one overlap query and two bulk inserts, bookings and their nights.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import router, transaction
+from django.db.models import F
+
+from .availability import RoomIntervals
+from .models import Booking, Guest, Hotel, Room, RoomNight
+from .signals import data_changed, stay_days
+
+FIELDS = [
+    'room_number', 'email', 'first_name', 'last_name', 'phone',
+    'check_in_date', 'check_out_date', 'status', 'booking_channel', 'notes',
+]
+FORMATS = ['csv', 'jsonl']
+CHUNK_SIZE = 5000
+STATUSES = set(Booking.BookingStatus.values)
+CHANNELS = set(Booking.BookingChannel.values)
+GUEST_LENGTHS = {name: Guest._meta.get_field(name).max_length for name in ('email', 'phone')}
+
+
+def read_rows(stream, format):
+    """``(line_number, row)`` pairs; undecodable JSON lines come through as
+    strings so they can be rejected like any other bad row."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, line.rstrip('\n')
+
+
+def write_rows(stream, format, rows):
+    """Write ``FIELDS``-ordered tuples to ``stream`` as a feed."""
+    if format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+        return
+    for row in rows:
+        stream.write(json.dumps(dict(zip(FIELDS, row)), default=str) + '\n')
+
+
+def clean_row(row, default_channel=Booking.BookingChannel.AGENT):
+    """Validated, typed values of one feed row; raises ``ValueError`` with
+    the reason for rejecting it."""
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    value = {name: '' if row.get(name) is None else str(row[name]).strip() for name in FIELDS}
+    for name in ('room_number', 'email', 'first_name', 'last_name', 'check_in_date', 'check_out_date'):
+        if not value[name]:
+            raise ValueError(f"missing {name}")
+    try:
+        validate_email(value['email'])
+    except ValidationError:
+        raise ValueError(f"invalid email {value['email']!r}")
+    # Rejected here rather than failing the chunk's bulk insert on databases
+    # that enforce column lengths.
+    for name in ('email', 'phone'):
+        if len(value[name]) > GUEST_LENGTHS[name]:
+            raise ValueError(f"{name} longer than {GUEST_LENGTHS[name]} characters")
+    try:
+        check_in = date.fromisoformat(value['check_in_date'])
+        check_out = date.fromisoformat(value['check_out_date'])
+    except ValueError:
+        raise ValueError("dates must be YYYY-MM-DD")
+    if check_out <= check_in:
+        raise ValueError("check_out_date must be after check_in_date")
+    status = value['status'] or Booking.BookingStatus.CONFIRMED
+    if status not in STATUSES:
+        raise ValueError(f"unknown status {status!r}")
+    channel = value['booking_channel'] or default_channel
+    if channel not in CHANNELS:
+        raise ValueError(f"unknown booking_channel {channel!r}")
+    return {
+        'room_number': value['room_number'],
+        'email': value['email'],
+        'first_name': value['first_name'][:50],
+        'last_name': value['last_name'][:50],
+        'phone': value['phone'] or None,
+        'check_in_date': check_in,
+        'check_out_date': check_out,
+        'status': status,
+        'booking_channel': channel,
+        'notes': value['notes'] or None,
+    }
+
+
+def import_chunk(rows, default_channel=Booking.BookingChannel.AGENT, hotel=None):
+    """Import ``(line_number, row)`` pairs in one transaction, as bookings at
+    ``hotel`` (by default the current one).
+
+    Returns the number of bookings created and the rejected rows as
+    ``(line_number, row, reason)``. Active bookings that overlap an existing
+    active booking, or an earlier row, for the same room are rejected.
+    """
+    cleaned, rejects = [], []
+    for number, row in rows:
+        try:
+            cleaned.append((number, row, clean_row(row, default_channel)))
+        except ValueError as e:
+            rejects.append((number, row, str(e)))
+    if hotel is None:
+        hotel = Hotel.objects.current()
+    using = router.db_for_write(Booking)
+
+    room_ids = dict(
+        Room.objects.filter(hotel=hotel, room_number__in={values['room_number'] for _, _, values in cleaned})
+        .values_list('room_number', 'pk')
+    )
+    accepted = []
+    for number, row, values in cleaned:
+        if values['room_number'] in room_ids:
+            accepted.append((number, row, values))
+        else:
+            rejects.append((number, row, f"unknown room {values['room_number']!r}"))
+    if not accepted:
+        return 0, rejects
+
+    # The last row for each email wins.
+    details = {
+        values['email']: (values['first_name'], values['last_name'], values['phone'])
+        for _, _, values in accepted
+    }
+    active_rooms = {
+        room_ids[values['room_number']] for _, _, values in accepted
+        if values['status'] in Booking.ACTIVE_STATUSES
+    }
+
+    with transaction.atomic(using=using):
+        known = {
+            email: (pk, stored)
+            for email, pk, *stored in Guest.objects.filter(email__in=details).values_list(
+                'email', 'pk', 'first_name', 'last_name', 'phone',
+            )
+        }
+        # Rewriting unchanged guests would cost a row and index update each.
+        # A row without a phone keeps the stored one.
+        changed = [
+            Guest(email=email, first_name=first_name, last_name=last_name, phone=phone)
+            for email, (first_name, last_name, phone) in details.items()
+            if email not in known or known[email][1] != [first_name, last_name, phone or known[email][1][2]]
+        ]
+        guest_ids = {email: pk for email, (pk, _) in known.items()}
+        guest_ids.update((guest.email, guest.pk) for guest in Guest.objects.upsert(changed))
+
+        existing = defaultdict(list)
+        if active_rooms:
+            # Same room lock as BookingQuerySet.reserve(), so web bookings
+            # cannot slip in between the overlap check and the insert.
+            Room.objects.filter(pk__in=active_rooms).update(room_number=F('room_number'))
+            rows = Booking.objects.active().filter(
+                room__in=active_rooms,
+                check_in_date__lt=max(values['check_out_date'] for _, _, values in accepted),
+                check_out_date__gt=min(values['check_in_date'] for _, _, values in accepted),
+            ).values_list('room', 'check_in_date', 'check_out_date', 'pk')
+            for room_id, check_in, check_out, booking_id in rows:
+                existing[room_id].append((check_in, check_out, booking_id))
+        intervals = {room_id: RoomIntervals(existing[room_id]) for room_id in active_rooms}
+
+        bookings, days = [], set()
+        for number, row, values in accepted:
+            room_id = room_ids[values['room_number']]
+            check_in, check_out = values['check_in_date'], values['check_out_date']
+            if values['status'] in Booking.ACTIVE_STATUSES:
+                if not intervals[room_id].is_free(check_in, check_out):
+                    rejects.append((number, row, "overlaps an active booking for this room"))
+                    continue
+                intervals[room_id].add(check_in, check_out)
+                days.update(stay_days(check_in, check_out))
+            bookings.append(Booking(
+                hotel=hotel,
+                room_id=room_id,
+                guest_id=guest_ids[values['email']],
+                check_in_date=check_in,
+                check_out_date=check_out,
+                status=values['status'],
+                booking_channel=values['booking_channel'],
+                notes=values['notes'],
+            ))
+        Booking.objects.bulk_create(bookings)
+        # bulk_create skips Model.save() and the model signals.
+        RoomNight.objects.sync(bookings, created=True)
+        data_changed(rooms=active_rooms, days=days, guests=guest_ids.values(), using=using)
+    return len(bookings), rejects
+
+
+def export_rows(queryset=None):
+    """Bookings as ``FIELDS``-ordered tuples, streamed from the database."""
+    queryset = Booking.objects.all() if queryset is None else queryset
+    return queryset.order_by('pk').values_list(
+        'room__room_number', 'guest__email', 'guest__first_name', 'guest__last_name', 'guest__phone',
+        'check_in_date', 'check_out_date', 'status', 'booking_channel', 'notes',
+    ).iterator(chunk_size=CHUNK_SIZE)
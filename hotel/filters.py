@@ -1,9 +1,17 @@
 # hotel/filters.py
 import django_filters
-from .models import Room, Booking
-from django.utils import timezone
+from .models import Room, SearchRank, search_terms
+from .forms import RoomFilterForm
+
+
+def search_order(queryset):
+    """The annotations a ``RoomFilter`` queryset is ordered by before room
+    number: relevance to ``q``, then the stay's total."""
+    return tuple(name for name in ('search_rank', 'stay_total') if name in queryset.query.annotations)
+
 
 class RoomFilter(django_filters.FilterSet):
+    q = django_filters.CharFilter(method='filter_search', label='Search')
     room_type = django_filters.ChoiceFilter(
         choices=Room.RoomType.choices,
         empty_label='Any',
@@ -34,20 +42,44 @@ class RoomFilter(django_filters.FilterSet):
         method='filter_only_available',
         label='Only Available'
     )
+    check_in = django_filters.DateFilter(method='filter_stay', label='Check-in')
+    check_out = django_filters.DateFilter(method='filter_stay', label='Check-out')
 
     class Meta:
         model = Room
-        fields = ['room_type', 'min_capacity', 'max_capacity', 'min_price', 'max_price', 'only_available']
+        form = RoomFilterForm
+        fields = [
+            'q', 'room_type', 'min_capacity', 'max_capacity', 'min_price', 'max_price',
+            'only_available', 'check_in', 'check_out',
+        ]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        check_in = self.form.cleaned_data.get('check_in')
+        check_out = self.form.cleaned_data.get('check_out')
+        if check_in and check_out and check_in < check_out:
+            queryset = queryset.available(check_in, check_out).with_stay_total(check_in, check_out)
+        order = search_order(queryset)
+        if order:
+            queryset = queryset.order_by(*order, 'room_number')
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Rooms whose number, type or description has every word of
+        ``value``, or a word starting with it, ranked by relevance."""
+        words = search_terms(value)
+        if not words:
+            return queryset
+        return queryset.filter(search__document__matches=words).annotate(
+            search_rank=SearchRank('search__document', words),
+        )
+
+    def filter_stay(self, queryset, name, value):
+        # check_in/check_out only make sense together; see filter_queryset().
+        return queryset
 
     
     def filter_only_available(self, queryset, name, value):
-        print(value)
         if value:
-            today = timezone.localdate()
-            qs = queryset.exclude(
-                booking__status__in=[Booking.BookingStatus.CONFIRMED, Booking.BookingStatus.CHECKED_IN],
-                booking__check_in_date__lte=today,
-                booking__check_out_date__gte=today
-            )
-            return qs
+            return queryset.available()
         return queryset
\ No newline at end of file
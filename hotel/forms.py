@@ -1,11 +1,14 @@
 # hotel/forms.py
 from django import forms
 from .models import Room, Booking, Guest
+from .availability import get_index
+from .phones import normalize_phone
 from datetime import date, timedelta
 
 class RoomFilterForm(forms.Form):
     ROOM_TYPE_CHOICES = [('', 'Any')] + list(Room.RoomType.choices)
 
+    q = forms.CharField(required=False, max_length=200, label="Search")
     room_type = forms.ChoiceField(choices=ROOM_TYPE_CHOICES, required=False, label="Room Type")
     min_capacity = forms.IntegerField(required=False, min_value=1, label="Min Capacity")
     max_capacity = forms.IntegerField(required=False, min_value=1, label="Max Capacity")
@@ -17,6 +20,26 @@ class RoomFilterForm(forms.Form):
         label="Only Available",
         widget=forms.CheckboxInput(attrs={'value': 'true'})
     )
+    check_in = forms.DateField(
+        required=False,
+        label="Check-in",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    check_out = forms.DateField(
+        required=False,
+        label="Check-out",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        check_in = cleaned_data.get('check_in')
+        check_out = cleaned_data.get('check_out')
+        if bool(check_in) != bool(check_out):
+            raise forms.ValidationError("Enter both check-in and check-out dates.")
+        if check_in and check_out <= check_in:
+            raise forms.ValidationError("Check-out date must be after check-in date.")
+        return cleaned_data
 
 class BookingForm(forms.ModelForm):
     first_name = forms.CharField(max_length=50, label="First Name")
@@ -38,14 +61,17 @@ class BookingForm(forms.ModelForm):
             'notes': 'Additional Notes (optional)',
         }
 
-    def __init__(self, *args, room=None, **kwargs):
+    def __init__(self, *args, room=None, available_periods=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.room = room
+        if room and available_periods is None:
+            available_periods = room.get_available_periods()
+        self.available_periods = available_periods or []
         if room:
             # Set min and max dates based on available periods
             today = date.today()
             max_date = today + timedelta(days=30)
-            periods = room.get_available_periods()
+            periods = self.available_periods
             if periods:
                 # Use the earliest available date as the minimum
                 min_date = periods[0][0]
@@ -75,9 +101,8 @@ class BookingForm(forms.ModelForm):
 
             # Check if the selected range falls within an available period
             if self.room:
-                periods = self.room.get_available_periods()
                 is_valid_period = False
-                for period in periods:
+                for period in self.available_periods:
                     period_start, period_end = period
                     if (check_in_date >= period_start and check_out_date <= period_end):
                         is_valid_period = True
@@ -86,12 +111,13 @@ class BookingForm(forms.ModelForm):
                     raise forms.ValidationError("Selected dates are not within an available period.")
 
                 # Check for overlapping bookings
-                conflicting_bookings = Booking.objects.filter(
-                    room=self.room,
-                    status__in=['confirmed', 'checked_in'],
-                    check_in_date__lt=check_out_date,
-                    check_out_date__gt=check_in_date
-                ).exists()
+                index = get_index()
+                if index is not None:
+                    conflicting_bookings = not index.is_free(self.room.pk, check_in_date, check_out_date)
+                else:
+                    conflicting_bookings = Booking.objects.active().overlapping(
+                        check_in_date, check_out_date
+                    ).filter(room=self.room).exists()
                 if conflicting_bookings:
                     raise forms.ValidationError("Room is not available for the selected dates.")
 
@@ -99,4 +125,33 @@ class BookingForm(forms.ModelForm):
     
 
 class PhoneLoginForm(forms.Form):
-    phone = forms.CharField(label="Номер телефону", max_length=20)
\ No newline at end of file
+    phone = forms.CharField(label="Номер телефону", max_length=20)
+
+    def clean_phone(self):
+        phone = normalize_phone(self.cleaned_data['phone'])
+        if phone is None:
+            raise forms.ValidationError("Enter a valid phone number.")
+        return phone
+
+
+class AnalyticsForm(forms.Form):
+    MAX_DAYS = 10 * 366
+    BY_CHOICES = [('', 'Day'), ('room_type', 'Room type'), ('channel', 'Booking channel')]
+
+    start = forms.DateField(required=False, label="From", widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(
+        required=False, label="Until (exclusive)", widget=forms.DateInput(attrs={'type': 'date'}),
+    )
+    by = forms.ChoiceField(choices=BY_CHOICES, required=False, label="Per")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # The last 30 days, today included, by default.
+        end = cleaned_data.get('end') or date.today() + timedelta(days=1)
+        start = cleaned_data.get('start') or end - timedelta(days=30)
+        if end <= start:
+            raise forms.ValidationError("The end date must be after the start date.")
+        if (end - start).days > self.MAX_DAYS:
+            raise forms.ValidationError(f"Reports cover at most {self.MAX_DAYS} days.")
+        cleaned_data.update(start=start, end=end, by=cleaned_data.get('by') or None)
+        return cleaned_data
@@ -0,0 +1,206 @@
+"""
+Database-backed background jobs.
+
+Work that does not have to finish before a response is sent -- booking
+confirmations, and optionally the page cache invalidation of a booking -- is
+stored as a ``Job`` row by ``enqueue()`` and run by ``manage.py
+run_worker``. Enqueued inside a transaction, a job commits or rolls back
+with the data it is about.
+
+Workers claim due jobs with a lease (``JobQuerySet.claim()``). A worker
+that dies leaves its jobs to be claimed again once the lease runs out, so
+a job can run more than once and handlers must be idempotent. A handler
+that raises is retried with exponential backoff up to ``max_attempts``
+times. Jobs of the same name are claimed together, up to the handler's
+``batch_size``, and handed to it as one list.
+
+With ``HOTEL_JOBS_EAGER`` set, ``enqueue()`` runs the handler itself when
+the transaction commits instead of storing a row, for development
+without a worker.
+"""
+import logging
+import threading
+import time
+import traceback
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, connections, router, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import cache, metrics, tenants
+from .models import Booking, Job
+
+logger = logging.getLogger('hotel.jobs')
+
+HANDLERS = {}
+LEASE = timedelta(minutes=5)
+# How long finished jobs, and so their idempotency keys, are kept.
+KEEP_DONE = timedelta(days=1)
+
+
+class Handler:
+    def __init__(self, func, batch_size, max_attempts):
+        self.func = func
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+
+def handler(name, batch_size=1, max_attempts=5):
+    """Register ``func(payloads)`` to run jobs called ``name``, up to
+    ``batch_size`` at a time."""
+    def decorator(func):
+        HANDLERS[name] = Handler(func, batch_size, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, key=None, delay=None, using=None):
+    """Store a job to run ``name`` with ``payload`` (JSON-serializable), by
+    default in the current hotel's database.
+
+    A job with the same ``key`` already stored, queued or done within
+    ``KEEP_DONE``, makes this a no-op. Returns the ``Job``, or None when run
+    eagerly.
+    """
+    payload = payload or {}
+    using = using or router.db_for_write(Job)
+    if getattr(settings, 'HOTEL_JOBS_EAGER', False):
+        transaction.on_commit(lambda: HANDLERS[name].func([payload]), using=using)
+        return None
+    job = Job(
+        name=name, payload=payload, key=key, max_attempts=HANDLERS[name].max_attempts,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+    if key is None:
+        # save() needs no transaction of its own for a single INSERT.
+        job.save(using=using)
+    else:
+        Job.objects.using(using).bulk_create([job], ignore_conflicts=True)
+    return job
+
+
+def run_batch(jobs):
+    """Run claimed ``jobs`` of one name and record the outcome. Returns
+    whether they succeeded."""
+    name = jobs[0].name
+    started = time.perf_counter()
+    try:
+        HANDLERS[name].func([job.payload for job in jobs])
+    except Exception:
+        logger.exception("%d %s jobs failed", len(jobs), name)
+        metrics.incr(f'jobs.{name}.failed', len(jobs))
+        Job.objects.retry(jobs, traceback.format_exc())
+        return False
+    Job.objects.finish(jobs)
+    metrics.observe(f'jobs.{name}', time.perf_counter() - started)
+    metrics.incr(f'jobs.{name}.done', len(jobs))
+    return True
+
+
+class Worker:
+    """Claims and runs jobs in ``threads`` threads until ``stop`` is set,
+    or, with ``burst``, until no job is due.
+
+    Jobs are read from the database of ``hotel`` (a slug, see
+    ``hotel/tenants.py``), by default the one of ``HOTEL_DEFAULT`` and
+    every hotel without a database of its own.
+
+    ``stats`` maps each job name to ``[done, failed, seconds]``.
+    """
+
+    def __init__(
+        self, threads=1, names=None, lease=LEASE, poll_interval=1.0, burst=False, stop=None, hotel=None,
+    ):
+        self.threads = threads
+        self.names = names
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stop = stop or threading.Event()
+        self.hotel = hotel
+        self.stats = defaultdict(lambda: [0, 0, 0.0])
+        self._lock = threading.Lock()
+
+    def run(self):
+        threads = [threading.Thread(target=self.work, daemon=True) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return dict(self.stats)
+
+    def work(self):
+        purged_at = 0
+        # Threads start with an empty context, so each activates the hotel.
+        with tenants.activate(self.hotel):
+            try:
+                while not self.stop.is_set():
+                    close_old_connections()
+                    if self.run_once():
+                        continue
+                    if time.monotonic() - purged_at > KEEP_DONE.total_seconds() / 24:
+                        Job.objects.expire()
+                        Job.objects.purge(timezone.now() - KEEP_DONE)
+                        purged_at = time.monotonic()
+                    if self.burst:
+                        return
+                    self.stop.wait(self.poll_interval)
+            finally:
+                connections.close_all()
+
+    def run_once(self):
+        """Claim and run one batch; False if no job was due."""
+        names = self.names if self.names is not None else HANDLERS
+        jobs = Job.objects.claim(self.lease, {name: HANDLERS[name].batch_size for name in names})
+        if not jobs:
+            return False
+        started = time.perf_counter()
+        succeeded = run_batch(jobs)
+        with self._lock:
+            stats = self.stats[jobs[0].name]
+            stats[0 if succeeded else 1] += len(jobs)
+            stats[2] += time.perf_counter() - started
+        return True
+
+
+@handler('booking.confirmation', batch_size=50)
+def send_confirmations(payloads):
+    """Email each guest the details of their booking, all over one mail
+    server connection."""
+    bookings = Booking.objects.filter(
+        pk__in=[payload['booking'] for payload in payloads],
+    ).exclude(status=Booking.BookingStatus.CANCELED).select_related('room', 'guest')
+    messages = [
+        EmailMessage(
+            subject=f"Booking #{booking.pk} confirmed",
+            body=render_to_string('bookings/confirmation_email.txt', {'booking': booking}),
+            to=[booking.guest.email],
+        )
+        for booking in bookings
+    ]
+    if messages:
+        get_connection().send_messages(messages)
+
+
+@handler('cache.invalidate', batch_size=500)
+def invalidate_caches(payloads):
+    """``cache.invalidate()`` for the changes of many transactions at once.
+
+    Queued by ``hotel/signals.py`` when ``HOTEL_QUEUE_CACHE_INVALIDATION``
+    is set.
+    """
+    merged = defaultdict(set)
+    for payload in payloads:
+        for name, values in payload.items():
+            merged[name].update(values)
+    cache.invalidate(
+        rooms=merged['rooms'],
+        days=[date.fromisoformat(day) for day in merged['days']],
+        availability=merged['availability'],
+        guests=merged['guests'],
+        rates=[date.fromisoformat(month) if month else None for month in merged['rates']],
+    )
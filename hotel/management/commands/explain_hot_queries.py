@@ -0,0 +1,61 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from hotel.filters import RoomFilter
+from hotel.models import Booking, Guest, Room
+
+# Full scans of the large tables, as reported by SQLite and PostgreSQL.
+FULL_SCAN = re.compile(
+    r'\bSCAN (hotel_booking|hotel_guest|hotel_roomnight|U\d+)\b(?! USING)|Seq Scan on hotel_(booking|guest|roomnight)'
+)
+
+
+class Command(BaseCommand):
+    help = "Print the query plan of every availability and booking lookup hot path."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Exit with an error if any hot query falls back to a full table scan.",
+        )
+
+    def handle(self, *args, **options):
+        regressions = []
+        for label, queryset in self.hot_queries():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(plan + '\n')
+            if FULL_SCAN.search(plan):
+                regressions.append(label)
+
+        if options['check'] and regressions:
+            raise CommandError("Full table scan in: " + ', '.join(regressions))
+
+    def hot_queries(self):
+        today = timezone.localdate()
+        check_in, check_out = today + timedelta(days=7), today + timedelta(days=10)
+        room = Room.objects.order_by('pk').first() or Room(pk=0, hotel_id=0)
+        # The views filter on the request's hotel.
+        rooms = Room.objects.filter(hotel_id=room.hotel_id)
+        guest = Guest.objects.exclude(phone_normalized=None).order_by('pk').first()
+        phone = guest.phone_normalized if guest else '+380000000000'
+        active = Booking.objects.active()
+
+        return [
+            ("Room.is_available", active.on_date(today).filter(room=room).order_by()),
+            ("Room.get_next_available_date", active.filter(room=room, check_out_date__gte=today).order_by('check_out_date')),
+            ("Room.get_available_periods", active.filter(
+                room=room, check_out_date__gte=today, check_in_date__lte=today + timedelta(days=30),
+            ).order_by('check_in_date')),
+            ("BookingForm.clean overlap", active.overlapping(check_in, check_out).filter(room=room).order_by()),
+            ("RoomFilter only_available", RoomFilter({'only_available': 'true'}, queryset=rooms).qs),
+            ("RoomFilter check_in/check_out", RoomFilter(
+                {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()},
+                queryset=rooms,
+            ).qs),
+            ("BookingListView by phone", Booking.objects.for_phone(room.hotel_id, phone)
+                .select_related('room', 'guest').order_by('-check_in_date', '-pk')),
+        ]
@@ -0,0 +1,41 @@
+from contextlib import nullcontext
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from hotel.feeds import FORMATS, export_rows, write_rows
+from hotel.models import Booking
+from hotel.tenants import activate
+
+
+class Command(BaseCommand):
+    help = "Stream bookings to a CSV or JSON lines feed that import_bookings can read back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help="Output file, or - for standard output.")
+        parser.add_argument('--format', choices=FORMATS, help="Feed format (default: from the file extension).")
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help="Only bookings checking out on or after this date (YYYY-MM-DD).",
+        )
+        parser.add_argument('--status', action='append', choices=Booking.BookingStatus.values)
+        parser.add_argument('--hotel', help="Slug of the hotel to export (default: HOTEL_DEFAULT).")
+
+    def handle(self, *args, **options):
+        path = options['output']
+        format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+
+        slug = options['hotel'] or settings.HOTEL_DEFAULT
+        queryset = Booking.objects.filter(hotel__slug=slug)
+        if options['since']:
+            queryset = queryset.filter(check_out_date__gte=options['since'])
+        if options['status']:
+            queryset = queryset.filter(status__in=options['status'])
+
+        try:
+            output = nullcontext(self.stdout) if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with activate(slug), output as stream:
+            write_rows(stream, format, export_rows(queryset))
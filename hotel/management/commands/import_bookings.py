@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+from contextlib import nullcontext
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from hotel.feeds import CHUNK_SIZE, FORMATS, import_chunk, read_rows
+from hotel.models import Booking, Hotel
+from hotel.tenants import activate
+
+
+class Command(BaseCommand):
+    help = "Import bookings from a CSV or JSON lines feed, one transaction per chunk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or - for standard input.")
+        parser.add_argument('--format', choices=FORMATS, help="Feed format (default: from the file extension).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--channel', choices=Booking.BookingChannel.values, default=Booking.BookingChannel.AGENT,
+            help="Booking channel for rows that do not name one.",
+        )
+        parser.add_argument('--hotel', help="Slug of the hotel whose rooms the feed books (default: HOTEL_DEFAULT).")
+        parser.add_argument(
+            '--rejects',
+            help="Where to write rejected rows as JSON lines (default: <path>.rejects.jsonl).",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        rejects_path = options['rejects'] or ('import_rejects.jsonl' if path == '-' else f'{path}.rejects.jsonl')
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        slug = options['hotel'] or settings.HOTEL_DEFAULT
+        with activate(slug):
+            hotel = Hotel.objects.filter(slug=slug).first()
+        if hotel is None:
+            raise CommandError(f"No hotel {slug!r}.")
+
+        try:
+            source = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+
+        started = time.perf_counter()
+        created = rejected = 0
+        with activate(slug), source as stream, open(rejects_path, 'w', encoding='utf-8') as rejects:
+            rows = read_rows(stream, format)
+            while chunk := list(islice(rows, options['chunk_size'])):
+                count, chunk_rejects = import_chunk(chunk, options['channel'], hotel)
+                created += count
+                rejected += len(chunk_rejects)
+                for number, row, reason in sorted(chunk_rejects, key=lambda reject: reject[0]):
+                    rejects.write(json.dumps({'line': number, 'reason': reason, 'row': row}) + '\n')
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{created + rejected} rows read")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} bookings in {elapsed:.1f}s "
+            f"({(created + rejected) / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+        if rejected:
+            self.stdout.write(self.style.WARNING(f"Rejected {rejected} rows, see {rejects_path}."))
+        else:
+            os.remove(rejects_path)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hotel.models import Room, RoomNight
+from hotel.signals import data_changed
+
+
+class Command(BaseCommand):
+    help = "Recreate the RoomNight inventory from the bookings, e.g. after writing bookings with raw SQL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Bookings read and nights inserted per batch.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stored, dropped = RoomNight.objects.rebuild(chunk_size=options['chunk_size'])
+        # Availability is read from the nights, so every cached answer may be stale.
+        data_changed(catalogue=Room.objects.values_list('pk', flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} room nights in {time.perf_counter() - started:.1f}s."
+        ))
+        if dropped:
+            self.stdout.write(self.style.WARNING(
+                f"Dropped {dropped} nights of active bookings that overlap another active booking of the same room."
+            ))
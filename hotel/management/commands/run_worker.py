@@ -0,0 +1,99 @@
+import multiprocessing
+import signal
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (hotel/jobs.py) until stopped, or with --burst until none is due."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=1, help="Threads per process.")
+        parser.add_argument('--job', action='append', dest='names', help="Run only jobs with this name.")
+        parser.add_argument(
+            '--lease', type=float, default=300,
+            help="Seconds a claimed batch is reserved for; keep it above the slowest batch.",
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait when idle.")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due.")
+        parser.add_argument(
+            '--hotel', help="Run the jobs of this hotel's own database (HOTEL_DATABASES) instead of the default one.",
+        )
+
+    def handle(self, *args, **options):
+        from hotel.jobs import HANDLERS
+
+        if options['processes'] < 1 or options['threads'] < 1:
+            raise CommandError("--processes and --threads must be positive.")
+        if options['hotel'] is not None and options['hotel'] not in settings.HOTEL_DATABASES:
+            raise CommandError(f"Hotel {options['hotel']!r} has no database of its own (HOTEL_DATABASES).")
+        unknown = set(options['names'] or ()) - HANDLERS.keys()
+        if unknown:
+            raise CommandError(f"Unknown jobs: {', '.join(sorted(unknown))}. Known: {', '.join(sorted(HANDLERS))}.")
+
+        started = time.perf_counter()
+        if options['processes'] == 1:
+            stop = threading.Event()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: stop.set())
+            stats = run_process(options, stop)
+        else:
+            stats = self.run_processes(options)
+        elapsed = time.perf_counter() - started
+
+        for name, (done, failed, seconds) in sorted(stats.items()):
+            self.stdout.write(
+                f"{name}: {done} done, {failed} failed, "
+                f"{done / seconds if seconds else 0:.0f} jobs/s while running, {done / elapsed:.0f} jobs/s overall"
+            )
+
+    def run_processes(self, options):
+        context = multiprocessing.get_context('spawn')
+        stop, results = context.Event(), context.Queue()
+        processes = [
+            context.Process(target=run_process, args=(options, stop, results))
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        stats = {}
+        for _ in processes:
+            for name, values in results.get().items():
+                stats[name] = [a + b for a, b in zip(stats.get(name, [0, 0, 0.0]), values)]
+        for process in processes:
+            process.join()
+        return stats
+
+
+def run_process(options, stop, results=None):
+    """Run a worker with ``options['threads']`` threads in this process.
+    Spawned processes report their stats on ``results``."""
+    if results is not None:
+        import django
+
+        # Interrupts are for the parent, which stops every process.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        django.setup()
+    from hotel.jobs import Worker
+
+    worker = Worker(
+        threads=options['threads'],
+        names=options['names'],
+        lease=timedelta(seconds=options['lease']),
+        poll_interval=options['poll_interval'],
+        burst=options['burst'],
+        stop=stop,
+        hotel=options['hotel'],
+    )
+    stats = worker.run()
+    if results is not None:
+        results.put(stats)
+    return stats
@@ -0,0 +1,33 @@
+"""
+Process-local counters for the staff metrics endpoint.
+
+Under gunicorn every worker keeps its own numbers; the endpoint reports the
+worker that served the request.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_values = defaultdict(float)
+
+
+def incr(name, value=1):
+    with _lock:
+        _values[name] += value
+
+
+def observe(name, seconds):
+    with _lock:
+        _values[f'{name}.count'] += 1
+        _values[f'{name}.seconds'] += seconds
+        _values[f'{name}.max_seconds'] = max(_values[f'{name}.max_seconds'], seconds)
+
+
+def snapshot():
+    with _lock:
+        return dict(sorted(_values.items()))
+
+
+def reset():
+    with _lock:
+        _values.clear()
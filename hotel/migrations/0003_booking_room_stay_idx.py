@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0002_remove_room_is_available'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['room', 'check_out_date', 'check_in_date', 'status'], name='booking_room_stay_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0003_booking_room_stay_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_room_stay_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status__in', ['confirmed', 'checked_in'])), fields=['room', 'check_out_date', 'check_in_date'], name='booking_active_stay_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['guest', '-check_in_date'], name='booking_guest_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['-booking_date'], name='booking_booking_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(fields=['phone'], name='guest_phone_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+CREATE_CONSTRAINT = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE hotel_booking ADD CONSTRAINT booking_no_overlap EXCLUDE USING gist (
+    room_id WITH =,
+    daterange(check_in_date, check_out_date) WITH &&
+) WHERE (status IN ('confirmed', 'checked_in'));
+"""
+
+DROP_CONSTRAINT = "ALTER TABLE hotel_booking DROP CONSTRAINT IF EXISTS booking_no_overlap;"
+
+
+def create_constraint(apps, schema_editor):
+    # PostgreSQL only: SQLite relies on Booking.objects.reserve() alone.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_CONSTRAINT)
+
+
+def drop_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0004_booking_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_constraint, drop_constraint),
+    ]
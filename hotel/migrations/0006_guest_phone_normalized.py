@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+from hotel.phones import normalize_phone
+
+BATCH_SIZE = 5000
+
+
+def backfill_phone_normalized(apps, schema_editor):
+    Guest = apps.get_model('hotel', 'Guest')
+    connection = schema_editor.connection
+    guests = Guest.objects.using(connection.alias).exclude(phone=None).order_by('pk')
+    # executemany() rather than bulk_update(): its CASE WHEN per row made a
+    # million guests take minutes.
+    update = 'UPDATE {} SET {} = %s WHERE {} = %s'.format(
+        connection.ops.quote_name(Guest._meta.db_table),
+        connection.ops.quote_name('phone_normalized'),
+        connection.ops.quote_name(Guest._meta.pk.column),
+    )
+    last_pk = 0
+    with connection.cursor() as cursor:
+        while batch := list(guests.filter(pk__gt=last_pk).values_list('pk', 'phone')[:BATCH_SIZE]):
+            cursor.executemany(update, [(normalize_phone(phone), pk) for pk, phone in batch])
+            last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0005_booking_no_overlap'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='guest',
+            name='guest_phone_idx',
+        ),
+        migrations.AddField(
+            model_name='guest',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+        # Backfill before indexing, so the index is built once.
+        migrations.RunPython(backfill_phone_normalized, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(fields=['phone_normalized'], name='guest_phone_normalized_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.constants import OnConflict
+
+BATCH_SIZE = 5000
+
+
+def fill_room_nights(apps, schema_editor):
+    Booking = apps.get_model('hotel', 'Booking')
+    connection = schema_editor.connection
+    bookings = Booking.objects.using(connection.alias).exclude(status='canceled').values_list(
+        'pk', 'room_id', 'check_in_date', 'check_out_date', 'status',
+    )
+    # executemany() rather than bulk_create(), as in 0006. Overlapping active
+    # bookings already stored keep only the first one's nights;
+    # `manage.py rebuild_room_nights` reports them.
+    insert = '{} hotel_roomnight (booking_id, room_id, date, status) VALUES (%s, %s, %s, %s) {}'.format(
+        connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        connection.ops.on_conflict_suffix_sql(None, OnConflict.IGNORE, None, None),
+    )
+    batch = []
+    with connection.cursor() as cursor:
+        for booking_id, room_id, check_in, check_out, status in bookings.iterator(chunk_size=BATCH_SIZE):
+            batch.extend(
+                (booking_id, room_id, connection.ops.adapt_datefield_value(check_in + timedelta(days=n)), status)
+                for n in range((check_out - check_in).days)
+            )
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        cursor.executemany(insert, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0006_guest_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('confirmed', 'Confirmed'), ('canceled', 'Canceled'), ('checked_in', 'Checked In'), ('checked_out', 'Checked Out')], max_length=12)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='hotel.booking')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='hotel.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['confirmed', 'checked_in'])), fields=('room', 'date'), name='room_night_active_unique')],
+            },
+        ),
+        migrations.RunPython(fill_room_nights, migrations.RunPython.noop),
+        # Indexed after the fill, so the index is built once.
+        migrations.AddIndex(
+            model_name='roomnight',
+            index=models.Index(fields=['date', 'status'], name='room_night_date_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models.constants import OnConflict
+
+BATCH_SIZE = 5000
+
+
+def empty_room_nights(apps, schema_editor):
+    # Nights are derived data: refilling them is cheaper than adding columns
+    # to a full table, which SQLite does by copying it once per column.
+    RoomNight = apps.get_model('hotel', 'RoomNight')
+    RoomNight.objects.using(schema_editor.connection.alias).all().delete()
+
+
+def fill_room_nights(apps, schema_editor):
+    Booking = apps.get_model('hotel', 'Booking')
+    connection = schema_editor.connection
+    bookings = Booking.objects.using(connection.alias).exclude(status='canceled').values_list(
+        'pk', 'room_id', 'check_in_date', 'check_out_date', 'status',
+        'booking_channel', 'room__room_type', 'room__price_per_night',
+    )
+    insert = (
+        '{} hotel_roomnight (booking_id, room_id, date, status, room_type, channel, rate) '
+        'VALUES (%s, %s, %s, %s, %s, %s, %s) {}'
+    ).format(
+        connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        connection.ops.on_conflict_suffix_sql(None, OnConflict.IGNORE, None, None),
+    )
+    batch = []
+    with connection.cursor() as cursor:
+        for booking_id, room_id, check_in, check_out, status, channel, room_type, rate in bookings.iterator(
+            chunk_size=BATCH_SIZE,
+        ):
+            rate = connection.ops.adapt_decimalfield_value(rate)
+            batch.extend(
+                (
+                    booking_id, room_id, connection.ops.adapt_datefield_value(check_in + timedelta(days=n)),
+                    status, room_type, channel, rate,
+                )
+                for n in range((check_out - check_in).days)
+            )
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        cursor.executemany(insert, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0007_room_night'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='roomnight',
+            name='room_night_date_idx',
+        ),
+        migrations.RunPython(empty_room_nights, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='roomnight',
+            name='channel',
+            field=models.CharField(choices=[('online', 'Online'), ('phone', 'Phone'), ('in_person', 'In Person'), ('agent', 'Travel Agent')], default='', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='roomnight',
+            name='rate',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='roomnight',
+            name='room_type',
+            field=models.CharField(choices=[('single', 'Single'), ('double', 'Double'), ('suite', 'Suite'), ('family', 'Family'), ('deluxe', 'Deluxe')], default='', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_room_nights, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='roomnight',
+            index=models.Index(fields=['date', 'room_type', 'channel', 'rate'], name='room_night_report_idx'),
+        ),
+    ]
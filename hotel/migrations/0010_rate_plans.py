@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:36
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0009_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatePlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('priority', models.SmallIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['priority', 'pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RateRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_type', models.CharField(blank=True, choices=[('single', 'Single'), ('double', 'Double'), ('suite', 'Suite'), ('family', 'Family'), ('deluxe', 'Deluxe')], max_length=10)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('weekdays', models.CharField(blank=True, max_length=7, validators=[django.core.validators.RegexValidator('^[1-7]*$', 'ISO weekday numbers, 1 to 7.')])),
+                ('min_occupancy', models.PositiveSmallIntegerField(blank=True, help_text="Percent of the room type's rooms sold that night.", null=True, validators=[django.core.validators.MaxValueValidator(100)])),
+                ('adjustment', models.CharField(choices=[('percent', 'Percent'), ('amount', 'Amount per night')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='hotel.rateplan')),
+            ],
+            options={
+                'ordering': ['plan__priority', 'plan', 'pk'],
+            },
+        ),
+    ]
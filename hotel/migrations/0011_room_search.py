@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:51
+
+import django.db.models.deletion
+import hotel.models
+from django.db import migrations, models
+
+
+COLUMNS = 'room_number, room_type, capacity, price_per_night, description'
+NEW_VALUES = "new.room_number, new.room_type, new.capacity, new.price_per_night, coalesce(new.description, '')"
+# The no-op UPDATE that BookingQuerySet.reserve() locks rooms with must not
+# rewrite the document.
+CHANGED = (
+    'old.room_number IS NOT new.room_number OR old.room_type IS NOT new.room_type'
+    ' OR old.capacity IS NOT new.capacity OR old.price_per_night IS NOT new.price_per_night'
+    ' OR old.description IS NOT new.description'
+)
+
+SQLITE = [
+    f"""CREATE VIRTUAL TABLE hotel_room_search USING fts5(
+        room_number, room_type, capacity UNINDEXED, price_per_night UNINDEXED, description,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""INSERT INTO hotel_room_search (rowid, {COLUMNS})
+        SELECT id, room_number, room_type, capacity, price_per_night, coalesce(description, '') FROM hotel_room""",
+    f"""CREATE TRIGGER hotel_room_search_insert AFTER INSERT ON hotel_room BEGIN
+        INSERT INTO hotel_room_search (rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER hotel_room_search_update AFTER UPDATE ON hotel_room WHEN {CHANGED} BEGIN
+        DELETE FROM hotel_room_search WHERE rowid = old.id;
+        INSERT INTO hotel_room_search (rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES});
+    END""",
+    """CREATE TRIGGER hotel_room_search_delete AFTER DELETE ON hotel_room BEGIN
+        DELETE FROM hotel_room_search WHERE rowid = old.id;
+    END""",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS hotel_room_search_insert',
+    'DROP TRIGGER IF EXISTS hotel_room_search_update',
+    'DROP TRIGGER IF EXISTS hotel_room_search_delete',
+    'DROP TABLE IF EXISTS hotel_room_search',
+]
+
+POSTGRESQL = [
+    """CREATE TABLE hotel_room_search (
+        rowid bigint PRIMARY KEY REFERENCES hotel_room (id) ON DELETE CASCADE,
+        room_number varchar(10) NOT NULL,
+        room_type varchar(10) NOT NULL,
+        capacity smallint NOT NULL,
+        price_per_night numeric(10, 2) NOT NULL,
+        description text NOT NULL,
+        hotel_room_search tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', room_number || ' ' || room_type), 'A')
+            || setweight(to_tsvector('simple', description), 'B')
+        ) STORED
+    )""",
+    'CREATE INDEX hotel_room_search_document_idx ON hotel_room_search USING gin (hotel_room_search)',
+    f"""INSERT INTO hotel_room_search (rowid, {COLUMNS})
+        SELECT id, room_number, room_type, capacity, price_per_night, coalesce(description, '') FROM hotel_room""",
+    f"""CREATE FUNCTION hotel_room_search_write() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO hotel_room_search (rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES})
+        ON CONFLICT (rowid) DO UPDATE SET
+            room_number = excluded.room_number, room_type = excluded.room_type, capacity = excluded.capacity,
+            price_per_night = excluded.price_per_night, description = excluded.description;
+        RETURN NULL;
+    END
+    $$""",
+    """CREATE TRIGGER hotel_room_search_insert AFTER INSERT ON hotel_room
+        FOR EACH ROW EXECUTE FUNCTION hotel_room_search_write()""",
+    f"""CREATE TRIGGER hotel_room_search_update AFTER UPDATE ON hotel_room
+        FOR EACH ROW WHEN ({CHANGED.replace('IS NOT', 'IS DISTINCT FROM').replace('old.', 'OLD.').replace('new.', 'NEW.')})
+        EXECUTE FUNCTION hotel_room_search_write()""",
+]
+POSTGRESQL_DROP = [
+    'DROP TABLE IF EXISTS hotel_room_search',
+    'DROP TRIGGER IF EXISTS hotel_room_search_insert ON hotel_room',
+    'DROP TRIGGER IF EXISTS hotel_room_search_update ON hotel_room',
+    'DROP FUNCTION IF EXISTS hotel_room_search_write()',
+]
+
+
+def create_search(apps, schema_editor):
+    statements = {'sqlite': SQLITE, 'postgresql': POSTGRESQL}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0010_rate_plans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomSearch',
+            fields=[
+                ('room', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='hotel.room')),
+                ('room_number', models.CharField(max_length=10)),
+                ('room_type', models.CharField(max_length=10)),
+                ('capacity', models.PositiveSmallIntegerField()),
+                ('price_per_night', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.TextField()),
+                ('document', hotel.models.SearchDocumentField(db_column='hotel_room_search')),
+            ],
+            options={
+                'db_table': 'hotel_room_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:40
+
+import importlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def database_hotel(apps, schema_editor):
+    """The hotel a database holds the rooms of: the one it is named for in
+    HOTEL_DATABASES, else HOTEL_DEFAULT. Created if missing."""
+    Hotel = apps.get_model('hotel', 'Hotel')
+    alias = schema_editor.connection.alias
+    slug = next(
+        (slug for slug, database in settings.HOTEL_DATABASES.items() if database == alias),
+        settings.HOTEL_DEFAULT,
+    )
+    return Hotel.objects.using(alias).get_or_create(slug=slug, defaults={'name': slug.replace('-', ' ').title()})[0]
+
+
+def assign_hotel(apps, schema_editor):
+    hotel = database_hotel(apps, schema_editor)
+    alias = schema_editor.connection.alias
+    apps.get_model('hotel', 'Room').objects.using(alias).update(hotel=hotel)
+    apps.get_model('hotel', 'Booking').objects.using(alias).update(hotel=hotel)
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite rebuilds hotel_room to change its columns, dropping the room
+    # search triggers of 0011 with the old table.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    room_search = importlib.import_module('hotel.migrations.0011_room_search')
+    for statement in room_search.SQLITE_DROP[:3] + room_search.SQLITE[2:]:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0011_room_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hotel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='hotel',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rooms', to='hotel.hotel'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='hotel',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='hotel.hotel'),
+        ),
+        migrations.RunPython(assign_hotel, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='room',
+            name='hotel',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rooms', to='hotel.hotel'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='hotel',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='hotel.hotel'),
+        ),
+        migrations.AlterField(
+            model_name='room',
+            name='room_number',
+            field=models.CharField(max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='room',
+            constraint=models.UniqueConstraint(fields=('hotel', 'room_number'), name='room_hotel_number_unique'),
+        ),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_guest_checkin_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['hotel', 'guest', '-check_in_date'], name='booking_hotel_guest_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
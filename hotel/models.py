@@ -1,8 +1,94 @@
 # hotel/models.py
-from django.db import models
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, RegexValidator
+from django.db import IntegrityError, NotSupportedError, OperationalError, connections, models, router, transaction
+from django.db.models import BooleanField, Case, DecimalField, Exists, F, OuterRef, Value, When
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Round
 from django.utils import timezone
 from datetime import date, timedelta
-from django.utils import timezone
+
+from . import metrics
+from .availability import get_index
+from .phones import normalize_phone
+from .tenants import current_slug
+
+RESERVE_ATTEMPTS = 5
+RESERVE_BACKOFF = 0.02  # seconds, doubled on every retry
+JOB_RETRY_BACKOFF = 10  # seconds, doubled on every attempt
+JOB_ERROR_LENGTH = 2000
+MAX_SEARCH_TERMS = 8
+
+
+class RoomUnavailable(Exception):
+    pass
+
+
+class HotelQuerySet(models.QuerySet):
+    def current(self):
+        """The hotel of the current request (``hotel/tenants.py``), or
+        ``HOTEL_DEFAULT`` outside one, created if missing."""
+        slug = current_slug.get() or settings.HOTEL_DEFAULT
+        return self.get_or_create(slug=slug, defaults={'name': slug.replace('-', ' ').title()})[0]
+
+
+class Hotel(models.Model):
+    """A property. Its rooms and bookings are served under
+    ``/hotels/<slug>/``; see ``hotel/tenants.py``."""
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=50, unique=True)
+
+    objects = HotelQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
+class RoomQuerySet(models.QuerySet):
+    def available(self, check_in=None, check_out=None):
+        """Rooms with no active booking on ``check_in`` (default today), or
+        overlapping the ``[check_in, check_out)`` stay when both are given.
+
+        An anti-join on ``RoomNight``: one probe of its unique index per room.
+        """
+        if check_in is None:
+            check_in = timezone.localdate()
+        if check_out is None:
+            # Like Booking.objects.on_date(), a stay ending on the day counts.
+            check_in, check_out = check_in - timedelta(days=1), check_in + timedelta(days=1)
+        taken = RoomNight.objects.active().filter(room=OuterRef('pk'), date__gte=check_in, date__lt=check_out)
+        return self.filter(~Exists(taken))
+
+    def available_periods(self, max_days=30):
+        """Map each room id in the queryset to its free ``(start, end)``
+        periods over the next ``max_days`` days."""
+        return Booking.objects.available_periods(self.values_list('pk', flat=True), max_days)
+
+    async def aavailable_periods(self, max_days=30):
+        room_ids = [pk async for pk in self.values_list('pk', flat=True)]
+        return await Booking.objects.aavailable_periods(room_ids, max_days)
+
+    def with_stay_total(self, check_in, check_out):
+        """Annotate ``stay_total``, the price of the ``[check_in, check_out)``
+        stay at the nightly rates of ``hotel/pricing.py``: one ``CASE`` over
+        the room types, so the database prices and sorts every room."""
+        from .pricing import RateTable  # imports this module
+
+        total = Case(*[
+            When(room_type=room_type, then=F('price_per_night') * Value(factor) + Value(amount))
+            for room_type, (factor, amount) in RateTable.load(check_in, check_out).sums(check_in, check_out).items()
+        ], output_field=DecimalField(max_digits=12, decimal_places=2))
+        return self.annotate(stay_total=Round(total, 2))
+
 
 class Room(models.Model):
     class RoomType(models.TextChoices):
@@ -12,7 +98,9 @@ class Room(models.Model):
         FAMILY = 'family', 'Family'
         DELUXE = 'deluxe', 'Deluxe'
     
-    room_number = models.CharField(max_length=10, unique=True)
+    # Indexed by room_hotel_number_unique, which leads with it.
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='rooms', db_index=False)
+    room_number = models.CharField(max_length=10)
     room_type = models.CharField(
         max_length=10,
         choices=RoomType.choices,
@@ -23,25 +111,23 @@ class Room(models.Model):
     description = models.TextField(blank=True, null=True)
     # is_available = models.BooleanField(default=True)
 
+    objects = RoomQuerySet.as_manager()
+
     @property
     def is_available(self):
         today = timezone.localdate()
-        return not Booking.objects.filter(
-            room=self,
-            status__in=[Booking.BookingStatus.CONFIRMED, Booking.BookingStatus.CHECKED_IN],
-            check_in_date__lte=today,
-            check_out_date__gte=today,
-        ).exists()
-    
+        index = get_index()
+        if index is not None:
+            return index.is_free_on(self.pk, today)
+        return not Booking.objects.active().on_date(today).filter(room=self).exists()
 
     def __str__(self):
         return f"Room {self.room_number} ({self.room_type})"
 
     def get_next_available_date(self):
         today = date.today()
-        bookings = Booking.objects.filter(
+        bookings = Booking.objects.active().filter(
             room=self,
-            status__in=['confirmed', 'checked_in'],
             check_out_date__gte=today
         ).order_by('check_out_date')
         
@@ -52,45 +138,388 @@ class Room(models.Model):
         return last_booking.check_out_date
 
     def get_available_periods(self, max_days=30):
-        today = date.today()
-        max_date = today + timedelta(days=max_days)
-        bookings = Booking.objects.filter(
-            room=self,
-            status__in=['confirmed', 'checked_in'],
-            check_out_date__gte=today,
-            check_in_date__lte=max_date
-        ).order_by('check_in_date')
+        return Booking.objects.available_periods([self.pk], max_days)[self.pk]
 
-        periods = []
-        current_date = today
+    def save(self, *args, **kwargs):
+        if self.hotel_id is None:
+            using = kwargs.get('using') or router.db_for_write(Room, instance=self)
+            self.hotel = Hotel.objects.using(using).current()
+        super().save(*args, **kwargs)
 
-        if not bookings.exists():
-            return [(today, max_date)]
+    class Meta:
+        ordering = ['room_number']
+        constraints = [
+            # Also serves each hotel's room list, in room number order.
+            models.UniqueConstraint(fields=['hotel', 'room_number'], name='room_hotel_number_unique'),
+        ]
+
+def search_terms(text):
+    """The words of a free-text search, lowercased, at most
+    ``MAX_SEARCH_TERMS``."""
+    return re.findall(r'\w+', text.lower())[:MAX_SEARCH_TERMS]
+
+
+class SearchDocumentField(models.Field):
+    """The full-text column of ``RoomSearch``: on SQLite, the hidden column
+    FTS5 names after its table; on PostgreSQL, a ``tsvector`` of the same
+    name. Written by the database, read only through ``matches`` and
+    ``SearchRank``."""
+
+    def db_type(self, connection):
+        return 'tsvector' if connection.vendor == 'postgresql' else None
+
+
+@SearchDocumentField.register_lookup
+class Matches(models.Lookup):
+    """``document__matches=words``: documents containing every word of the
+    list ``words``, or a word starting with it."""
+    lookup_name = 'matches'
 
-        for booking in bookings:
-            if current_date < booking.check_in_date:
-                periods.append((current_date, booking.check_in_date))
-            current_date = max(current_date, booking.check_out_date)
+    def get_db_prep_lookup(self, value, connection):
+        if connection.vendor == 'postgresql':
+            return '%s', [' & '.join(f'{word}:*' for word in value)]
+        return '%s', [' '.join(f'"{word}"*' for word in value)]
 
-        if current_date < max_date:
-            periods.append((current_date, max_date))
+    def as_sql(self, compiler, connection):
+        if connection.vendor != 'sqlite':
+            raise NotSupportedError("Room search needs SQLite FTS5 or PostgreSQL.")
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
 
-        return periods
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} @@ to_tsquery('simple', {rhs})", lhs_params + rhs_params
+
+
+class SearchRank(models.Func):
+    """Relevance of the ``document`` (a ``SearchDocumentField`` reference)
+    matched in the same query to ``words``; lower ranks first, as FTS5's
+    bm25 does. Only valid alongside a ``matches`` filter."""
+    output_field = models.FloatField()
+
+    def __init__(self, document, words):
+        super().__init__(F(document), Value(' & '.join(f'{word}:*' for word in words)))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # FTS5 ranks the rows its MATCH returns in a hidden "rank" column.
+        document = self.source_expressions[0]
+        return f'{compiler.quote_name_unless_alias(document.alias)}.{connection.ops.quote_name("rank")}', []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        document, document_params = compiler.compile(self.source_expressions[0])
+        words, words_params = compiler.compile(self.source_expressions[1])
+        return f"-ts_rank({document}, to_tsquery('simple', {words}))", document_params + words_params
+
+
+class RoomSearch(models.Model):
+    """A room's search document: its number, type, capacity, price and
+    tokenized description, rowid for rowid with ``Room``.
+
+    Not managed by Django: migration 0011 creates it as an FTS5 table on
+    SQLite and as a table with a generated ``tsvector`` and GIN index on
+    PostgreSQL, plus triggers on ``hotel_room`` that rewrite a room's
+    document whenever its row is inserted, changed or deleted, however it
+    is written.
+    """
+    room = models.OneToOneField(
+        Room, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search',
+    )
+    room_number = models.CharField(max_length=10)
+    room_type = models.CharField(max_length=10)
+    capacity = models.PositiveSmallIntegerField()
+    price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.TextField()
+    document = SearchDocumentField(db_column='hotel_room_search')
 
     class Meta:
-        ordering = ['room_number']
+        managed = False
+        db_table = 'hotel_room_search'
+
+
+class RatePlan(models.Model):
+    """A named set of ``RateRule``s, e.g. a season or a promotion. Plans
+    apply in ascending ``priority``; inactive ones are ignored."""
+    name = models.CharField(max_length=100, unique=True)
+    priority = models.SmallIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['priority', 'pk']
+
+
+class RateRule(models.Model):
+    """Adjusts the nightly rate of matching nights: a percentage of the rate
+    so far or a fixed amount, applied in order after the rules before it.
+
+    A night matches if every condition that is set holds: the room type,
+    ``[start_date, end_date)``, the ISO ``weekdays`` (e.g. ``'67'`` for
+    weekends) and the room type's occupancy that night. See
+    ``hotel/pricing.py``.
+    """
+    class Adjustment(models.TextChoices):
+        PERCENT = 'percent', 'Percent'
+        AMOUNT = 'amount', 'Amount per night'
+
+    plan = models.ForeignKey(RatePlan, on_delete=models.CASCADE, related_name='rules')
+    room_type = models.CharField(max_length=10, choices=Room.RoomType.choices, blank=True)
+    start_date = models.DateField(blank=True, null=True)
+    end_date = models.DateField(blank=True, null=True)
+    weekdays = models.CharField(
+        max_length=7, blank=True, validators=[RegexValidator(r'^[1-7]*$', "ISO weekday numbers, 1 to 7.")],
+    )
+    min_occupancy = models.PositiveSmallIntegerField(
+        blank=True, null=True, validators=[MaxValueValidator(100)],
+        help_text="Percent of the room type's rooms sold that night.",
+    )
+    adjustment = models.CharField(max_length=10, choices=Adjustment.choices, default=Adjustment.PERCENT)
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        rule = super().from_db(db, field_names, values)
+        # Lets signal handlers see which nights a change repriced.
+        rule._loaded_dates = (rule.__dict__.get('start_date'), rule.__dict__.get('end_date'))
+        return rule
+
+    def __str__(self):
+        sign = '+' if self.value >= 0 else ''
+        unit = '%' if self.adjustment == self.Adjustment.PERCENT else ''
+        return f"{self.plan}: {sign}{self.value}{unit}"
+
+    def clean(self):
+        if self.start_date and self.end_date and self.start_date >= self.end_date:
+            raise ValidationError({'end_date': "The end date must be after the start date."})
+
+    def matches(self, room_type, day, occupancy):
+        return (
+            (not self.room_type or self.room_type == room_type)
+            and (self.start_date is None or self.start_date <= day)
+            and (self.end_date is None or day < self.end_date)
+            and (not self.weekdays or str(day.isoweekday()) in self.weekdays)
+            and (self.min_occupancy is None or occupancy >= self.min_occupancy)
+        )
+
+    def apply(self, factor, amount):
+        """The night's ``(factor, amount)`` after this rule, for a rate of
+        ``price_per_night * factor + amount``."""
+        if self.adjustment == self.Adjustment.PERCENT:
+            scale = 1 + self.value / 100
+            return factor * scale, amount * scale
+        return factor, amount + self.value
+
+    class Meta:
+        ordering = ['plan__priority', 'plan', 'pk']
+
+
+class GuestQuerySet(models.QuerySet):
+    def upsert(self, guests):
+        """Insert ``guests``, updating the stored guest with the same email
+        instead where there is one, in one ``INSERT ... ON CONFLICT (email)
+        DO UPDATE`` statement.
+
+        Sets each guest's pk and returns them. A guest without a phone keeps
+        the stored one. Emails must be unique within ``guests``. Like
+        ``bulk_create()``, skips ``save()`` and the model signals.
+        """
+        guests = list(guests)
+        for guest in guests:
+            guest.phone_normalized = normalize_phone(guest.phone)
+        with_phone = [guest for guest in guests if guest.phone]
+        without_phone = [guest for guest in guests if not guest.phone]
+        for batch, update_fields in [
+            (with_phone, ['first_name', 'last_name', 'phone', 'phone_normalized']),
+            (without_phone, ['first_name', 'last_name']),
+        ]:
+            if batch:
+                self.bulk_create(batch, update_conflicts=True, unique_fields=['email'], update_fields=update_fields)
+
+        # Backends that cannot return ids from an upsert leave them unset.
+        missing = {guest.email: guest for guest in guests if guest.pk is None}
+        if missing:
+            for email, pk in self.filter(email__in=missing).values_list('email', 'pk'):
+                missing[email].pk = pk
+        return guests
+
 
 class Guest(models.Model):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    # ``phone`` in E.164 form, what bookings are looked up by.
+    phone_normalized = models.CharField(max_length=16, blank=True, null=True, editable=False)
+
+    objects = GuestQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_normalized'}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['phone_normalized'], name='guest_phone_normalized_idx'),
+        ]
+
+class ActiveStatus(models.Lookup):
+    """``status__active=True``: the active statuses are inlined as literals so
+    SQLite can match the partial indexes declared on Booking."""
+    lookup_name = 'active'
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', []
+
+    def as_sql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        statuses = ', '.join(f"'{status}'" for status in Booking.ACTIVE_STATUSES)
+        operator = 'IN' if self.rhs else 'NOT IN'
+        return f'{lhs} {operator} ({statuses})', params
+
+
+class StayOverlaps(models.Func):
+    """The booking's ``[check_in_date, check_out_date)`` stay overlaps
+    ``[start, end)``. PostgreSQL gets the range form, which matches the GiST
+    exclusion constraint's expression and can use its index."""
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, start, end):
+        super().__init__(F('check_in_date'), F('check_out_date'), Value(start), Value(end))
+
+    def as_sql(self, compiler, connection, template='({0} < {3} AND {1} > {2})', **extra_context):
+        params = []
+        compiled = [compiler.compile(expression) for expression in self.source_expressions]
+        # Params follow the order the placeholders appear in the template.
+        for position in map(int, re.findall(r'\{(\d)\}', template)):
+            params.extend(compiled[position][1])
+        return template.format(*(sql for sql, _ in compiled)), params
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='daterange({0}, {1}) && daterange({2}, {3})')
+
+
+def free_periods(room_ids, bookings, start, end):
+    """Each room's free ``(start, end)`` periods within ``[start, end)``,
+    from its ``(room, check_in, check_out)`` bookings in check-in order."""
+    periods = {room_id: [] for room_id in room_ids}
+    current = dict.fromkeys(room_ids, start)
+    # One ordered pass over every active booking in the horizon.
+    for room_id, check_in_date, check_out_date in bookings:
+        if current[room_id] < check_in_date:
+            periods[room_id].append((current[room_id], check_in_date))
+        current[room_id] = max(current[room_id], check_out_date)
+
+    for room_id, current_date in current.items():
+        if current_date < end:
+            periods[room_id].append((current_date, end))
+    return periods
+
+
+class BookingQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status__active=True)
+
+    def on_date(self, day):
+        # check_in_date <= day <= check_out_date, as a half-open overlap.
+        return self.overlapping(day - timedelta(days=1), day + timedelta(days=1))
+
+    def overlapping(self, check_in, check_out):
+        return self.filter(StayOverlaps(check_in, check_out))
+
+    def for_phone(self, hotel, phone):
+        """``hotel``'s bookings by guests with the normalized ``phone``."""
+        # The guests as a subquery rather than a join: SQLite then seeks
+        # booking_hotel_guest_idx on both its columns instead of reading
+        # every booking of the hotel.
+        guests = Guest.objects.filter(phone_normalized=phone).values('pk')
+        return self.filter(hotel=hotel, guest__in=guests)
+
+    def available_periods(self, room_ids, max_days=30):
+        today = date.today()
+        max_date = today + timedelta(days=max_days)
+        room_ids = list(room_ids)
+        index = get_index()
+        if index is not None:
+            bookings = index.bookings_between(room_ids, today, max_date)
+        else:
+            bookings = self.booked_between(room_ids, today, max_date)
+        return free_periods(room_ids, bookings, today, max_date)
+
+    async def aavailable_periods(self, room_ids, max_days=30):
+        """``available_periods()`` with the async ORM."""
+        # A loaded index answers from memory; loading it is left to sync code.
+        if get_index(load=False) is not None:
+            return self.available_periods(room_ids, max_days)
+        today = date.today()
+        max_date = today + timedelta(days=max_days)
+        room_ids = list(room_ids)
+        bookings = [row async for row in self.booked_between(room_ids, today, max_date)]
+        return free_periods(room_ids, bookings, today, max_date)
+
+    def booked_between(self, room_ids, start, end):
+        """``(room, check_in_date, check_out_date)`` of the active bookings
+        touching ``[start, end]``, ordered by room and check-in."""
+        return self.active().filter(
+            room__in=room_ids,
+            check_out_date__gte=start,
+            check_in_date__lte=end,
+        ).order_by('room', 'check_in_date').values_list('room', 'check_in_date', 'check_out_date')
+
+    def reserve(self, room, check_in_date, check_out_date, then=None, **fields):
+        """Create a booking unless it overlaps an active one, atomically.
+
+        Overlaps are caught by ``RoomNight``'s unique constraint when the
+        booking's nights are inserted. The room is locked first, so
+        concurrent requests for the same room run one after another. Lock
+        timeouts are retried with exponential backoff up to
+        ``RESERVE_ATTEMPTS`` times. An unsaved ``guest`` is upserted by email
+        in the same transaction, and ``then(booking)`` is called in it last.
+        """
+        guest = fields.get('guest')
+        new_guest = guest is not None and guest.pk is None
+        for attempt in range(RESERVE_ATTEMPTS):
+            try:
+                with transaction.atomic(using=self.db):
+                    # A no-op UPDATE takes the row lock on PostgreSQL and the
+                    # database write lock on SQLite, where select_for_update()
+                    # is ignored.
+                    started = time.perf_counter()
+                    Room.objects.using(self.db).filter(pk=room.pk).update(room_number=F('room_number'))
+                    metrics.observe('booking.lock_wait', time.perf_counter() - started)
+
+                    if new_guest:
+                        guest.pk = None  # in case a rolled back attempt set it
+                        Guest.objects.using(self.db).upsert([guest])
+                    booking = self.create(
+                        room=room, check_in_date=check_in_date, check_out_date=check_out_date, **fields
+                    )
+                    if then is not None:
+                        then(booking)
+                    return booking
+            except IntegrityError:
+                # room_night_active_unique, or PostgreSQL's booking_no_overlap
+                # exclusion constraint.
+                metrics.incr('booking.conflicts')
+                raise RoomUnavailable(f"{room} is not available for the selected dates.")
+            except OperationalError as exc:
+                if 'locked' not in str(exc) or attempt == RESERVE_ATTEMPTS - 1:
+                    metrics.incr('booking.lock_failures')
+                    raise
+                metrics.incr('booking.lock_retries')
+                time.sleep(RESERVE_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
 
 class Booking(models.Model):
     class BookingStatus(models.TextChoices):
@@ -105,6 +534,11 @@ class Booking(models.Model):
         IN_PERSON  = 'in_person', 'In Person'
         AGENT      = 'agent', 'Travel Agent'
 
+    ACTIVE_STATUSES = [BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN]
+
+    # The room's hotel, copied so a hotel's bookings are found without a
+    # join; indexed by booking_hotel_guest_idx, which leads with it.
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='bookings', db_index=False)
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     guest = models.ForeignKey(Guest, on_delete=models.CASCADE)
     check_in_date = models.DateField()
@@ -122,10 +556,320 @@ class Booking(models.Model):
     )
     notes = models.TextField(blank=True, null=True)
 
+    objects = BookingQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        booking = super().from_db(db, field_names, values)
+        # Lets signal handlers see which room and dates a change freed up.
+        stay = tuple(booking.__dict__.get(name) for name in ('room_id', 'check_in_date', 'check_out_date'))
+        if None not in stay:
+            booking._loaded_stay = stay
+            if 'status' in booking.__dict__ and 'booking_channel' in booking.__dict__:
+                booking._loaded_nights = (*stay, booking.status, booking.booking_channel)
+        return booking
+
     def __str__(self):
         return f"Booking {self.id}: {self.room} for {self.guest}"
 
+    def clean(self):
+        # Lets forms given the room (the admin's) report a double booking
+        # instead of failing on room_night_active_unique when saved.
+        if not (self.check_in_date and self.check_out_date):
+            return
+        if self.check_out_date <= self.check_in_date:
+            raise ValidationError({'check_out_date': "Check-out date must be after check-in date."})
+        if self.room_id and self.status in self.ACTIVE_STATUSES:
+            clashes = Booking.objects.active().overlapping(self.check_in_date, self.check_out_date)
+            if clashes.filter(room_id=self.room_id).exclude(pk=self.pk).exists():
+                raise ValidationError("Room is not available for the selected dates.")
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Booking, instance=self)
+        adding = self._state.adding
+        if self.hotel_id is None or self.room_id != getattr(self, '_loaded_stay', (self.room_id,))[0]:
+            self.hotel_id = self.room.hotel_id
+        # The booking and its nights are written together or not at all.
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            nights = (self.room_id, self.check_in_date, self.check_out_date, self.status, self.booking_channel)
+            if nights != getattr(self, '_loaded_nights', None):
+                RoomNight.objects.using(using).sync([self], created=adding)
+                self._loaded_nights = nights
+
     class Meta:
         ordering = ['-booking_date']
         verbose_name = 'Booking'
-        verbose_name_plural = 'Bookings'
\ No newline at end of file
+        verbose_name_plural = 'Bookings'
+        indexes = [
+            # Overlap probes for one room only ever look at active bookings;
+            # the partial index leaves out the checked-out/canceled history.
+            models.Index(
+                fields=['room', 'check_out_date', 'check_in_date'],
+                condition=models.Q(status__in=['confirmed', 'checked_in']),
+                name='booking_active_stay_idx',
+            ),
+            models.Index(fields=['hotel', 'guest', '-check_in_date'], name='booking_hotel_guest_idx'),
+            models.Index(fields=['-booking_date'], name='booking_booking_date_idx'),
+        ]
+
+
+Booking._meta.get_field('status').register_lookup(ActiveStatus)
+
+
+class RoomNightQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status__active=True)
+
+    def sync(self, bookings, created=False):
+        """Replace the nights of ``bookings`` with their current ones; pass
+        ``created`` for new bookings, which have none yet.
+
+        ``Booking.save()`` calls this. Code that writes bookings without it
+        (``bulk_create``, ``QuerySet.update``) should call it in the same
+        transaction. Raises ``IntegrityError`` if an active booking would
+        share a night with another one.
+        """
+        from .pricing import RateTable  # imports this module
+
+        bookings = list(bookings)
+        if not bookings:
+            return
+        # Priced before the old nights go, as occupancy rules count them.
+        start = min(booking.check_in_date for booking in bookings)
+        end = max(booking.check_out_date for booking in bookings)
+        tables = {
+            hotel_id: RateTable.load(start, end, hotel_id) for hotel_id in {booking.hotel_id for booking in bookings}
+        }
+        if not created:
+            self.filter(booking__in=[booking.pk for booking in bookings]).delete()
+        rooms = {booking.room_id: booking.room for booking in bookings if Booking.room.is_cached(booking)}
+        missing = {booking.room_id for booking in bookings} - rooms.keys()
+        if missing:
+            rooms.update(Room.objects.using(self.db).only('room_type', 'price_per_night').in_bulk(missing))
+        self._insert_rows([
+            night for booking in bookings for night in RoomNight.rows_for(
+                booking.pk, booking.room_id, booking.check_in_date, booking.check_out_date, booking.status,
+                booking.booking_channel, rooms[booking.room_id].room_type, tables[booking.hotel_id].rates(
+                    rooms[booking.room_id].room_type, rooms[booking.room_id].price_per_night,
+                    booking.check_in_date, booking.check_out_date,
+                ),
+            )
+        ])
+
+    def rebuild(self, chunk_size=5000):
+        """Recreate every night from the bookings in one transaction. Nights
+        are priced at their room's current rates (``hotel/pricing.py``).
+
+        Returns the number of nights stored and the number dropped because an
+        active booking overlapped another one.
+        """
+        from .pricing import RateTable  # imports this module
+
+        with transaction.atomic(using=self.db):
+            bookings = Booking.objects.using(self.db).exclude(status=Booking.BookingStatus.CANCELED)
+            span = bookings.aggregate(start=models.Min('check_in_date'), end=models.Max('check_out_date'))
+            # Compiled before the nights that occupancy rules count are gone.
+            tables = {
+                hotel_id: RateTable.load(span['start'], span['end'], hotel_id)
+                for hotel_id in bookings.order_by().values_list('hotel_id', flat=True).distinct()
+            } if span['start'] else {}
+            self.all().delete()
+            expected, batch = 0, []
+            rows = bookings.values_list(
+                'pk', 'room_id', 'check_in_date', 'check_out_date', 'status',
+                'booking_channel', 'room__room_type', 'hotel_id', 'room__price_per_night',
+            )
+            for *row, hotel_id, price in rows.iterator(chunk_size=chunk_size):
+                batch.extend(RoomNight.rows_for(*row, tables[hotel_id].rates(row[6], price, row[2], row[3])))
+                if len(batch) >= chunk_size:
+                    self._insert_rows(batch, ignore_conflicts=True)
+                    expected += len(batch)
+                    batch = []
+            self._insert_rows(batch, ignore_conflicts=True)
+            expected += len(batch)
+            stored = self.count()
+        return stored, expected - stored
+
+    def _insert_rows(self, rows, ignore_conflicts=False):
+        # executemany() rather than bulk_create(): building and compiling a
+        # model instance per night cost several times the insert itself.
+        if not rows:
+            return
+        connection = connections[self.db]
+        on_conflict = OnConflict.IGNORE if ignore_conflicts else None
+        fields = [self.model._meta.get_field(name) for name in RoomNight.ROW_FIELDS]
+        sql = '{} {} ({}) VALUES ({}) {}'.format(
+            connection.ops.insert_statement(on_conflict=on_conflict),
+            connection.ops.quote_name(self.model._meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+            connection.ops.on_conflict_suffix_sql(fields, on_conflict, None, None),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (
+                    booking_id, room_id, connection.ops.adapt_datefield_value(day), status, room_type, channel,
+                    connection.ops.adapt_decimalfield_value(rate),
+                )
+                for booking_id, room_id, day, status, room_type, channel, rate in rows
+            ])
+
+
+class RoomNight(models.Model):
+    """One night of a room sold to a booking: the inventory that
+    availability and occupancy are read from.
+
+    Every booking that is not canceled has a row per night, from
+    ``check_in_date`` up to the night before ``check_out_date``, carrying
+    its status. Active nights are unique per room and date, so an
+    overlapping booking cannot be stored on any database.
+
+    The room type, channel and the rate the night was sold at are copied
+    from the room and booking, so ``hotel/analytics.py`` can total nights
+    and revenue from one index without joins.
+    """
+    ROW_FIELDS = ('booking', 'room', 'date', 'status', 'room_type', 'channel', 'rate')
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='nights')
+    date = models.DateField()
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='nights')
+    status = models.CharField(max_length=12, choices=Booking.BookingStatus.choices)
+    room_type = models.CharField(max_length=10, choices=Room.RoomType.choices)
+    channel = models.CharField(max_length=10, choices=Booking.BookingChannel.choices)
+    rate = models.DecimalField(max_digits=10, decimal_places=2)
+
+    objects = RoomNightQuerySet.as_manager()
+
+    @staticmethod
+    def rows_for(booking_id, room_id, check_in_date, check_out_date, status, channel, room_type, rates):
+        """Values of ``ROW_FIELDS`` for each night of a stay, with ``rates``
+        the rate of each night."""
+        if status == Booking.BookingStatus.CANCELED:
+            return []
+        return [
+            (booking_id, room_id, check_in_date + timedelta(days=n), status, room_type, channel, rate)
+            for n, rate in enumerate(rates)
+        ]
+
+    def __str__(self):
+        return f"Room {self.room_id} on {self.date}: booking {self.booking_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['room', 'date'],
+                condition=models.Q(status__in=['confirmed', 'checked_in']),
+                name='room_night_active_unique',
+            ),
+        ]
+        indexes = [
+            # Covers the analytics GROUP BY date, room type, channel, which
+            # reads the rows in index order without sorting.
+            models.Index(fields=['date', 'room_type', 'channel', 'rate'], name='room_night_report_idx'),
+        ]
+
+
+RoomNight._meta.get_field('status').register_lookup(ActiveStatus)
+
+
+class JobQuerySet(models.QuerySet):
+    def due(self, now=None):
+        """Queued jobs whose time has come, and running jobs whose worker's
+        lease ran out."""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(status=Job.Status.QUEUED, run_after__lte=now)
+            | models.Q(status=Job.Status.RUNNING, lease_expires__lt=now, attempts__lt=F('max_attempts'))
+        )
+
+    def claim(self, lease, batch_sizes):
+        """Lease the oldest due job and more due jobs of its name, up to
+        ``batch_sizes[name]`` in all, for ``lease`` (a timedelta) and return
+        them. Only names in ``batch_sizes`` are claimed.
+
+        One ``UPDATE`` claims them: it re-checks that every row is still
+        due, so concurrent workers never claim the same job. Each claim
+        gets its own ``claimed_by`` token, which ``finish()`` and ``retry()``
+        match, so a worker whose lease ran out cannot overwrite the
+        outcome of the worker that took the job over.
+        """
+        now = timezone.now()
+        due = self.due(now).filter(name__in=list(batch_sizes))
+        name = due.order_by('run_after', 'pk').values_list('name', flat=True).first()
+        if name is None:
+            return []
+        token = uuid.uuid4().hex
+        ids = due.filter(name=name).order_by('run_after', 'pk').values('pk')[:batch_sizes[name]]
+        self.due(now).filter(pk__in=ids).update(
+            status=Job.Status.RUNNING, claimed_by=token, lease_expires=now + lease, attempts=F('attempts') + 1,
+        )
+        return list(self.filter(status=Job.Status.RUNNING, claimed_by=token).order_by('pk'))
+
+    def finish(self, jobs):
+        self.filter(pk__in=[job.pk for job in jobs], claimed_by=jobs[0].claimed_by).update(
+            status=Job.Status.DONE, lease_expires=None, finished_at=timezone.now(),
+        )
+
+    def retry(self, jobs, error):
+        """Queue failed ``jobs`` again after a backoff doubling on every
+        attempt, or mark them failed once they are out of attempts."""
+        now = timezone.now()
+        for job in jobs:
+            if job.attempts < job.max_attempts:
+                changes = {
+                    'status': Job.Status.QUEUED,
+                    'run_after': now + timedelta(seconds=JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)),
+                }
+            else:
+                changes = {'status': Job.Status.FAILED, 'finished_at': now}
+            self.filter(pk=job.pk, claimed_by=job.claimed_by).update(
+                lease_expires=None, last_error=error[:JOB_ERROR_LENGTH], **changes,
+            )
+
+    def expire(self):
+        """Fail running jobs whose lease ran out on their last attempt."""
+        now = timezone.now()
+        return self.filter(status=Job.Status.RUNNING, lease_expires__lt=now, attempts__gte=F('max_attempts')).update(
+            status=Job.Status.FAILED, lease_expires=None, finished_at=now, last_error="Lease expired.",
+        )
+
+    def purge(self, older_than):
+        """Delete jobs done before ``older_than``; their idempotency keys
+        can then be enqueued again."""
+        return self.filter(status=Job.Status.DONE, finished_at__lt=older_than).delete()[0]
+
+
+class Job(models.Model):
+    """A unit of background work for ``manage.py run_worker``; see
+    ``hotel/jobs.py``."""
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # Enqueueing a key that is already stored is a no-op.
+    key = models.CharField(max_length=200, unique=True, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    lease_expires = models.DateTimeField(blank=True, null=True)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    objects = JobQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_due_idx'),
+        ]
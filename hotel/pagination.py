@@ -0,0 +1,135 @@
+"""
+Keyset ("seek") pagination for list views.
+
+Pages are addressed by an opaque ``?after=<token>`` holding the sort key of
+the last row shown, so every page is one ``WHERE key > last ... LIMIT n``
+query, however deep it is, instead of ``LIMIT/OFFSET`` plus ``COUNT(*)``.
+"""
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidPageToken(Exception):
+    """An ``after`` token that does not hold a value for each field of the
+    keyset."""
+
+
+def encode_token(values):
+    raw = json.dumps([str(value) if isinstance(value, (date, Decimal)) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def keyset_field(queryset, name):
+    """The model field or annotation ``name`` of ``queryset`` sorts on."""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    if name == 'pk':
+        return queryset.model._meta.pk
+    return queryset.model._meta.get_field(name)
+
+
+def decode_token(token, queryset, keyset):
+    """The values of ``keyset`` in ``token``, as the Python types of
+    ``queryset``'s fields. Raises InvalidPageToken for anything else, as
+    the token comes from the client."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(keyset):
+            raise ValueError
+        values = [
+            keyset_field(queryset, name.lstrip('-')).to_python(value) for name, value in zip(keyset, values)
+        ]
+        if None in values:
+            raise ValueError
+    except (ValueError, TypeError, ValidationError):
+        raise InvalidPageToken("Invalid page token.")
+    return values
+
+
+def after_filter(keyset, values):
+    """Rows sorting after ``values`` on ``keyset``, a list of field names
+    with an optional ``-`` prefix for descending order."""
+    condition = Q()
+    for position in reversed(range(len(keyset))):
+        field = keyset[position].lstrip('-')
+        lookup = 'lt' if keyset[position].startswith('-') else 'gt'
+        equal = Q(**{keyset[i].lstrip('-'): values[i] for i in range(position)})
+        condition = (equal & Q(**{f'{field}__{lookup}': values[position]})) | condition
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_url, count, count_is_capped):
+        self.object_list = object_list
+        self.next_url = next_url
+        self.count = count
+        self.count_is_capped = count_is_capped
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_url is not None
+
+
+class KeysetPaginationMixin:
+    """Replaces ``ListView`` page-number pagination with keyset pagination.
+
+    ``keyset`` must end in a unique field. ``count_limit`` caps how many rows
+    are counted for the "N found" figure; None skips counting altogether.
+    """
+    keyset = ('pk',)
+    count_limit = 1000
+
+    def get_keyset(self, queryset):
+        return self.keyset
+
+    def paginate_queryset(self, queryset, page_size):
+        keyset, count_query, page_query = self.page_queries(queryset, page_size)
+        count = count_query.count() if count_query is not None else None
+        return self.make_page(keyset, count, list(page_query), page_size)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """``paginate_queryset()`` with the async ORM, for async views."""
+        keyset, count_query, page_query = self.page_queries(queryset, page_size)
+        count = await count_query.acount() if count_query is not None else None
+        return self.make_page(keyset, count, [row async for row in page_query], page_size)
+
+    def page_queries(self, queryset, page_size):
+        """The keyset, the capped count query (or None) and the page query."""
+        keyset = self.get_keyset(queryset)
+        queryset = queryset.order_by(*keyset)
+
+        count_query = None
+        if self.count_limit is not None:
+            count_query = queryset.order_by()[:self.count_limit + 1]
+
+        after = self.request.GET.get('after')
+        if after:
+            try:
+                values = decode_token(after, queryset, keyset)
+            except InvalidPageToken as e:
+                raise Http404(e)
+            queryset = queryset.filter(after_filter(keyset, values))
+        return keyset, count_query, queryset[:page_size + 1]
+
+    def make_page(self, keyset, count, rows, page_size):
+        next_url = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            params = self.request.GET.copy()
+            params['after'] = encode_token([getattr(rows[-1], field.lstrip('-')) for field in keyset])
+            next_url = '?' + params.urlencode()
+
+        capped = count is not None and count > self.count_limit
+        page = KeysetPage(rows, next_url, min(count, self.count_limit) if capped else count, capped)
+        return None, page, rows, next_url is not None or bool(self.request.GET.get('after'))
@@ -0,0 +1,37 @@
+"""
+Phone number normalization for guest lookup.
+
+Numbers are stored and looked up as ``+<country code><number>``, so
+"+380 (50) 123-45-67", "0501234567" and "00380501234567" all match. Numbers
+written without an international prefix are taken to be in
+``HOTEL_PHONE_COUNTRY_CODE``.
+"""
+import re
+
+from django.conf import settings
+
+NON_DIGITS = re.compile(r'\D')
+MAX_DIGITS = 15  # E.164
+
+
+def normalize_phone(value, country_code=None):
+    """``value`` in E.164 form, or None if it holds no usable number."""
+    if not value:
+        return None
+    value = value.strip()
+    digits = NON_DIGITS.sub('', value)
+    if not digits:
+        return None
+    country_code = country_code or settings.HOTEL_PHONE_COUNTRY_CODE
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        # National trunk prefix.
+        digits = country_code + digits[1:]
+    elif not digits.startswith(country_code):
+        digits = country_code + digits
+    if not digits or len(digits) > MAX_DIGITS:
+        return None
+    return '+' + digits
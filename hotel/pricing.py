@@ -0,0 +1,144 @@
+"""
+Nightly rates from ``RatePlan`` and ``RateRule``.
+
+A room's rate for a night is ``price_per_night * factor + amount``: every
+matching rule of the active plans, in order, scales both (a percentage) or
+adds to the amount (a fixed amount). A night with no rule keeps
+``price_per_night``.
+
+``RateTable`` compiles the rules a month at a time into dense arrays per
+room type and date, kept as running sums of the factors and amounts. The
+total of any stay is then two subtractions per room type, whatever its
+length, and ``RoomQuerySet.with_stay_total()`` prices and sorts a whole
+room search in SQL with one ``CASE`` over the room types.
+
+Compiled months are cached under version counters (see ``hotel/cache.py``):
+``rates:<yyyy-mm>`` for rules dated within the month and ``rates`` for the
+rest, so editing a seasonal rule only recompiles its season; occupancy
+rules also depend on the month's bookings (``month:<yyyy-mm>``) and the
+room counts (``catalogue``). Occupancy is each hotel's own, so every hotel
+has its own table. Months are compiled as stays reach them and expire after
+``CACHE_TIMEOUT``, so the table rolls forward with the dates searched.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .analytics import month_starts
+from .cache import KEY_PREFIX, month_version, rates_version, version_map
+from .models import RateRule, Room, RoomNight
+from .tenants import get_hotel
+
+CACHE_TIMEOUT = 24 * 60 * 60
+CENT = Decimal('0.01')
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def month_dependencies(month):
+    return ['catalogue', rates_version(), rates_version(month), month_version(month)]
+
+
+class RateTable:
+    """Running sums of each night's rate factor and amount, per room type,
+    for whole months: ``months[month][room_type]`` is ``(factors, amounts)``
+    with ``factors[n]`` the sum over the month's first ``n`` nights."""
+
+    def __init__(self, months):
+        self.months = months
+
+    @classmethod
+    def load(cls, start, end, hotel_id=None):
+        """The table of hotel ``hotel_id`` (by default the current one) for
+        the months overlapping ``[start, end)``, compiling the months not
+        cached."""
+        if hotel_id is None:
+            hotel_id = get_hotel().pk
+        months = list(month_starts(start, end))
+        current = version_map({name for month in months for name in month_dependencies(month)})
+        keys = {
+            f"{KEY_PREFIX}:rates:{hotel_id}:{month:%Y-%m}:"
+            + ':'.join(str(current[name]) for name in month_dependencies(month)): month
+            for month in months
+        }
+        cached = cache.get_many(keys)
+        table = {month: cached.get(key) for key, month in keys.items()}
+        missing = [month for month, sums in table.items() if sums is None]
+        if missing:
+            table.update(compile_months(missing, hotel_id))
+            cache.set_many(
+                {key: table[month] for key, month in keys.items() if month in missing},
+                timeout=CACHE_TIMEOUT,
+            )
+        return cls(table)
+
+    def sums(self, start, end):
+        """``{room_type: (factor, amount)}`` summed over the nights of
+        ``[start, end)``."""
+        totals = {room_type: [Decimal(0), Decimal(0)] for room_type in Room.RoomType.values}
+        for month, rows in self.months.items():
+            first = max((start - month).days, 0)
+            last = min((end - month).days, (next_month(month) - month).days)
+            if first >= last:
+                continue
+            for room_type, (factors, amounts) in rows.items():
+                totals[room_type][0] += factors[last] - factors[first]
+                totals[room_type][1] += amounts[last] - amounts[first]
+        return {room_type: tuple(total) for room_type, total in totals.items()}
+
+    def rates(self, room_type, price, start, end):
+        """The rate of each night of ``[start, end)`` in a room of
+        ``room_type`` priced at ``price``, rounded to cents."""
+        price, rates = Decimal(str(price)), []
+        for n in range((end - start).days):
+            day = start + timedelta(days=n)
+            factors, amounts = self.months[day.replace(day=1)][room_type]
+            i = day.day - 1
+            factor, amount = factors[i + 1] - factors[i], amounts[i + 1] - amounts[i]
+            rates.append((price * factor + amount).quantize(CENT))
+        return rates
+
+
+def compile_months(months, hotel_id):
+    """``RateTable.months`` entries of hotel ``hotel_id`` for ``months``, from
+    one query for the rules and, if any rule depends on occupancy, two more
+    for it."""
+    start = min(months)
+    end = next_month(max(months))
+    rules = list(
+        RateRule.objects.filter(plan__is_active=True)
+        .filter(Q(start_date=None) | Q(start_date__lt=end), Q(end_date=None) | Q(end_date__gt=start))
+        .order_by('plan__priority', 'plan', 'pk')
+    )
+    occupancy = {}
+    if any(rule.min_occupancy is not None for rule in rules):
+        rooms = dict(
+            Room.objects.filter(hotel_id=hotel_id).values_list('room_type').annotate(Count('pk')).order_by()
+        )
+        sold = (
+            RoomNight.objects.active().filter(date__gte=start, date__lt=end, room__hotel_id=hotel_id)
+            .values_list('date', 'room_type').annotate(nights=Count('*')).order_by()
+        )
+        for day, room_type, nights in sold:
+            if rooms.get(room_type):
+                occupancy[day, room_type] = 100 * nights / rooms[room_type]
+
+    compiled = {}
+    for month in months:
+        days = [month + timedelta(days=n) for n in range((next_month(month) - month).days)]
+        compiled[month] = {}
+        for room_type in Room.RoomType.values:
+            factors, amounts = [Decimal(0)], [Decimal(0)]
+            for day in days:
+                factor, amount = Decimal(1), Decimal(0)
+                for rule in rules:
+                    if rule.matches(room_type, day, occupancy.get((day, room_type), 0)):
+                        factor, amount = rule.apply(factor, amount)
+                factors.append(factors[-1] + factor)
+                amounts.append(amounts[-1] + amount)
+            compiled[month][room_type] = (factors, amounts)
+    return compiled
@@ -0,0 +1,202 @@
+"""
+Per-request query profiling.
+
+``QueryProfilingMiddleware`` records, for every request, the number of SQL
+statements and their total time, the slowest statements with the line of
+project code that ran them, template render time and the remaining Python
+time. It reports them in a ``Server-Timing`` header (visible in the
+browser's network panel) and as one JSON line per request on the
+``hotel.profiling.requests`` logger, which settings.py sends to a rotating
+file.
+
+Views declare how many statements a request may take with a
+``query_budget`` attribute on the view class (or function). Going over it
+is logged as a warning, or raises ``QueryBudgetExceeded`` when
+``HOTEL_QUERY_BUDGET_STRICT`` is set, as the test runner in
+``hotel/testing.py`` does.
+"""
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('hotel.profiling')
+request_logger = logging.getLogger('hotel.profiling.requests')
+
+SLOWEST = 5
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The profile of the request being handled. A context variable rather than
+# a wrapper on the request's connections, as async views run their queries
+# in another thread, where a copy of the context is all that follows them.
+current_profile = ContextVar('current_profile', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries):
+    """Set the ``query_budget`` of a function view; put it above any other
+    decorators."""
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def call_site():
+    """``file:line in function`` of the innermost project frame outside this
+    module, i.e. the code that ran the query."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(PROJECT_DIR) and filename != __file__
+            and 'site-packages' not in filename
+        ):
+            return f'{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest = []  # min-heap of (seconds, n, sql, call site)
+        self.render_started = None
+        self.render_sql_started = 0.0
+        self.render_seconds = 0.0
+        self.budget = None
+        self.view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.queries += 1
+            self.sql_seconds += seconds
+            # Only walk the stack for statements that make the top list.
+            if len(self.slowest) < SLOWEST or seconds > self.slowest[0][0]:
+                entry = (seconds, self.queries, sql, call_site())
+                if len(self.slowest) < SLOWEST:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+        self.render_sql_started = self.sql_seconds
+
+    def rendered(self, response):
+        # Queries the template runs (lazy querysets) count as SQL only, so
+        # that sql, template and python add up to the total.
+        render_sql = self.sql_seconds - self.render_sql_started
+        self.render_seconds = time.perf_counter() - self.render_started - render_sql
+
+    def timings(self):
+        total = time.perf_counter() - self.started
+        return {
+            'total': total,
+            'sql': self.sql_seconds,
+            'template': self.render_seconds,
+            'python': total - self.sql_seconds - self.render_seconds,
+        }
+
+
+def profile_queries(execute, sql, params, many, context):
+    """Execute wrapper of every connection: times statements into the
+    current request's profile, if there is one."""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_profiler(sender, connection, **kwargs):
+    if profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_queries)
+
+
+class QueryProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = request.profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, profile, response)
+
+    async def __acall__(self, request):
+        profile = request.profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, profile, response)
+
+    def finish(self, request, profile, response):
+        timings = profile.timings()
+        response.headers['Server-Timing'] = ', '.join([
+            f'sql;dur={timings["sql"] * 1000:.1f};desc="{profile.queries} queries"',
+            f'template;dur={timings["template"] * 1000:.1f}',
+            f'python;dur={timings["python"] * 1000:.1f}',
+            f'total;dur={timings["total"] * 1000:.1f}',
+        ])
+        request_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': profile.view,
+            'status': response.status_code,
+            'queries': profile.queries,
+            'budget': profile.budget,
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in timings.items()},
+            'slowest': [
+                {'ms': round(seconds * 1000, 2), 'sql': sql[:500], 'site': site}
+                for seconds, _, sql, site in sorted(profile.slowest, reverse=True)
+            ],
+        }))
+
+        if profile.budget is not None and profile.queries > profile.budget:
+            message = (
+                f"{profile.view} ran {profile.queries} queries for {request.method} {request.path}, "
+                f"over its budget of {profile.budget}"
+            )
+            if getattr(settings, 'HOTEL_QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        request.profile.view = f'{view.__module__}.{view.__qualname__}'
+        request.profile.budget = getattr(view, 'query_budget', None)
+
+    def process_template_response(self, request, response):
+        request.profile.start_render()
+        response.add_post_render_callback(request.profile.rendered)
+        return response
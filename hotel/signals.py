@@ -1,14 +1,157 @@
-# hotel/signals.py
-from django.db.models.signals import post_delete
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Booking, Room
+from . import cache, jobs
+from .availability import get_index
+from .analytics import month_starts
+from .models import Booking, Guest, Hotel, RatePlan, RateRule, Room
+
+
+class PendingChanges:
+    def __init__(self):
+        self.rooms = set()  # availability changed
+        self.days = set()  # availability changed on these dates
+        self.catalogue = set()  # room details changed
+        self.guests = set()  # guest details or bookings changed
+        self.rates = set()  # rates changed in these months; None for all
+        self.job = None  # the cache.invalidate job storing them, if queued
+
+    def payload(self):
+        """The changes as the payload of a ``cache.invalidate`` job."""
+        return {
+            'rooms': sorted(self.catalogue),
+            'days': sorted(day.isoformat() for day in self.days),
+            'availability': sorted(self.rooms),
+            'guests': sorted(self.guests),
+            'rates': sorted((month and month.isoformat() for month in self.rates), key=str),
+        }
+
+
+def data_changed(rooms=(), days=(), catalogue=(), guests=(), rates=(), using=DEFAULT_DB_ALIAS):
+    """Queue cache refreshes until the current transaction commits
+    (immediately in autocommit mode).
+
+    ``rooms`` and ``days`` are the room ids and dates whose availability
+    changed, ``catalogue`` the room ids whose own details changed and
+    ``guests`` the guest ids whose details or bookings changed and ``rates``
+    the first days of the months whose rates changed (None for every month).
+
+    All changes made by one transaction are applied together, so bulk deletes
+    and imports cost one query at commit rather than one per row, and caches
+    never see uncommitted writes. Code that bypasses model
+    signals (``bulk_create``, ``QuerySet.update``) should call this itself.
+
+    With ``HOTEL_QUEUE_CACHE_INVALIDATION`` the cache refresh is a job stored
+    within the transaction instead, so that it commits or rolls back with
+    the changes: one INSERT for the first change and an UPDATE for each
+    later one that adds to it.
+    """
+    connection = transaction.get_connection(using)
+    if not hasattr(connection, 'hotel_flush'):
+        connection.hotel_flush = partial(_flush_changes, connection)
+    pending = getattr(connection, 'hotel_changes', None)
+    # Add to the batch already waiting for this commit, if any. A rolled-back
+    # transaction discards its callback, and with it the batch.
+    queued = pending is not None and any(
+        callback is connection.hotel_flush for _, callback, _ in connection.run_on_commit
+    )
+    if not queued:
+        pending = connection.hotel_changes = PendingChanges()
+    pending.rooms.update(rooms)
+    pending.days.update(days)
+    pending.catalogue.update(catalogue)
+    pending.guests.update(guests)
+    pending.rates.update(rates)
+    if settings.HOTEL_QUEUE_CACHE_INVALIDATION:
+        payload = pending.payload()
+        if pending.job is None:
+            pending.job = jobs.enqueue('cache.invalidate', payload, using=using)
+        elif payload != pending.job.payload:
+            pending.job.payload = payload
+            pending.job.save(update_fields=['payload'], using=using)
+    if not queued:
+        # Last: in autocommit mode this flushes the batch at once.
+        transaction.on_commit(connection.hotel_flush, using=using)
+
+
+def stay_days(check_in_date, check_out_date):
+    """Every date ``Booking.objects.on_date()`` matches for a stay."""
+    return [check_in_date + timedelta(days=n) for n in range((check_out_date - check_in_date).days + 1)]
+
 
+def _flush_changes(connection):
+    pending = getattr(connection, 'hotel_changes', None)
+    connection.hotel_changes = None
+    if pending is None:
+        return
+    index = get_index(load=False)
+    if index is not None and pending.rooms:
+        index.reload_rooms(pending.rooms)
+    if settings.HOTEL_QUEUE_CACHE_INVALIDATION:
+        # Queued by data_changed() already.
+        return
+    cache.invalidate(
+        rooms=pending.catalogue, days=pending.days, availability=pending.rooms, guests=pending.guests,
+        rates=pending.rates,
+    )
+
+
+@receiver(post_save, sender=Booking)
 @receiver(post_delete, sender=Booking)
-def update_room_availability(sender, instance, **kwargs):
-    room = instance.room
-    active_bookings = Booking.objects.filter(
-        room=room,
-        status__in=['confirmed', 'checked_in']
-    ).exists()
-    room.is_available = not active_bookings
-    room.save()
\ No newline at end of file
+def booking_changed(sender, instance, using, **kwargs):
+    room_ids = {instance.room_id}
+    days = set(stay_days(instance.check_in_date, instance.check_out_date))
+    loaded = getattr(instance, '_loaded_stay', None)
+    if loaded:
+        # The row's previous room and dates are freed too.
+        room_ids.add(loaded[0])
+        days.update(stay_days(*loaded[1:]))
+    data_changed(rooms=room_ids, days=days, guests=[instance.guest_id], using=using)
+    instance._loaded_stay = (instance.room_id, instance.check_in_date, instance.check_out_date)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_changed(sender, instance, using, **kwargs):
+    data_changed(rooms=[instance.pk], catalogue=[instance.pk], using=using)
+
+
+@receiver(post_save, sender=Guest)
+@receiver(post_delete, sender=Guest)
+def guest_changed(sender, instance, using, **kwargs):
+    data_changed(guests=[instance.pk], using=using)
+
+
+@receiver(post_save, sender=RateRule)
+@receiver(post_delete, sender=RateRule)
+def rate_rule_changed(sender, instance, using, **kwargs):
+    ranges = [(instance.start_date, instance.end_date)]
+    if getattr(instance, '_loaded_dates', None):
+        # The nights of the rule's previous dates are repriced too.
+        ranges.append(instance._loaded_dates)
+    months = set()
+    for start, end in ranges:
+        if start is None or end is None:
+            # Open-ended: reprices nights in any month.
+            months.add(None)
+        elif start < end:
+            months.update(month_starts(start, end))
+    data_changed(rates=months, using=using)
+    instance._loaded_dates = (instance.start_date, instance.end_date)
+
+
+@receiver(post_save, sender=RatePlan)
+@receiver(post_delete, sender=RatePlan)
+def rate_plan_changed(sender, instance, using, **kwargs):
+    data_changed(rates=[None], using=using)
+
+
+@receiver(post_save, sender=Hotel)
+@receiver(post_delete, sender=Hotel)
+def hotel_changed(sender, instance, using, **kwargs):
+    # The registry of hotel/tenants.py; their rooms signal for themselves.
+    transaction.on_commit(lambda: cache.bump(['hotels']), using=using)
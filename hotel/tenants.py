@@ -0,0 +1,150 @@
+"""
+Several hotels (properties) in one deployment.
+
+Rooms and bookings belong to a ``Hotel``. ``HotelMiddleware`` takes the
+hotel of a request from its URL: ``/hotels/<slug>/rooms/`` is the room list
+of hotel ``<slug>`` and unprefixed URLs are ``HOTEL_DEFAULT``'s. The prefix
+is moved into the script prefix, so one set of URL patterns serves every
+hotel and ``reverse()`` and ``{% url %}`` keep links within it. The room and
+booking views filter every query on ``request.hotel`` (``HotelQuerysetMixin``),
+which the ``hotel_id``-led indexes on ``Room`` and ``Booking`` serve.
+
+Hotels are looked up in a registry cached under the ``hotels`` version
+counter (see ``hotel/cache.py``), so a request only queries for its hotel
+after a hotel changed.
+
+Hotels named in ``HOTEL_DATABASES`` keep their data in a database of their
+own, so that bookings at one property never wait on another's SQLite write
+lock. ``HotelRouter`` sends the hotel app's queries made for such a hotel
+there, and ``make_cache_key()`` keeps its cache entries apart, as ids repeat
+between databases. ``manage.py migrate --database hotel_<slug>`` creates the
+database with its ``Hotel`` row; ``run_worker --hotel <slug>`` runs its jobs.
+"""
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+from django.urls import get_script_prefix, set_script_prefix
+from django.utils.functional import SimpleLazyObject
+
+HOTEL_PREFIX = re.compile(r'/hotels/(?P<slug>[-\w]+)(?=/)')
+# The slug of the hotel being served; None for HOTEL_DEFAULT.
+current_slug = ContextVar('current_slug', default=None)
+
+
+@contextmanager
+def activate(slug):
+    """Serve hotel ``slug`` (None for ``HOTEL_DEFAULT``) within the block:
+    its database, cache entries and new rooms."""
+    token = current_slug.set(slug)
+    try:
+        yield
+    finally:
+        current_slug.reset(token)
+
+
+def database_for(slug=None):
+    """The database alias of hotel ``slug``, by default the current one."""
+    return settings.HOTEL_DATABASES.get(slug or current_slug.get() or settings.HOTEL_DEFAULT, DEFAULT_DB_ALIAS)
+
+
+def hotels():
+    """``{slug: Hotel}`` of the current database."""
+    from .cache import KEY_PREFIX, version_map
+    from .models import Hotel
+
+    key = f"{KEY_PREFIX}:hotels:{version_map(['hotels'])['hotels']}"
+    registry = cache.get(key)
+    if registry is None:
+        registry = {hotel.slug: hotel for hotel in Hotel.objects.all()}
+        cache.set(key, registry, timeout=None)
+    return registry
+
+
+def get_hotel(slug=None):
+    """Hotel ``slug``, by default the current one; Http404 if there is
+    none."""
+    slug = slug or current_slug.get() or settings.HOTEL_DEFAULT
+    try:
+        return hotels()[slug]
+    except KeyError:
+        raise Http404(f"No hotel {slug!r}.")
+
+
+class HotelMiddleware:
+    """Serves each request as its URL's hotel and sets ``request.hotel``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        slug, prefix = self.enter(request)
+        # Looked up on first use: pages served from the cache never need it.
+        request.hotel = SimpleLazyObject(get_hotel)
+        try:
+            return self.get_response(request)
+        finally:
+            self.exit(slug, prefix)
+
+    async def __acall__(self, request):
+        slug, prefix = self.enter(request)
+        # Async views cannot run the lookup's query themselves.
+        request.hotel = await sync_to_async(get_hotel)()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.exit(slug, prefix)
+
+    def enter(self, request):
+        """Activate the request's hotel; returns the tokens to undo it."""
+        prefix = get_script_prefix()
+        match = HOTEL_PREFIX.match(request.path_info)
+        if match:
+            request.path_info = request.path_info[match.end():]
+            set_script_prefix(prefix + match[0].lstrip('/'))
+        return current_slug.set(match and match['slug']), prefix
+
+    def exit(self, slug, prefix):
+        current_slug.reset(slug)
+        set_script_prefix(prefix)
+
+
+class HotelQuerysetMixin:
+    """Limits a generic view's queryset to the request's hotel."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(hotel=self.request.hotel)
+
+
+class HotelRouter:
+    """Routes the hotel app's models to the current hotel's database."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'hotel':
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return database_for()
+
+    db_for_write = db_for_read
+
+
+def make_cache_key(key, key_prefix, version):
+    """Django's cache key, within a namespace of its own for hotels with
+    their own database."""
+    alias = database_for()
+    if alias != DEFAULT_DB_ALIAS:
+        key = f'{alias}:{key}'
+    return f'{key_prefix}:{version}:{key}'
@@ -0,0 +1,21 @@
+import os
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Fails tests whose requests go over their view's ``query_budget``
+    (see hotel/profiling.py) instead of only logging a warning, and gives
+    each test process a cache of its own rather than the shared file cache."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.HOTEL_QUERY_BUDGET_STRICT = True
+        override_settings(CACHES={
+            'default': {**settings.CACHES['default'], 'BACKEND': settings.CACHE_BACKENDS['locmem']},
+        }).enable()
+        # Read by settings.py in --parallel workers that start afresh.
+        os.environ['HOTEL_QUERY_BUDGET_STRICT'] = '1'
+        os.environ['CACHE_BACKEND'] = 'locmem'
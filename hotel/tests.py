@@ -1,6 +1,15 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import Http404
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from datetime import date, timedelta
-from .models import Room, Booking, Guest
+from . import metrics
+from .availability import get_index, reset_index
+from .models import Room, Booking, Guest, RoomUnavailable
+from .tenants import get_hotel
 
 class RoomModelTest(TestCase):
     def setUp(self):
@@ -48,3 +57,1369 @@ class RoomModelTest(TestCase):
             booking_channel='online'
         )
         self.assertTrue(self.room1.is_available)
+
+
+class RoomAvailabilityQueryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # As a warm worker has it; see HotelsTest for the lookup.
+        get_hotel()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest = Guest.objects.create(
+                first_name="Jane",
+                last_name="Doe",
+                email="jane@example.com",
+            )
+
+    def create_rooms(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_rooms(count)
+
+    def _create_rooms(self, count):
+        today = date.today()
+        for i in range(count):
+            room = Room.objects.create(
+                room_number=f'{i:04d}',
+                room_type='single',
+                price_per_night=100.00,
+                capacity=1
+            )
+            if i % 2:
+                Booking.objects.create(
+                    room=room,
+                    guest=self.guest,
+                    check_in_date=today,
+                    check_out_date=today + timedelta(days=2),
+                )
+
+    def test_available_excludes_rooms_booked_today(self):
+        self.create_rooms(4)
+        self.assertEqual(
+            list(Room.objects.available().values_list('room_number', flat=True)),
+            ['0000', '0002'],
+        )
+
+    def test_available_for_range(self):
+        self.create_rooms(2)
+        today = date.today()
+        self.assertEqual(Room.objects.available(today, today + timedelta(days=1)).count(), 1)
+        self.assertEqual(
+            Room.objects.available(today + timedelta(days=2), today + timedelta(days=4)).count(), 2
+        )
+
+    def test_room_list_query_count_is_constant(self):
+        for count in (5, 60):
+            with self.captureOnCommitCallbacks(execute=True):
+                Booking.objects.all().delete()
+                Room.objects.all().delete()
+            self.create_rooms(count)
+            # One COUNT for the paginator plus one page SELECT, whatever the room count.
+            with self.assertNumQueries(2):
+                response = self.client.get('/rooms/', {'available': 'true'})
+            self.assertEqual(len(response.context['rooms']), min(10, (count + 1) // 2))
+
+
+class RoomStaySearchTest(TestCase):
+    def setUp(self):
+        guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        self.cheap = Room.objects.create(room_number='201', room_type='single', price_per_night=80, capacity=1)
+        self.dear = Room.objects.create(room_number='101', room_type='suite', price_per_night=300, capacity=3)
+        self.booked = Room.objects.create(room_number='301', room_type='double', price_per_night=50, capacity=2)
+        self.check_in = date.today() + timedelta(days=3)
+        Booking.objects.create(
+            room=self.booked,
+            guest=guest,
+            check_in_date=self.check_in + timedelta(days=1),
+            check_out_date=self.check_in + timedelta(days=5),
+        )
+
+    def search(self, **params):
+        from .filters import RoomFilter
+        return RoomFilter(params, queryset=Room.objects.all())
+
+    def test_window_excludes_overlapping_rooms_and_sorts_by_total(self):
+        rooms = list(self.search(
+            check_in=self.check_in.isoformat(),
+            check_out=(self.check_in + timedelta(days=2)).isoformat(),
+        ).qs)
+        self.assertEqual(rooms, [self.cheap, self.dear])
+        self.assertEqual([room.stay_total for room in rooms], [160, 600])
+
+    def test_back_to_back_stay_is_free(self):
+        rooms = self.search(
+            check_in=(self.check_in + timedelta(days=5)).isoformat(),
+            check_out=(self.check_in + timedelta(days=6)).isoformat(),
+        ).qs
+        self.assertIn(self.booked, rooms)
+
+    def test_check_out_must_follow_check_in(self):
+        filterset = self.search(check_in=self.check_in.isoformat(), check_out=self.check_in.isoformat())
+        self.assertFalse(filterset.is_valid())
+
+
+class ExplainHotQueriesCommandTest(TestCase):
+    def test_hot_queries_use_indexes(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        out = StringIO()
+        call_command('explain_hot_queries', '--check', stdout=out)
+        self.assertIn('booking_active_stay_idx', out.getvalue())
+
+
+class AvailablePeriodsTest(TestCase):
+    def setUp(self):
+        self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        self.room1 = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        self.room2 = Room.objects.create(room_number='102', room_type='double', price_per_night=150, capacity=2)
+        self.today = date.today()
+
+    def book(self, room, start, end, status='confirmed'):
+        return Booking.objects.create(
+            room=room,
+            guest=self.guest,
+            check_in_date=self.today + timedelta(days=start),
+            check_out_date=self.today + timedelta(days=end),
+            status=status,
+        )
+
+    def test_batch_matches_single_room(self):
+        self.book(self.room1, 2, 5)
+        self.book(self.room1, 5, 8)
+        self.book(self.room1, 10, 12, status='canceled')
+        day = lambda n: self.today + timedelta(days=n)
+        with self.assertNumQueries(2):
+            periods = Room.objects.all().available_periods()
+        self.assertEqual(periods, {
+            self.room1.pk: [(day(0), day(2)), (day(8), day(30))],
+            self.room2.pk: [(day(0), day(30))],
+        })
+        self.assertEqual(self.room1.get_available_periods(), periods[self.room1.pk])
+
+    def test_booking_page_computes_periods_once(self):
+        self.book(self.room1, 2, 5)
+        # The room lookup plus a single periods query shared by the form and the template.
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/rooms/{self.room1.pk}/book/')
+        self.assertEqual(len(response.context['available_periods']), 2)
+
+
+@override_settings(HOTEL_AVAILABILITY_INDEX=True)
+class AvailabilityIndexTest(TestCase):
+    def setUp(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        self.today = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+            self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+            self.booking = Booking.objects.create(
+                room=self.room,
+                guest=self.guest,
+                check_in_date=self.today + timedelta(days=2),
+                check_out_date=self.today + timedelta(days=5),
+            )
+
+    def test_range_checks_without_queries(self):
+        index = get_index()
+        day = lambda n: self.today + timedelta(days=n)
+        with self.assertNumQueries(0):
+            self.assertTrue(index.is_free(self.room.pk, day(0), day(2)))
+            self.assertFalse(index.is_free(self.room.pk, day(1), day(3)))
+            self.assertFalse(index.is_free(self.room.pk, day(3), day(4)))
+            self.assertTrue(index.is_free(self.room.pk, day(5), day(7)))
+            self.assertFalse(index.is_free_on(self.room.pk, day(5)))
+            self.assertEqual(self.room.get_available_periods(), [(day(0), day(2)), (day(5), day(30))])
+
+    def test_commit_hook_keeps_index_current(self):
+        index = get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.status = Booking.BookingStatus.CANCELED
+            self.booking.save()
+        self.assertTrue(index.is_free(self.room.pk, self.today, self.today + timedelta(days=7)))
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Booking.objects.create(
+                room=self.room, guest=self.guest, check_in_date=self.today, check_out_date=self.today + timedelta(days=1),
+            )
+        self.assertFalse(self.room.is_available)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertTrue(self.room.is_available)
+        self.assertEqual(index.diff(), [])
+
+    def test_bulk_delete_refreshes_once(self):
+        from django.db import transaction
+
+        get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(10):
+                room = Room.objects.create(room_number=f'2{n:02d}', room_type='single', price_per_night=90, capacity=1)
+                Booking.objects.create(
+                    room=room, guest=self.guest, check_in_date=self.today, check_out_date=self.today + timedelta(days=1),
+                )
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.guest.delete()
+        self.assertEqual(len(callbacks), 1)
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(get_index().diff(), [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    Room.objects.get(room_number='101').delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+
+    def test_staff_check_reports_missed_writes(self):
+        from django.contrib.auth import get_user_model
+
+        url = '/staff/availability-index/'
+        self.client.force_login(get_user_model().objects.create_user('staff', password='pw', is_staff=True))
+        self.assertEqual(self.client.get(url).json(), {'loaded': False, 'problems': []})
+        get_index()
+        self.assertEqual(self.client.get(url).json(), {'loaded': True, 'problems': []})
+        # Bypasses the signals, so the index is not told.
+        Booking.objects.filter(pk=self.booking.pk).update(status=Booking.BookingStatus.CANCELED)
+        problems = self.client.get(url).json()['problems']
+        self.assertEqual(len(problems), 1)
+        self.assertIn(f'booking {self.booking.pk} in index but not active in database', problems[0])
+
+
+@override_settings(HOTEL_AVAILABILITY_INDEX=True)
+class AutocommitRefreshTest(TransactionTestCase):
+    def test_autocommit_write_refreshes_index(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        self.assertTrue(room.is_available)
+        booking = Booking.objects.create(
+            room=room, guest=guest, check_in_date=date.today(), check_out_date=date.today() + timedelta(days=1),
+        )
+        self.assertFalse(room.is_available)
+        booking.delete()
+        self.assertTrue(room.is_available)
+
+    def test_autocommit_save_bumps_versions(self):
+        from .cache import guest_version, room_version, version_map
+
+        guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        names = ['catalogue', room_version(room.pk), guest_version(guest.pk)]
+        before = version_map(names)
+        room.price_per_night = 120
+        room.save()
+        guest.last_name = "Roe"
+        guest.save()
+        after = version_map(names)
+        self.assertTrue(all(after[name] > before[name] for name in names), (before, after))
+
+
+class ReserveBookingTest(TestCase):
+    def setUp(self):
+        self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        self.check_in = date.today() + timedelta(days=2)
+        metrics.reset()
+
+    def test_overlapping_reservation_is_rejected(self):
+        Booking.objects.reserve(self.room, self.check_in, self.check_in + timedelta(days=3), guest=self.guest)
+        with self.assertRaises(RoomUnavailable):
+            Booking.objects.reserve(
+                self.room, self.check_in + timedelta(days=1), self.check_in + timedelta(days=4), guest=self.guest,
+            )
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(metrics.snapshot()['booking.conflicts'], 1)
+
+    def test_lock_timeout_is_retried(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from .models import BookingQuerySet
+
+        create = BookingQuerySet.create
+        calls = []
+
+        def flaky_create(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return create(queryset, **kwargs)
+
+        with mock.patch.object(BookingQuerySet, 'create', flaky_create), mock.patch('time.sleep'):
+            booking = Booking.objects.reserve(
+                self.room, self.check_in, self.check_in + timedelta(days=1), guest=self.guest,
+            )
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Booking.objects.get(), booking)
+        self.assertEqual(metrics.snapshot()['booking.lock_retries'], 1)
+
+    def test_booking_post_creates_one_booking(self):
+        response = self.client.post(f'/rooms/{self.room.pk}/book/', {
+            'first_name': 'Jane',
+            'last_name': 'Doe',
+            'email': 'jane@example.com',
+            'check_in_date': self.check_in.isoformat(),
+            'check_out_date': (self.check_in + timedelta(days=2)).isoformat(),
+        })
+        self.assertRedirects(response, '/bookings/', fetch_redirect_response=False)
+        booking = Booking.objects.get()
+        self.assertEqual((booking.room, booking.guest), (self.room, self.guest))
+
+
+class RoomNightTest(TestCase):
+    def setUp(self):
+        self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        self.today = date.today()
+
+    def nights(self):
+        from .models import RoomNight
+
+        return list(RoomNight.objects.order_by('date').values_list('date', 'status'))
+
+    def test_nights_follow_booking_changes(self):
+        day = lambda n: self.today + timedelta(days=n)
+        booking = Booking.objects.create(room=self.room, guest=self.guest, check_in_date=day(1), check_out_date=day(3))
+        self.assertEqual(self.nights(), [(day(1), 'confirmed'), (day(2), 'confirmed')])
+
+        booking.check_out_date, booking.status = day(2), Booking.BookingStatus.CHECKED_IN
+        booking.save()
+        self.assertEqual(self.nights(), [(day(1), 'checked_in')])
+        with self.assertNumQueries(1):
+            booking.notes = "Late arrival"
+            booking.save()
+
+        booking.status = Booking.BookingStatus.CANCELED
+        booking.save()
+        self.assertEqual(self.nights(), [])
+        booking.status = Booking.BookingStatus.CONFIRMED
+        booking.save()
+        booking.delete()
+        self.assertEqual(self.nights(), [])
+
+    def test_constraint_rejects_overlap_on_any_database(self):
+        from django.db import IntegrityError, transaction
+
+        Booking.objects.create(
+            room=self.room, guest=self.guest, check_in_date=self.today, check_out_date=self.today + timedelta(days=3),
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.create(
+                room=self.room, guest=self.guest,
+                check_in_date=self.today + timedelta(days=2), check_out_date=self.today + timedelta(days=4),
+            )
+        self.assertEqual(Booking.objects.count(), 1)
+        # History may overlap; only active nights are unique.
+        Booking.objects.create(
+            room=self.room, guest=self.guest, status=Booking.BookingStatus.CHECKED_OUT,
+            check_in_date=self.today, check_out_date=self.today + timedelta(days=1),
+        )
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import RoomNight
+
+        Booking.objects.create(
+            room=self.room, guest=self.guest, check_in_date=self.today, check_out_date=self.today + timedelta(days=2),
+        )
+        expected = self.nights()
+        RoomNight.objects.all().delete()
+        self.assertTrue(Room.objects.available().exists())
+
+        out = StringIO()
+        call_command('rebuild_room_nights', stdout=out)
+        self.assertIn('Stored 2 room nights', out.getvalue())
+        self.assertEqual(self.nights(), expected)
+        self.assertFalse(Room.objects.available().exists())
+
+
+class SQLiteTuningTest(TestCase):
+    def test_pragmas_applied_to_new_connections(self):
+        from django.conf import settings
+        from django.db import connection
+
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+class BookingOverlapConstraintTest(TestCase):
+    def test_database_rejects_double_booking(self):
+        from django.db import IntegrityError, connection, transaction
+
+        if connection.vendor != 'postgresql':
+            self.skipTest("exclusion constraint is PostgreSQL only")
+        guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        check_in = date.today() + timedelta(days=1)
+        Booking.objects.create(room=room, guest=guest, check_in_date=check_in, check_out_date=check_in + timedelta(days=3))
+        Booking.objects.create(
+            room=room, guest=guest, check_in_date=check_in, check_out_date=check_in + timedelta(days=3), status='canceled',
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.create(
+                room=room, guest=guest, check_in_date=check_in + timedelta(days=2), check_out_date=check_in + timedelta(days=4),
+            )
+
+    def test_range_and_comparison_forms_agree(self):
+        guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        day = date.today() + timedelta(days=5)
+        Booking.objects.create(room=room, guest=guest, check_in_date=day, check_out_date=day + timedelta(days=2))
+        overlapping = Booking.objects.active().overlapping
+        self.assertFalse(overlapping(day - timedelta(days=2), day).exists())
+        self.assertTrue(overlapping(day - timedelta(days=1), day + timedelta(days=1)).exists())
+        self.assertFalse(overlapping(day + timedelta(days=2), day + timedelta(days=3)).exists())
+        self.assertTrue(Booking.objects.on_date(day + timedelta(days=2)).exists())
+        self.assertFalse(Booking.objects.on_date(day + timedelta(days=3)).exists())
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+            self.room1 = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+            self.room2 = Room.objects.create(room_number='102', room_type='double', price_per_night=150, capacity=2)
+        self.check_in = date.today() + timedelta(days=10)
+
+    def search(self, offset, nights=2):
+        check_in = self.check_in + timedelta(days=offset)
+        return {'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=nights)).isoformat()}
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.client.get('/rooms/', {'room_type': 'single', 'min_price': ''})
+        with self.assertNumQueries(0):
+            response = self.client.get('/rooms/', {'min_price': '', 'room_type': 'single'})
+        self.assertContains(response, 'Номер 101')
+        self.assertEqual(metrics.snapshot()['cache.RoomListView.hit'], 1)
+
+    def test_booking_invalidates_only_overlapping_searches(self):
+        self.client.get('/rooms/', self.search(0))
+        self.client.get('/rooms/', self.search(20))
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                room=self.room1, guest=self.guest,
+                check_in_date=self.check_in + timedelta(days=1), check_out_date=self.check_in + timedelta(days=3),
+            )
+        with self.assertNumQueries(0):
+            self.client.get('/rooms/', self.search(20))
+        response = self.client.get('/rooms/', self.search(0))
+        self.assertEqual(list(response.context['rooms']), [self.room2])
+
+    def test_room_save_drops_that_rooms_pages(self):
+        self.client.get(f'/rooms/{self.room1.pk}/')
+        self.client.get(f'/rooms/{self.room2.pk}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room1.description = 'Sea view'
+            self.room1.save()
+        with self.assertNumQueries(0):
+            self.client.get(f'/rooms/{self.room2.pk}/')
+        self.assertContains(self.client.get(f'/rooms/{self.room1.pk}/'), 'Sea view')
+
+    def test_staff_metrics_endpoint(self):
+        from django.contrib.auth.models import User
+
+        self.client.get('/rooms/')
+        self.assertEqual(self.client.get('/staff/metrics/').status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        self.assertEqual(self.client.get('/staff/metrics/').json()['cache.RoomListView.miss'], 1)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com", phone="555")
+        self.rooms = [
+            Room.objects.create(room_number=f'{n:03d}', room_type='single', price_per_night=100 + n % 3, capacity=1)
+            for n in range(25)
+        ]
+
+    def walk(self, url, params, key='rooms', queries=2):
+        seen, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            pages += 1
+            seen += list(response.context[key])
+            if not response.context['page_obj'].has_next():
+                return seen, pages
+            with self.assertNumQueries(queries):  # capped count (if shown) + page
+                response = self.client.get(url + response.context['page_obj'].next_url)
+
+    def test_room_pages_cover_every_room_once(self):
+        seen, pages = self.walk('/rooms/', {})
+        self.assertEqual(seen, self.rooms)
+        self.assertEqual(pages, 3)
+
+    def test_stay_search_pages_follow_total_order(self):
+        check_in = date.today() + timedelta(days=3)
+        Booking.objects.create(
+            room=self.rooms[4], guest=self.guest, check_in_date=check_in, check_out_date=check_in + timedelta(days=1),
+        )
+        seen, _ = self.walk('/rooms/', {
+            'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=2)).isoformat(),
+        })
+        expected = sorted(
+            (room for room in self.rooms if room != self.rooms[4]),
+            key=lambda room: (room.price_per_night, room.room_number),
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_token(self):
+        from .pagination import encode_token
+        self.assertEqual(self.client.get('/rooms/', {'after': 'not-a-token'}).status_code, 404)
+        # Decodes, but not to values of the keyset's fields.
+        for values in (['001', 'b'], ['001'], ['001', None], ['001', [1]]):
+            self.assertEqual(self.client.get('/rooms/', {'after': encode_token(values)}).status_code, 404)
+        after = encode_token(['zz', self.rooms[0].pk])
+        self.assertEqual(self.client.get('/bookings/', {'phone': '555', 'after': after}).status_code, 404)
+
+    def test_booking_list_newest_stay_first(self):
+        today = date.today()
+        bookings = [
+            Booking.objects.create(
+                room=room, guest=self.guest, check_in_date=today + timedelta(days=n // 2),
+                check_out_date=today + timedelta(days=n // 2 + 1),
+            )
+            for n, room in enumerate(self.rooms[:15])
+        ]
+        seen, pages = self.walk('/bookings/', {'phone': '555'}, key='bookings', queries=1)
+        self.assertEqual(seen, sorted(bookings, key=lambda b: (b.check_in_date, b.pk), reverse=True))
+        self.assertEqual(pages, 2)
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com", phone="555")
+            self.room1 = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+            self.room2 = Room.objects.create(room_number='102', room_type='double', price_per_night=150, capacity=2)
+
+    def book(self, room, check_in, nights=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(
+                room=room, guest=self.guest, check_in_date=check_in, check_out_date=check_in + timedelta(days=nights),
+            )
+
+    def test_room_search_pages(self):
+        response = self.client.get('/api/rooms/', {'limit': 1})
+        self.assertEqual(response.json(), {
+            'results': [{
+                'id': self.room1.pk, 'room_number': '101', 'room_type': 'single', 'capacity': 1,
+                'price_per_night': '100.00', 'description': None,
+            }],
+            'after': response.json()['after'],
+        })
+        response = self.client.get('/api/rooms/', {'limit': 1, 'after': response.json()['after']})
+        self.assertEqual([row['room_number'] for row in response.json()['results']], ['102'])
+        self.assertIsNone(response.json()['after'])
+
+    def test_stay_search_etag(self):
+        check_in = date.today() + timedelta(days=3)
+        params = {'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=2)).isoformat()}
+        response = self.client.get('/api/rooms/', params)
+        self.assertEqual([row['stay_total'] for row in response.json()['results']], ['200', '300'])
+        etag = response.headers['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/rooms/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.book(self.room1, check_in + timedelta(days=1))
+        response = self.client.get('/api/rooms/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.room2.pk])
+
+    def test_invalid_search(self):
+        response = self.client.get('/api/rooms/', {'check_in': date.today().isoformat()})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_invalid_token(self):
+        from .pagination import encode_token
+        response = self.client.get('/api/rooms/', {'after': encode_token(['101', 'b'])})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'errors': {'after': ["Invalid page token."]}})
+        self.book(self.room1, date.today())
+        response = self.client.get('/api/bookings/', {'phone': '555', 'after': encode_token(['zz', 1])})
+        self.assertEqual(response.status_code, 400)
+
+    def test_room_periods(self):
+        today = date.today()
+        response = self.client.get(f'/api/rooms/{self.room1.pk}/periods/', {'days': 10})
+        self.assertEqual(response.json()['periods'], [
+            {'start': today.isoformat(), 'end': (today + timedelta(days=10)).isoformat()},
+        ])
+        etag = response.headers['ETag']
+        response = self.client.get(f'/api/rooms/{self.room1.pk}/periods/', {'days': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Another room's bookings leave this room's ETag alone.
+        self.book(self.room2, today + timedelta(days=2))
+        response = self.client.get(f'/api/rooms/{self.room1.pk}/periods/', {'days': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.book(self.room1, today + timedelta(days=2))
+        response = self.client.get(f'/api/rooms/{self.room1.pk}/periods/', {'days': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()['periods']), 2)
+        self.assertEqual(self.client.get('/api/rooms/999/periods/').status_code, 404)
+
+    def test_guest_bookings(self):
+        booking = self.book(self.room1, date.today())
+        response = self.client.get('/api/bookings/', {'phone': '555'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [booking.pk])
+        self.assertEqual(response.json()['results'][0]['room__room_number'], '101')
+        etag = response.headers['ETag']
+
+        self.assertEqual(self.client.get('/api/bookings/', {'phone': '555'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room1.room_number = '201'
+            self.room1.save()
+        response = self.client.get('/api/bookings/', {'phone': '555'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['results'][0]['room__room_number'], '201')
+        etag = response.headers['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        response = self.client.get('/api/bookings/', {'phone': '555'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['results'], [])
+        self.assertEqual(self.client.get('/api/bookings/').status_code, 400)
+
+
+class BookingFeedTest(TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com", phone="555")
+        self.start = date.today() + timedelta(days=10)
+        Booking.objects.create(
+            room=self.room, guest=self.guest, check_in_date=self.start, check_out_date=self.start + timedelta(days=2),
+        )
+
+    def path(self, name):
+        import os
+
+        return os.path.join(self.dir.name, name)
+
+    def run_import(self, name, content, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        with open(self.path(name), 'w') as feed:
+            feed.write(content)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_bookings', self.path(name), *args, stdout=StringIO())
+
+    def day(self, n):
+        return (self.start + timedelta(days=n)).isoformat()
+
+    def test_csv_import(self):
+        import json
+
+        self.run_import('feed.csv', '\n'.join([
+            'room_number,email,first_name,last_name,phone,check_in_date,check_out_date,status',
+            f'101,jane@example.com,Janet,Doe,777,{self.day(2)},{self.day(4)},',
+            f'101,bob@example.com,Bob,Roe,,{self.day(3)},{self.day(5)},',  # overlaps the row above
+            f'101,bob@example.com,Bob,Roe,,{self.day(0)},{self.day(1)},canceled',
+            f'999,bob@example.com,Bob,Roe,,{self.day(6)},{self.day(7)},',
+            f'101,bob@example.com,Bob,Roe,,{self.day(7)},{self.day(6)},',
+            f'101,bob@example.com,Bob,Roe,{"5" * 21},{self.day(8)},{self.day(9)},',
+            f'101,bob@@example.com,Bob,Roe,,{self.day(8)},{self.day(9)},',
+            f'101,{"b" * 64}@{"e" * 63}.{"x" * 63}.{"a" * 63}.com,Bob,Roe,,{self.day(8)},{self.day(9)},',
+        ]) + '\n', '--chunk-size', '2')
+
+        self.assertEqual(Booking.objects.count(), 3)
+        self.assertTrue(Booking.objects.filter(
+            guest=self.guest, check_in_date=self.day(2), booking_channel='agent', status='confirmed',
+        ).exists())
+        self.guest.refresh_from_db()
+        self.assertEqual((self.guest.first_name, self.guest.phone), ('Janet', '777'))
+        with open(self.path('feed.csv.rejects.jsonl')) as rejects:
+            reasons = {row['line']: row['reason'] for row in map(json.loads, rejects)}
+        self.assertEqual(reasons, {
+            3: "overlaps an active booking for this room",
+            5: "unknown room '999'",
+            6: "check_out_date must be after check_in_date",
+            7: "phone longer than 20 characters",
+            8: "invalid email 'bob@@example.com'",
+            9: "email longer than 254 characters",
+        })
+
+    def test_overlaps_existing_booking(self):
+        self.run_import('feed.jsonl', '\n'.join([
+            f'{{"room_number": "101", "email": "bob@example.com", "first_name": "Bob", "last_name": "Roe",'
+            f' "check_in_date": "{self.day(1)}", "check_out_date": "{self.day(3)}"}}',
+            'not json',
+        ]))
+        self.assertEqual(Booking.objects.count(), 1)
+        with open(self.path('feed.jsonl.rejects.jsonl')) as rejects:
+            self.assertEqual(len(rejects.readlines()), 2)
+
+    def test_export_round_trip(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('export_bookings', '--output', self.path('out.jsonl'))
+        Booking.objects.all().delete()
+        Guest.objects.all().delete()
+        self.run_import('copy.jsonl', open(self.path('out.jsonl')).read())
+        booking = Booking.objects.select_related('guest').get()
+        self.assertEqual((booking.guest.email, booking.check_in_date), ('jane@example.com', self.start))
+        self.assertEqual(booking.booking_channel, 'online')
+
+        out = StringIO()
+        call_command('export_bookings', '--format', 'csv', '--since', self.day(3), stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1:], [])
+
+
+class PhoneLookupTest(TestCase):
+    def setUp(self):
+        self.guest = Guest.objects.create(
+            first_name="Jane", last_name="Doe", email="jane@example.com", phone="+380 (50) 123-45-67",
+        )
+        self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        self.booking = Booking.objects.create(
+            room=self.room, guest=self.guest, check_in_date=date.today(), check_out_date=date.today() + timedelta(days=1),
+        )
+
+    def test_normalize_phone(self):
+        from .phones import normalize_phone
+
+        for value in ["+380501234567", "0501234567", "00380501234567", "380 50 123 45 67", "501234567"]:
+            self.assertEqual(normalize_phone(value), "+380501234567", value)
+        self.assertEqual(normalize_phone("+1 (202) 555-0123"), "+12025550123")
+        for value in [None, "", "  ", "phone", "+1234567890123456"]:
+            self.assertIsNone(normalize_phone(value), value)
+        self.assertEqual(self.guest.phone_normalized, "+380501234567")
+
+    def test_login_redirects_to_normalized_phone(self):
+        response = self.client.post('/bookings/login/', {'phone': '050 123 45 67'})
+        self.assertRedirects(response, '/bookings/?phone=%2B380501234567')
+        self.assertEqual(self.client.post('/bookings/login/', {'phone': 'none'}).status_code, 200)
+
+    def test_booking_list_matches_formatting_variants(self):
+        for phone in ['0501234567', '+380501234567', '(050) 123-45-67']:
+            with self.assertNumQueries(1):
+                response = self.client.get('/bookings/', {'phone': phone})
+            self.assertEqual(list(response.context['bookings']), [self.booking])
+        self.assertContains(response, 'Jane Doe — 101 (Confirmed)')
+        self.assertEqual(list(self.client.get('/bookings/', {'phone': '0501234568'}).context['bookings']), [])
+
+    def test_phone_change_updates_normalized(self):
+        self.guest.phone = '0671112233'
+        self.guest.save(update_fields=['phone'])
+        self.assertEqual(Guest.objects.get(pk=self.guest.pk).phone_normalized, '+380671112233')
+
+
+class GuestUpsertTest(TestCase):
+    def setUp(self):
+        self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com", phone="0501234567")
+        self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+
+    def test_upsert_inserts_and_updates(self):
+        with self.assertNumQueries(2):  # one upsert each for guests with and without a phone
+            jane, bob, ann = Guest.objects.upsert([
+                Guest(first_name="Janet", last_name="Doe", email="jane@example.com", phone="067 111 22 33"),
+                Guest(first_name="Bob", last_name="Roe", email="bob@example.com", phone="0509999999"),
+                Guest(first_name="Ann", last_name="Poe", email="ann@example.com"),
+            ])
+        self.assertEqual(jane.pk, self.guest.pk)
+        self.guest.refresh_from_db()
+        self.assertEqual((self.guest.first_name, self.guest.phone_normalized), ("Janet", "+380671112233"))
+        self.assertEqual(Guest.objects.get(pk=bob.pk).phone_normalized, "+380509999999")
+        self.assertEqual(Guest.objects.get(pk=ann.pk).first_name, "Ann")
+
+        Guest.objects.upsert([Guest(first_name="Jane", last_name="Doe", email="jane@example.com")])
+        self.guest.refresh_from_db()
+        self.assertEqual((self.guest.first_name, self.guest.phone), ("Jane", "067 111 22 33"))
+
+    def test_booking_form_updates_returning_guest(self):
+        check_in = date.today() + timedelta(days=1)
+        data = {
+            'first_name': 'Janet', 'last_name': 'Doe', 'email': 'jane@example.com', 'phone': '0671112233',
+            'check_in_date': check_in.isoformat(), 'check_out_date': (check_in + timedelta(days=1)).isoformat(),
+        }
+        cache.clear()
+        # The hotel, room, available periods, form overlap check, then
+        # savepoint, room lock, guest upsert, booking insert, the rate
+        # table's rules, nights insert, release, and the confirmation job.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(12):
+            response = self.client.post(f'/rooms/{self.room.pk}/book/', data)
+        self.assertEqual(response.status_code, 302)
+        booking = Booking.objects.select_related('guest').get()
+        self.assertEqual(booking.guest.pk, self.guest.pk)
+        self.assertEqual((booking.guest.first_name, booking.guest.phone), ('Janet', '0671112233'))
+        self.assertEqual(Guest.objects.count(), 1)
+
+    def test_admin_add_existing_email_updates_guest(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        response = self.client.post('/admin/hotel/guest/add/', {
+            'first_name': 'Janet', 'last_name': 'Doe', 'email': 'jane@example.com', 'phone': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.guest.refresh_from_db()
+        self.assertEqual((self.guest.first_name, self.guest.phone), ('Janet', '0501234567'))
+        self.assertEqual(Guest.objects.count(), 1)
+
+
+class QueryProfilingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        get_hotel()
+
+    def test_server_timing_and_log(self):
+        import json
+
+        with self.assertLogs('hotel.profiling.requests') as logs:
+            response = self.client.get(f'/rooms/{self.room.pk}/')
+        self.assertRegex(response.headers['Server-Timing'], r'^sql;dur=[\d.]+;desc="1 queries", template;dur=')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['view'], entry['queries'], entry['budget']), ('hotel.views.room.RoomDetailView', 1, 2))
+        self.assertIn('hotel_room', entry['slowest'][0]['sql'])
+        parts = entry['sql_ms'] + entry['template_ms'] + entry['python_ms']
+        self.assertAlmostEqual(parts, entry['total_ms'], delta=0.05)
+        self.assertRegex(entry['slowest'][0]['site'], r'^hotel/cache\.py:\d+ in get$')
+
+    def test_budget_violation(self):
+        from unittest import mock
+        from .profiling import QueryBudgetExceeded
+        from .views.room import RoomDetailView
+
+        with mock.patch.object(RoomDetailView, 'query_budget', 0):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'over its budget of 0'):
+                self.client.get(f'/rooms/{self.room.pk}/')
+            cache.clear()
+            with override_settings(HOTEL_QUERY_BUDGET_STRICT=False), self.assertLogs('hotel.profiling', 'WARNING'):
+                self.assertEqual(self.client.get(f'/rooms/{self.room.pk}/').status_code, 200)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com", phone="555")
+        self.rooms = [
+            Room.objects.create(room_number=f'10{n}', room_type='single', price_per_night=100 + n, capacity=1)
+            for n in range(3)
+        ]
+        Booking.objects.create(
+            room=self.rooms[0], guest=self.guest, check_in_date=date.today() + timedelta(days=2),
+            check_out_date=date.today() + timedelta(days=4),
+        )
+
+    def get(self, view, path, params=None, **kwargs):
+        from asgiref.sync import async_to_sync, iscoroutinefunction
+        from django.test import RequestFactory
+
+        cache.clear()
+        request = RequestFactory().get(path, params)
+        request.hotel = self.rooms[0].hotel
+        if iscoroutinefunction(view):
+            response = async_to_sync(view)(request, **kwargs)
+        else:
+            response = view(request, **kwargs)
+        return response.render() if hasattr(response, 'render') else response
+
+    def test_async_views_match_sync_views(self):
+        from .views import api, asynchronous, booking, room
+
+        pk = self.rooms[0].pk
+        check_in = (date.today() + timedelta(days=3)).isoformat()
+        check_out = (date.today() + timedelta(days=5)).isoformat()
+        for sync_view, async_view, path, params, kwargs in [
+            (room.RoomListView.as_view(), asynchronous.RoomListView.as_view(), '/rooms/',
+             {'check_in': check_in, 'check_out': check_out, 'min_capacity': 1}, {}),
+            (room.RoomListView.as_view(), asynchronous.RoomListView.as_view(), '/rooms/', {'available': 'true'}, {}),
+            (room.RoomDetailView.as_view(), asynchronous.RoomDetailView.as_view(), f'/rooms/{pk}/', {}, {'pk': pk}),
+            (booking.BookingListView.as_view(), asynchronous.BookingListView.as_view(), '/bookings/',
+             {'phone': '555'}, {}),
+            (api.room_search, asynchronous.room_search, '/api/rooms/', {'limit': 2}, {}),
+            (api.room_periods, asynchronous.room_periods, f'/api/rooms/{pk}/periods/', {'days': 10}, {'pk': pk}),
+        ]:
+            with self.subTest(path=path, params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    expected = self.get(sync_view, path, params, **kwargs)
+                budget = getattr(async_view, 'view_class', async_view).query_budget
+                self.assertLessEqual(len(queries), budget)
+                with self.assertNumQueries(len(queries)):
+                    response = self.get(async_view, path, params, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+        with self.assertRaises(Http404):
+            self.get(asynchronous.RoomDetailView.as_view(), '/rooms/999/', pk=999)
+
+    async def test_profiling_under_asgi(self):
+        from asgiref.sync import sync_to_async
+
+        await sync_to_async(get_hotel)()
+        response = await self.async_client.get(f'/rooms/{self.rooms[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.headers['Server-Timing'], r'^sql;dur=[\d.]+;desc="1 queries"')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        self.check_in = date.today() + timedelta(days=1)
+
+    def post_booking(self, email='jane@example.com'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/rooms/{self.room.pk}/book/', {
+                'first_name': 'Jane', 'last_name': 'Doe', 'email': email,
+                'check_in_date': self.check_in.isoformat(),
+                'check_out_date': (self.check_in + timedelta(days=1)).isoformat(),
+            })
+
+    def drain(self, **kwargs):
+        from .jobs import Worker
+
+        worker = Worker(**kwargs)
+        while worker.run_once():
+            pass
+        return worker.stats
+
+    def test_confirmation_is_sent_by_the_worker(self):
+        from django.core import mail
+        from . import jobs
+        from .models import Job
+
+        self.assertEqual(self.post_booking().status_code, 302)
+        booking = Booking.objects.get()
+        self.assertEqual(mail.outbox, [])
+        # Enqueueing the same key again is a no-op.
+        jobs.enqueue('booking.confirmation', {'booking': booking.pk}, key=f'booking.confirmation:{booking.pk}')
+        self.assertEqual(Job.objects.count(), 1)
+
+        self.assertEqual(self.drain(), {'booking.confirmation': [1, 0, mock.ANY]})
+        self.assertEqual([message.to for message in mail.outbox], [['jane@example.com']])
+        self.assertIn(f'#{booking.pk} is confirmed', mail.outbox[0].body)
+        self.assertEqual(Job.objects.get().status, Job.Status.DONE)
+
+    def test_lease_retry_and_failure(self):
+        from django.utils import timezone
+        from . import jobs
+        from .models import Job
+
+        calls = []
+
+        def flaky(payloads):
+            calls.append(payloads)
+            raise RuntimeError("mail server down")
+
+        with mock.patch.dict(jobs.HANDLERS, {'flaky': jobs.Handler(flaky, batch_size=10, max_attempts=2)}):
+            for n in range(3):
+                jobs.enqueue('flaky', {'n': n})
+            claimed = Job.objects.claim(timedelta(minutes=1), {'flaky': 10})
+            self.assertEqual([job.payload['n'] for job in claimed], [0, 1, 2])
+            # Leased: nothing else is due until the lease runs out.
+            self.assertEqual(Job.objects.claim(timedelta(minutes=1), {'flaky': 10}), [])
+            Job.objects.update(lease_expires=timezone.now() - timedelta(seconds=1))
+
+            with self.assertLogs('hotel.jobs', 'ERROR'):
+                self.assertEqual(self.drain(names=['flaky']), {'flaky': [0, 3, mock.ANY]})
+            # The batch ran once, its second attempt, and is out of attempts.
+            self.assertEqual(calls, [[{'n': 0}, {'n': 1}, {'n': 2}]])
+            self.assertEqual(set(Job.objects.values_list('status', 'attempts')), {(Job.Status.FAILED, 2)})
+            self.assertIn('mail server down', Job.objects.first().last_error)
+
+    @override_settings(HOTEL_QUEUE_CACHE_INVALIDATION=True)
+    def test_queued_cache_invalidation_is_batched(self):
+        from .models import Job
+
+        search = {'check_in': self.check_in.isoformat(), 'check_out': (self.check_in + timedelta(days=1)).isoformat()}
+        self.client.get('/rooms/', search)
+        self.post_booking()
+        self.post_booking('john@example.com')  # unavailable: no commit, no job
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(room_number='102', room_type='single', price_per_night=100, capacity=1).delete()
+        self.assertEqual(Job.objects.filter(name='cache.invalidate').count(), 2)
+        with self.assertNumQueries(0):
+            self.client.get('/rooms/', search)  # stale until the worker runs
+
+        self.assertEqual(self.drain(names=['cache.invalidate']), {'cache.invalidate': [2, 0, mock.ANY]})
+        # Count, page and the rate table's rules, recompiled for the new room.
+        with self.assertNumQueries(3):
+            response = self.client.get('/rooms/', search)
+        self.assertEqual(list(response.context['rooms']), [])
+
+    @override_settings(HOTEL_QUEUE_CACHE_INVALIDATION=True)
+    def test_queued_cache_invalidation_commits_with_the_changes(self):
+        from django.db import transaction
+        from .models import Job
+
+        jobs = Job.objects.filter(name='cache.invalidate')
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Room.objects.create(room_number='102', room_type='single', price_per_night=100, capacity=1)
+            # Stored before the commit, and grown by the transaction's later changes.
+            self.assertEqual(jobs.get().payload['rooms'], [first.pk])
+            second = Room.objects.create(room_number='103', room_type='single', price_per_night=100, capacity=1)
+        self.assertEqual(jobs.get().payload['rooms'], [first.pk, second.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Room.objects.create(room_number='104', room_type='single', price_per_night=100, capacity=1)
+                transaction.set_rollback(True)
+        self.assertEqual(jobs.count(), 1)
+
+
+class BookingAdminTest(TestCase):
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        from django.contrib.auth import get_user_model
+
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        for n in range(5):
+            guest = Guest.objects.create(first_name='G', last_name=str(n), email=f'g{n}@example.com')
+            Booking.objects.create(
+                room=room, guest=guest, check_in_date=date.today() + timedelta(days=2 * n),
+                check_out_date=date.today() + timedelta(days=2 * n + 1),
+            )
+        # Session, user, two counts and the rows.
+        with self.assertNumQueries(5):
+            response = self.client.get('/admin/hotel/booking/')
+        self.assertContains(response, 'G 4')
+
+    def test_add_overlapping_booking_is_a_form_error(self):
+        from django.contrib.auth import get_user_model
+
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        room = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        guest = Guest.objects.create(first_name='G', last_name='1', email='g1@example.com')
+        check_in = date.today() + timedelta(days=1)
+        booking = Booking.objects.create(
+            room=room, guest=guest, check_in_date=check_in, check_out_date=check_in + timedelta(days=3),
+        )
+        data = {
+            'room': room.pk, 'guest': guest.pk, 'status': 'confirmed', 'booking_channel': 'phone',
+            'check_in_date': (check_in + timedelta(days=2)).isoformat(),
+            'check_out_date': (check_in + timedelta(days=4)).isoformat(),
+        }
+        response = self.client.post('/admin/hotel/booking/add/', data)
+        self.assertContains(response, "Room is not available for the selected dates.")
+        self.assertEqual(Booking.objects.count(), 1)
+
+        # The booking itself is no clash when edited.
+        data['check_in_date'] = check_in.isoformat()
+        response = self.client.post(f'/admin/hotel/booking/{booking.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+
+
+class AnalyticsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+            self.single = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+            self.double = Room.objects.create(room_number='102', room_type='double', price_per_night=200, capacity=2)
+        self.book(self.single, 0, 2, booking_channel='online')
+        self.book(self.double, 1, 2, booking_channel='phone', status='checked_in')
+
+    def book(self, room, start, end, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(
+                room=room, guest=self.guest, check_in_date=self.today + timedelta(days=start),
+                check_out_date=self.today + timedelta(days=end), **fields,
+            )
+
+    def report(self, by=None):
+        from . import analytics
+
+        return analytics.report(self.today, self.today + timedelta(days=3), by=by)
+
+    def test_figures_per_day_and_group(self):
+        from decimal import Decimal
+
+        days, totals = self.report()
+        self.assertEqual(
+            [(row['nights'], row['occupancy'], row['adr'], row['revpar']) for row in days],
+            [(1, 0.5, Decimal('100.00'), Decimal('50.00')), (2, 1.0, Decimal('150.00'), Decimal('150.00')),
+             (0, 0.0, None, Decimal('0.00'))],
+        )
+        self.assertEqual((totals[0]['rooms'], totals[0]['nights'], totals[0]['revenue']), (6, 3, Decimal(400)))
+
+        days, totals = self.report(by='room_type')
+        self.assertEqual([row['group'] for row in days[:5]], Room.RoomType.values)
+        self.assertEqual({row['group']: row['occupancy'] for row in totals}['single'], round(2 / 3, 4))
+        days, totals = self.report(by='channel')
+        self.assertEqual(
+            {row['group']: row['nights'] for row in totals}, {'online': 2, 'phone': 1, 'in_person': 0, 'agent': 0},
+        )
+
+    def test_cached_until_bookings_change(self):
+        self.report()
+        with self.assertNumQueries(1):  # room counts only
+            self.report()
+        self.book(self.double, 2, 3)
+        with self.assertNumQueries(2):
+            days, _ = self.report()
+        self.assertEqual(days[2]['nights'], 1)
+
+        # Nights keep the rate they were sold at.
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.filter(pk=self.double.pk).update(price_per_night=999)
+            self.double.refresh_from_db()
+            self.double.save()
+        self.assertEqual(self.report()[1][0]['revenue'], 600)
+
+    def test_other_hotels_are_left_out(self):
+        from . import analytics
+        from .models import Hotel
+
+        lake = Hotel.objects.create(name='Lake', slug='lake')
+        room = Room.objects.create(hotel=lake, room_number='101', room_type='single', price_per_night=80, capacity=1)
+        self.book(room, 0, 3)
+        _, totals = self.report()
+        self.assertEqual((totals[0]['rooms'], totals[0]['nights']), (2 * 3, 3))
+        _, totals = analytics.report(self.today, self.today + timedelta(days=3), hotel=lake)
+        self.assertEqual((totals[0]['rooms'], totals[0]['nights'], totals[0]['revenue']), (3, 3, 240))
+
+    def test_staff_view(self):
+        from django.contrib.auth import get_user_model
+
+        url = '/staff/analytics/'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(get_user_model().objects.create_user('staff', password='pw', is_staff=True))
+        response = self.client.get(url, {'start': self.today.isoformat(), 'by': 'channel'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['by'], len(data['days'])), ('channel', 4))
+        response = self.client.get(url, {'start': self.today.isoformat(), 'end': self.today.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+
+class PricingTest(TestCase):
+    def setUp(self):
+        from .models import RatePlan
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest = Guest.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+            self.single = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+            self.double = Room.objects.create(room_number='102', room_type='double', price_per_night=90, capacity=2)
+            self.plan = RatePlan.objects.create(name='Standard')
+        # A Friday well ahead, in a month of its own.
+        month = (date.today() + timedelta(days=70)).replace(day=1)
+        self.friday = month + timedelta(days=(4 - month.weekday()) % 7)
+
+    def rule(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.plan.rules.create(**fields)
+
+    def search(self, check_in, nights):
+        return self.client.get('/rooms/', {
+            'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=nights)).isoformat(),
+        })
+
+    def test_stay_total_applies_rules_in_order(self):
+        self.rule(room_type='double', weekdays='67', value=50)  # weekends +50%
+        self.rule(min_occupancy=100, adjustment='amount', value=25)
+        self.rule(adjustment='amount', value=-10)
+        # Friday to Monday: 80, 125, 125 for the double; 90 a night for the single.
+        response = self.search(self.friday, 3)
+        totals = [(room.room_number, room.stay_total) for room in response.context['rooms']]
+        self.assertEqual(totals, [('101', 270), ('102', 330)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(
+                room=self.single, guest=self.guest, check_in_date=self.friday,
+                check_out_date=self.friday + timedelta(days=2),
+            )
+        self.assertEqual(sorted(booking.nights.values_list('rate', flat=True)), [90, 90])
+        # The single is fully booked that weekend now, the double is not.
+        from .pricing import RateTable
+
+        table = RateTable.load(self.friday, self.friday + timedelta(days=3))
+        self.assertEqual(table.rates('single', 100, self.friday, self.friday + timedelta(days=3)), [115, 115, 90])
+        self.assertEqual(table.rates('double', 90, self.friday, self.friday + timedelta(days=3)), [80, 125, 125])
+
+    def test_rule_changes_reprice_only_their_months(self):
+        later = self.friday + timedelta(days=35)
+        self.search(self.friday, 2)
+        self.search(later, 2)
+        rule = self.rule(start_date=self.friday, end_date=self.friday + timedelta(days=1), value=10)
+        with self.assertNumQueries(0):
+            self.search(later, 2)
+        # The double first: 99 + 90.
+        response = self.search(self.friday, 2)
+        self.assertEqual(response.context['rooms'][0].stay_total, 189)
+
+        # Moving the rule reprices its old and new months.
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.start_date, rule.end_date = later, later + timedelta(days=1)
+            rule.save()
+        self.assertEqual(self.search(self.friday, 2).context['rooms'][0].stay_total, 180)
+        self.assertEqual(self.search(later, 2).context['rooms'][0].stay_total, 189)
+
+    def test_occupancy_is_per_hotel(self):
+        from .models import Hotel
+        from .pricing import RateTable
+
+        self.rule(min_occupancy=100, adjustment='amount', value=25)
+        lake = Hotel.objects.create(name='Lake', slug='lake')
+        with self.captureOnCommitCallbacks(execute=True):
+            room = Room.objects.create(hotel=lake, room_number='101', room_type='single', price_per_night=80, capacity=1)
+            Booking.objects.create(
+                room=room, guest=self.guest, check_in_date=self.friday, check_out_date=self.friday + timedelta(days=1),
+            )
+        nights = (self.friday, self.friday + timedelta(days=1))
+        self.assertEqual(RateTable.load(*nights, lake.pk).rates('single', 80, *nights), [105])
+        self.assertEqual(RateTable.load(*nights).rates('single', 100, *nights), [100])
+        self.assertEqual(self.search(self.friday, 1).context['rooms'][0].stay_total, 90)
+
+
+class RoomSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rooms = {
+            number: Room.objects.create(
+                room_number=number, room_type=room_type, capacity=capacity, price_per_night=100,
+                description=description,
+            )
+            for number, room_type, capacity, description in [
+                ('101', 'single', 1, 'Quiet room with a garden view'),
+                ('102', 'double', 2, 'Sea view, balcony'),
+                ('201', 'suite', 4, 'Sea view suite with a sea-facing terrace and a balcony'),
+                ('202', 'family', 5, 'Номер з видом на море'),
+            ]
+        }
+
+    def search(self, **params):
+        response = self.client.get('/rooms/', params)
+        return [room.room_number for room in response.context['rooms']]
+
+    def test_ranks_matches_and_applies_filters(self):
+        # The shorter description is the closer match.
+        self.assertEqual(self.search(q='sea view'), ['102', '201'])
+        self.assertEqual(self.search(q='sea view', min_capacity=3), ['201'])
+        self.assertEqual(sorted(self.search(q='balc')), ['102', '201'])
+        self.assertEqual(self.search(q='МОРЕ'), ['202'])
+        self.assertEqual(self.search(q='suite'), ['201'])
+        self.assertEqual(self.search(q='"*'), ['101', '102', '201', '202'])
+
+    def test_document_follows_room_writes(self):
+        room = self.rooms['101']
+        room.description = 'Sea view loft'
+        room.save()
+        Room.objects.filter(pk=self.rooms['102'].pk).delete()
+        Room.objects.bulk_create([Room(hotel=room.hotel, room_number='301', room_type='single', capacity=1,
+                                       price_per_night=90, description='Sea view')])
+        self.assertEqual(sorted(self.search(q='sea view')), ['101', '201', '301'])
+
+    def test_pages_follow_rank(self):
+        for n in range(12):
+            Room.objects.create(
+                room_number=f'3{n:02d}', room_type='double', capacity=2, price_per_night=100,
+                description='Sea view ' + 'sea ' * (n % 3),
+            )
+        numbers, params = [], {'q': 'sea', 'limit': 5}
+        while True:
+            data = self.client.get('/api/rooms/', params).json()
+            numbers += [row['room_number'] for row in data['results']]
+            ranks = [row['search_rank'] for row in data['results']]
+            self.assertEqual(ranks, sorted(ranks))
+            if not data['after']:
+                break
+            params['after'] = data['after']
+        self.assertEqual(sorted(numbers), sorted(['102', '201', *(f'3{n:02d}' for n in range(12))]))
+
+
+class HotelsTest(TestCase):
+    def setUp(self):
+        from .models import Hotel
+
+        cache.clear()
+        self.guest = Guest.objects.create(first_name='Jane', last_name='Doe', email='jane@example.com', phone='555')
+        self.main = Room.objects.create(room_number='101', room_type='single', price_per_night=100, capacity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lake = Hotel.objects.create(name='Lake', slug='lake')
+        # The same number at another hotel.
+        self.room = Room.objects.create(
+            hotel=self.lake, room_number='101', room_type='double', price_per_night=150, capacity=2,
+        )
+
+    def test_views_are_scoped_to_the_hotel_in_the_url(self):
+        # The hotel once, then the room.
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/hotels/lake/rooms/{self.room.pk}/')
+        self.assertContains(response, 'double')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(f'/hotels/lake/rooms/{self.main.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/rooms/{self.room.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/hotels/nowhere/rooms/').status_code, 404)
+
+        response = self.client.get('/hotels/lake/rooms/')
+        self.assertEqual(list(response.context['rooms']), [self.room])
+        # Links stay within the hotel.
+        self.assertContains(response, f'href="/hotels/lake/rooms/{self.room.pk}/"')
+        self.assertEqual(list(self.client.get('/rooms/').context['rooms']), [self.main])
+
+    def test_booking_belongs_to_the_room_hotel(self):
+        check_in = date.today() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/hotels/lake/rooms/{self.room.pk}/book/', {
+                'first_name': 'Jane', 'last_name': 'Doe', 'email': 'jane@example.com', 'phone': '555',
+                'check_in_date': check_in.isoformat(),
+                'check_out_date': (check_in + timedelta(days=1)).isoformat(),
+            })
+        self.assertRedirects(response, '/hotels/lake/bookings/', fetch_redirect_response=False)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.hotel, self.lake)
+        self.assertEqual(len(self.client.get('/hotels/lake/bookings/', {'phone': '555'}).context['bookings']), 1)
+        self.assertEqual(len(self.client.get('/bookings/', {'phone': '555'}).context['bookings']), 0)
+        self.assertEqual(self.client.get(f'/bookings/{booking.pk}/').status_code, 404)
+
+    def test_registry_follows_hotel_changes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_hotel('lake'), self.lake)
+        with self.assertNumQueries(0):
+            get_hotel('lake')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lake.delete()
+        with self.assertRaises(Http404):
+            get_hotel('lake')
+
+    @override_settings(HOTEL_DATABASES={'lake': 'hotel_lake'})
+    def test_hotel_database_routing(self):
+        from django.contrib.auth import get_user_model
+        from .tenants import HotelRouter, activate, make_cache_key
+
+        router = HotelRouter()
+        self.assertEqual(router.db_for_write(Room), 'default')
+        self.assertEqual(make_cache_key('k', '', 1), ':1:k')
+        with activate('lake'):
+            self.assertEqual(router.db_for_read(Booking), 'hotel_lake')
+            # Loaded objects stay with their database.
+            self.assertEqual(router.db_for_write(Room, instance=self.main), 'default')
+            self.assertEqual(make_cache_key('k', '', 1), ':1:hotel_lake:k')
+        self.assertIsNone(router.db_for_read(get_user_model()))
+
+
+class WarmUpTest(SimpleTestCase):
+    # SimpleTestCase fails on any query: the warm-up runs before gunicorn
+    # forks, where a connection would end up shared by the workers.
+    def test_compiles_templates_without_queries(self):
+        from django.template import engines
+        from .warmup import warm_up
+
+        self.assertGreater(warm_up(), 0)
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIn('rooms/room_list.html', loader.get_template_cache)
+        self.assertIn('bookings/confirmation_email.txt', loader.get_template_cache)
@@ -5,6 +5,17 @@ from .views.booking import (
     BookingCancelView, BookingLoginView,
 )
 from hotel.views.home import HotelHomeView
+from hotel.views import api
+from django.conf import settings
+
+if settings.HOTEL_ASYNC_VIEWS:
+    from hotel.views import asynchronous
+    RoomListView, RoomDetailView, BookingListView = (
+        asynchronous.RoomListView, asynchronous.RoomDetailView, asynchronous.BookingListView,
+    )
+    api_room_search, api_room_periods = asynchronous.room_search, asynchronous.room_periods
+else:
+    api_room_search, api_room_periods = api.room_search, api.room_periods
 
 urlpatterns = [
     path('', HotelHomeView.as_view(), name='index'),
@@ -17,4 +28,19 @@ urlpatterns = [
     path('bookings/', BookingListView.as_view(), name='booking_list'),
     path('bookings/<int:pk>/', BookingDetailView.as_view(), name='booking_detail'),
     path('bookings/login/', BookingLoginView.as_view(), name='booking_login'),
+    path('api/rooms/', api_room_search, name='api_room_search'),
+    path('api/rooms/<int:pk>/periods/', api_room_periods, name='api_room_periods'),
+    path('api/bookings/', api.guest_bookings, name='api_guest_bookings'),
 ]
+
+if not settings.HOTEL_PUBLIC_SITE:
+    from hotel.views.hotel import HotelCreateView, HotelDeleteView, HotelUpdateView
+    from hotel.views.staff import analytics_view, availability_index_view, metrics_view
+    urlpatterns += [
+        path('staff/metrics/', metrics_view, name='staff_metrics'),
+        path('staff/analytics/', analytics_view, name='staff_analytics'),
+        path('staff/availability-index/', availability_index_view, name='staff_availability_index'),
+        path('staff/hotels/add/', HotelCreateView.as_view(), name='hotel_create'),
+        path('staff/hotels/<slug:slug>/edit/', HotelUpdateView.as_view(), name='hotel_update'),
+        path('staff/hotels/<slug:slug>/delete/', HotelDeleteView.as_view(), name='hotel_delete'),
+    ]
@@ -0,0 +1,173 @@
+"""
+Read-only JSON API for channel managers.
+
+Rows are serialized straight from ``.values()``. Every response carries a
+strong ETag built from the version counters in ``hotel/cache.py``, so a
+client polling with ``If-None-Match`` gets ``304 Not Modified`` before any
+search query runs.
+"""
+import hashlib
+from datetime import date
+
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_safe
+
+from ..cache import (
+    availability_version, guest_version, normalized_params, room_search_dependencies, versions,
+)
+from ..filters import RoomFilter, search_order
+from ..models import Booking, Guest, Room
+from ..pagination import InvalidPageToken, after_filter, decode_token, encode_token
+from ..phones import normalize_phone
+from ..profiling import query_budget
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_PERIOD_DAYS = 365
+
+ROOM_FIELDS = ('id', 'room_number', 'room_type', 'capacity', 'price_per_night', 'description')
+ROOM_SEARCH_PARAMS = [*RoomFilter.base_filters, 'available', 'after', 'limit']
+BOOKING_FIELDS = (
+    'id', 'room_id', 'room__room_number', 'check_in_date', 'check_out_date', 'status', 'booking_channel',
+)
+BOOKING_PARAMS = ['phone', 'after', 'limit']
+
+
+def compact_json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={'separators': (',', ':')})
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def int_param(request, name, default, maximum):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        value = default
+    return min(max(value, 1), maximum)
+
+
+def invalid_token_response():
+    return compact_json({'errors': {'after': ["Invalid page token."]}}, status=400)
+
+
+def keyset_query(request, queryset, keyset):
+    """``queryset`` ordered on ``keyset`` from after the request's ``after``
+    token, and the page size. Raises InvalidPageToken for a token that
+    does not fit ``keyset``."""
+    queryset = queryset.order_by(*keyset)
+    after = request.GET.get('after')
+    if after:
+        queryset = queryset.filter(after_filter(keyset, decode_token(after, queryset, keyset)))
+    return queryset, int_param(request, 'limit', PAGE_SIZE, MAX_PAGE_SIZE)
+
+
+def page_rows(rows, limit, keyset):
+    """The page in ``rows`` (fetched with ``limit + 1``) and the token for
+    the next page (or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_token([rows[-1][field.lstrip('-')] for field in keyset])
+
+
+def keyset_page(request, queryset, keyset, fields):
+    """One page of ``queryset.values(*fields)`` after the request's
+    ``after`` token, and the token for the next page (or None)."""
+    queryset, limit = keyset_query(request, queryset, keyset)
+    return page_rows(list(queryset.values(*fields)[:limit + 1]), limit, keyset)
+
+
+async def akeyset_page(request, queryset, keyset, fields):
+    """``keyset_page()`` with the async ORM."""
+    queryset, limit = keyset_query(request, queryset, keyset)
+    return page_rows([row async for row in queryset.values(*fields)[:limit + 1]], limit, keyset)
+
+
+def room_search_etag(request):
+    if not RoomFilter(request.GET).is_valid():
+        return None
+    dependencies = room_search_dependencies(request.GET)
+    if dependencies is None:
+        return None
+    params = normalized_params(request.GET, ROOM_SEARCH_PARAMS)
+    return make_etag(request.path, params, versions(dependencies))
+
+
+# The page and, unless cached, the hotel and the rate table's rules and
+# occupancy.
+@query_budget(5)
+@require_safe
+@condition(etag_func=room_search_etag)
+def room_search(request):
+    filterset = RoomFilter(request.GET, queryset=Room.objects.filter(hotel=request.hotel))
+    if not filterset.is_valid():
+        return compact_json({'errors': filterset.errors}, status=400)
+    try:
+        rows, after = keyset_page(request, *room_search_query(request, filterset))
+    except InvalidPageToken:
+        return invalid_token_response()
+    return compact_json({'results': rows, 'after': after})
+
+
+def room_search_query(request, filterset):
+    """The queryset, keyset and fields of a valid room search."""
+    queryset = filterset.qs
+    if request.GET.get('available') == 'true':
+        queryset = queryset.available()
+    order = search_order(queryset)
+    return queryset, (*order, 'room_number', 'id'), ROOM_FIELDS + order
+
+
+def room_periods_etag(request, pk):
+    days = int_param(request, 'days', 30, MAX_PERIOD_DAYS)
+    # Periods start today, so they go stale at midnight as well.
+    return make_etag(request.path, days, date.today(), versions([availability_version(pk)]))
+
+
+# The room, its bookings and, unless cached, the hotel.
+@query_budget(3)
+@require_safe
+@condition(etag_func=room_periods_etag)
+def room_periods(request, pk):
+    days = int_param(request, 'days', 30, MAX_PERIOD_DAYS)
+    return periods_response(pk, Room.objects.filter(pk=pk, hotel=request.hotel).available_periods(days))
+
+
+def periods_response(pk, periods):
+    if pk not in periods:
+        raise Http404("No room found matching the query.")
+    return compact_json({
+        'room': pk,
+        'periods': [{'start': start, 'end': end} for start, end in periods[pk]],
+    })
+
+
+def guest_bookings_etag(request):
+    phone = normalize_phone(request.GET.get('phone'))
+    if not phone:
+        return None
+    guest_ids = list(Guest.objects.filter(phone_normalized=phone).order_by('pk').values_list('pk', flat=True))
+    params = normalized_params(request.GET, BOOKING_PARAMS)
+    # Rows carry their room's number, which the guest counters miss a
+    # change of: any room write bumps ``catalogue``.
+    dependencies = ['catalogue', *map(guest_version, guest_ids)]
+    return make_etag(request.path, params, guest_ids, versions(dependencies))
+
+
+# The ETag's guests, the page and, unless cached, the hotel.
+@query_budget(3)
+@require_safe
+@condition(etag_func=guest_bookings_etag)
+def guest_bookings(request):
+    phone = normalize_phone(request.GET.get('phone'))
+    if not phone:
+        return compact_json({'errors': {'phone': ["Enter a valid phone number."]}}, status=400)
+    queryset = Booking.objects.for_phone(request.hotel, phone)
+    try:
+        rows, after = keyset_page(request, queryset, ('-check_in_date', '-id'), BOOKING_FIELDS)
+    except InvalidPageToken:
+        return invalid_token_response()
+    return compact_json({'results': rows, 'after': after})
@@ -0,0 +1,82 @@
+"""
+Async versions of the read-heavy pages and API endpoints.
+
+``hotel/urls.py`` routes to these instead of the sync views when
+``HOTEL_ASYNC_VIEWS`` is set, as ``HotelApp/asgi.py`` does. Each fetches its
+rows with the async ORM (``aget()``, ``acount()``, ``async for``) before
+rendering; filters, keysets, query budgets, the page cache and ETags are the
+sync views'. Booking writes stay sync views.
+
+Querysets are built in sync code, as stay searches read the rate table
+(``hotel/pricing.py``) to price them. ``HotelMiddleware`` looks up
+``request.hotel`` before async views run.
+
+Django runs every ORM query of a worker in one thread, so async views do not
+make queries concurrent: they let the worker's event loop take new requests,
+look up cached pages and write responses while a query runs.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.views.decorators.http import condition, require_safe
+
+from ..cache import AsyncCachedPageMixin
+from ..filters import RoomFilter
+from ..models import Room
+from ..pagination import InvalidPageToken
+from ..profiling import query_budget
+from . import api, booking, room
+
+
+class AsyncListMixin:
+    """Fetches the ``KeysetPaginationMixin`` page with the async ORM before
+    ``ListView`` builds its context."""
+
+    async def get_page(self, request, *args, **kwargs):
+        self.object_list = await sync_to_async(self.get_queryset)()
+        self.page = await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        return self.render_to_response(self.get_context_data())
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.page
+
+
+class RoomListView(AsyncCachedPageMixin, AsyncListMixin, room.RoomListView):
+    pass
+
+
+class RoomDetailView(AsyncCachedPageMixin, room.RoomDetailView):
+    async def get_page(self, request, *args, **kwargs):
+        try:
+            self.object = await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except Room.DoesNotExist:
+            raise Http404("No room found matching the query.")
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class BookingListView(AsyncListMixin, booking.BookingListView):
+    async def get(self, request, *args, **kwargs):
+        return await self.get_page(request, *args, **kwargs)
+
+
+@query_budget(5)
+@require_safe
+@condition(etag_func=api.room_search_etag)
+async def room_search(request):
+    filterset = RoomFilter(request.GET, queryset=Room.objects.filter(hotel=request.hotel))
+    if not filterset.is_valid():
+        return api.compact_json({'errors': filterset.errors}, status=400)
+    query = await sync_to_async(api.room_search_query)(request, filterset)
+    try:
+        rows, after = await api.akeyset_page(request, *query)
+    except InvalidPageToken:
+        return api.invalid_token_response()
+    return api.compact_json({'results': rows, 'after': after})
+
+
+@query_budget(3)
+@require_safe
+@condition(etag_func=api.room_periods_etag)
+async def room_periods(request, pk):
+    days = api.int_param(request, 'days', 30, api.MAX_PERIOD_DAYS)
+    rooms = Room.objects.filter(pk=pk, hotel=request.hotel)
+    return api.periods_response(pk, await rooms.aavailable_periods(days))
@@ -1,12 +1,18 @@
 from django.shortcuts import render, get_object_or_404
+from django.utils.functional import cached_property
 from django.views.generic import ListView, DetailView, View
 from django.views.generic.edit import CreateView
 from django.views.generic.edit import DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.http import urlencode
 from django.http import HttpResponseRedirect
 from django.contrib import messages
-from ..models import Booking, Room, Guest
+from .. import jobs
+from ..models import Booking, Room, Guest, RoomUnavailable
+from ..pagination import KeysetPaginationMixin
+from ..phones import normalize_phone
 from ..forms import BookingForm
+from ..tenants import HotelQuerysetMixin
 from django.views.generic.edit import FormView
 from ..forms import PhoneLoginForm
 
@@ -16,27 +22,37 @@ class BookingLoginView(FormView):
     form_class = PhoneLoginForm
 
     def form_valid(self, form):
-        phone = form.cleaned_data['phone']
-        return HttpResponseRedirect(f"/bookings/?phone={phone}")
+        query = urlencode({'phone': form.cleaned_data['phone']})
+        return HttpResponseRedirect(f"{reverse('booking_list')}?{query}")
 
-class BookingListView(ListView):
+class BookingListView(KeysetPaginationMixin, ListView):
     model = Booking
     template_name = 'bookings/booking_list.html'
     context_object_name = 'bookings'
     paginate_by = 10
+    keyset = ('-check_in_date', '-pk')
+    # The page has no "N found" line, so skip the count query.
+    count_limit = None
+    # The page and, unless cached, the hotel.
+    query_budget = 2
 
     def get_queryset(self):
-        phone = self.request.GET.get('phone')
+        phone = normalize_phone(self.request.GET.get('phone'))
         if phone:
-            return Booking.objects.filter(guest__phone=phone).select_related('room', 'guest').order_by('-check_in_date')
+            bookings = Booking.objects.for_phone(self.request.hotel, phone)
+            return bookings.select_related('room', 'guest').only(
+                'check_in_date', 'status', 'room__room_number', 'guest__first_name', 'guest__last_name',
+            )
         return Booking.objects.none()
 
-class BookingDetailView(DetailView):
-    model = Booking
+class BookingDetailView(HotelQuerysetMixin, DetailView):
+    queryset = Booking.objects.select_related('room', 'guest')
     template_name = 'bookings/booking_detail.html'
     context_object_name = 'booking'
+    # The booking and, unless cached, the hotel.
+    query_budget = 2
 
-class BookingCancelView(DeleteView):
+class BookingCancelView(HotelQuerysetMixin, DeleteView):
     model = Booking
     template_name = 'bookings/confirm_cancel.html'  
     success_url = reverse_lazy('booking_list') 
@@ -45,35 +61,56 @@ class BookingCreateView(CreateView):
     form_class = BookingForm
     template_name = 'bookings/book.html'
     success_url = reverse_lazy('booking_list')
+    # Room, available periods and, when posted, the form's overlap check,
+    # BookingQuerySet.reserve()'s six statements, the confirmation job,
+    # with HOTEL_QUEUE_CACHE_INVALIDATION the cache job (stored with the
+    # guest, updated with the booking) and, unless cached, the hotel and the
+    # rate table's rules and occupancy.
+    query_budget = 15
 
     def dispatch(self, request, *args, **kwargs):
-        self.room = get_object_or_404(Room, pk=self.kwargs['pk'])
+        self.room = get_object_or_404(Room, pk=self.kwargs['pk'], hotel=request.hotel)
         return super().dispatch(request, *args, **kwargs)
 
+    @cached_property
+    def available_periods(self):
+        return self.room.get_available_periods()
+
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['room'] = self.room
+        kwargs['available_periods'] = self.available_periods
         return kwargs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['room'] = self.room
-        context['available_periods'] = self.room.get_available_periods()
+        context['available_periods'] = self.available_periods
         return context
 
+    def send_confirmation(self, booking):
+        # Queued with the booking; the worker sends it after the response.
+        jobs.enqueue('booking.confirmation', {'booking': booking.pk}, key=f'booking.confirmation:{booking.pk}')
+
     def form_valid(self, form):
-        guest, created = Guest.objects.get_or_create(
+        guest = Guest(
             email=form.cleaned_data['email'],
-            defaults={
-                'first_name': form.cleaned_data['first_name'],
-                'last_name': form.cleaned_data['last_name'],
-                'phone': form.cleaned_data.get('phone')
-            }
+            first_name=form.cleaned_data['first_name'],
+            last_name=form.cleaned_data['last_name'],
+            phone=form.cleaned_data.get('phone') or None,
         )
-        booking = form.save(commit=False)
-        booking.room = self.room
-        booking.guest = guest
-        booking.status = 'confirmed'
-        booking.booking_channel = 'online'
-        booking.save()
-        return super().form_valid(form)
+        try:
+            self.object = Booking.objects.reserve(
+                self.room,
+                form.cleaned_data['check_in_date'],
+                form.cleaned_data['check_out_date'],
+                guest=guest,
+                status=Booking.BookingStatus.CONFIRMED,
+                booking_channel=Booking.BookingChannel.ONLINE,
+                notes=form.cleaned_data.get('notes'),
+                then=self.send_confirmation,
+            )
+        except RoomUnavailable:
+            form.add_error(None, "Room is not available for the selected dates.")
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
@@ -0,0 +1,48 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.generic.edit import CreateView, DeleteView, UpdateView
+
+from ..models import Hotel
+from ..tenants import activate
+
+
+class HotelFormMixin:
+    model = Hotel
+    fields = ['name', 'slug']
+    template_name = 'hotels/hotel_form.html'
+    form_title = None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['form_title'] = self.form_title
+        return context
+
+    def get_success_url(self):
+        return f"{self.request.META.get('SCRIPT_NAME', '')}/hotels/{self.object.slug}/"
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class HotelCreateView(HotelFormMixin, CreateView):
+    form_title = 'Add Hotel'
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class HotelUpdateView(HotelFormMixin, UpdateView):
+    form_title = 'Edit Hotel'
+
+    def dispatch(self, request, *args, **kwargs):
+        # A hotel with its own database keeps its row there.
+        with activate(kwargs['slug']):
+            return super().dispatch(request, *args, **kwargs)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class HotelDeleteView(DeleteView):
+    model = Hotel
+    template_name = 'hotels/hotel_confirm_delete.html'
+    success_url = reverse_lazy('index')
+
+    def dispatch(self, request, *args, **kwargs):
+        with activate(kwargs['slug']):
+            return super().dispatch(request, *args, **kwargs)
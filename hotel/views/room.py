@@ -2,20 +2,34 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView
 from django.contrib.admin.views.decorators import staff_member_required
 from django import forms
+from ..cache import CachedPageMixin, room_search_dependencies, room_version
 from ..models import Room
-from ..filters import RoomFilter
+from ..pagination import KeysetPaginationMixin
+from ..tenants import HotelQuerysetMixin
+from ..filters import RoomFilter, search_order
 from ..forms import RoomFilterForm
 
 class RoomForm(forms.ModelForm):
     class Meta:
         model = Room
-        fields = '__all__'
+        exclude = ['hotel']  # the current hotel's, see Room.save()
 
-class RoomListView(ListView):
+class RoomListView(CachedPageMixin, KeysetPaginationMixin, HotelQuerysetMixin, ListView):
     model = Room
     template_name = 'rooms/room_list.html'
     context_object_name = 'rooms'
     paginate_by = 10
+    keyset = ('room_number', 'pk')
+    # Capped count + page and, unless cached, the hotel and the rate table's
+    # rules and occupancy (hotel/pricing.py) for a stay search.
+    query_budget = 6
+    cache_params = [*RoomFilter.base_filters, 'available', 'after']
+
+    def get_keyset(self, queryset):
+        return (*search_order(queryset), *self.keyset)
+
+    def get_cache_dependencies(self):
+        return room_search_dependencies(self.request.GET)
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -23,7 +37,7 @@ class RoomListView(ListView):
         self.filterset = RoomFilter(data, queryset=qs)
 
         if self.request.GET.get('available') == 'true':
-            return [room for room in self.filterset.qs if room.is_available]
+            return self.filterset.qs.available()
 
         return self.filterset.qs
 
@@ -33,10 +47,15 @@ class RoomListView(ListView):
         context['filterset'] = self.filterset
         return context
 
-class RoomDetailView(DetailView):
+class RoomDetailView(CachedPageMixin, HotelQuerysetMixin, DetailView):
     model = Room
     template_name = 'rooms/room_detail.html'
     context_object_name = 'room'
+    # The room and, unless cached, the hotel.
+    query_budget = 2
+
+    def get_cache_dependencies(self):
+        return [room_version(self.kwargs['pk'])]
 
 @staff_member_required
 def add_room(request):
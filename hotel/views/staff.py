@@ -0,0 +1,41 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+from .. import analytics, metrics
+from ..availability import get_index
+from ..forms import AnalyticsForm
+from ..profiling import query_budget
+
+
+@staff_member_required
+def metrics_view(request):
+    return JsonResponse(metrics.snapshot())
+
+
+# Session and user, and the active bookings.
+@query_budget(3)
+@staff_member_required
+def availability_index_view(request):
+    """Differences between the availability index of the worker serving the
+    request, as its commit hooks kept it, and the bookings in the database:
+    writes whose refresh it missed. ``loaded`` is false while the worker has
+    no index (``HOTEL_AVAILABILITY_INDEX`` off, or not used yet)."""
+    index = get_index(load=False)
+    if index is None:
+        return JsonResponse({'loaded': False, 'problems': []})
+    return JsonResponse({'loaded': True, 'problems': index.diff()})
+
+
+# Session and user, room counts and, unless cached, the hotel and the night
+# counts.
+@query_budget(5)
+@staff_member_required
+def analytics_view(request):
+    """Occupancy, ADR and RevPAR per day, optionally per room type or
+    channel, and for the whole range; see ``hotel/analytics.py``."""
+    form = AnalyticsForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    start, end, by = form.cleaned_data['start'], form.cleaned_data['end'], form.cleaned_data['by']
+    days, totals = analytics.report(start, end, by=by, hotel=request.hotel)
+    return JsonResponse({'start': start, 'end': end, 'by': by, 'totals': totals, 'days': days})
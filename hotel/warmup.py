@@ -0,0 +1,70 @@
+"""
+Work done once before gunicorn forks its workers.
+
+With ``preload_app`` (see ``gunicorn.conf.py``) the master process imports
+the project and ``warm_up()`` then does what every worker would otherwise
+do on its first requests: compile the templates into the cached loader,
+populate the URL resolver and build the forms and filtersets, with the form
+widget templates and translations they load. Workers inherit the result
+copy-on-write, so they share its memory and answer their first request as
+fast as their thousandth. ``HotelApp/wsgi.py`` and ``HotelApp/asgi.py`` call
+it when ``HOTEL_WARM_UP`` is on.
+
+Nothing here queries the database: a connection opened in the master would
+be shared by every worker.
+"""
+import os
+
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+
+def template_names(engine):
+    """The name of every template ``engine``'s loaders can find."""
+    names = set()
+    for loader in engine.template_loaders:
+        # The cached loader gives the directories of the loaders it wraps.
+        for directory in loader.get_dirs():
+            for root, _, files in os.walk(directory):
+                names.update(
+                    os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+                    for name in files
+                )
+    return sorted(names)
+
+
+def warm_up():
+    """Compile every template, resolve every URL name and render every form
+    once; returns the number of templates compiled."""
+    from .filters import RoomFilter
+    from .forms import AnalyticsForm, BookingForm, PhoneLoginForm, RoomFilterForm
+    from .models import Room
+
+    compiled = 0
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for name in template_names(engine):
+            try:
+                engine.get_template(name)
+            except TemplateSyntaxError:
+                # Alternatives for apps not installed, such as django_filters'
+                # crispy-forms templates: never rendered here.
+                continue
+            compiled += 1
+
+    # Fills the resolver's reverse dictionaries, which {% url %} and
+    # reverse() otherwise build on their first call.
+    get_resolver().reverse_dict
+
+    # Rendering loads the widget templates through the form renderer's own
+    # engine, and the translations of the labels and messages.
+    forms = [RoomFilterForm(), BookingForm(), PhoneLoginForm(), AnalyticsForm()]
+    forms.append(RoomFilter(queryset=Room.objects.none()).form)
+    for form in forms:
+        str(form)
+
+    connections.close_all()
+    return compiled
@@ -0,0 +1,14 @@
+#!/bin/sh
+# Run the test suite against a throwaway PostgreSQL cluster in a temp dir.
+# Needs initdb/pg_ctl on PATH (or PG_BIN) and psycopg installed.
+set -e
+
+PG_BIN=${PG_BIN:-$(dirname "$(command -v pg_ctl)")}
+PGDATA=$(mktemp -d)
+trap '"$PG_BIN/pg_ctl" -D "$PGDATA" -m immediate stop >/dev/null 2>&1; rm -rf "$PGDATA"' EXIT
+
+"$PG_BIN/initdb" -D "$PGDATA" -U hotel --auth=trust >/dev/null
+"$PG_BIN/pg_ctl" -D "$PGDATA" -w -l "$PGDATA/server.log" \
+    -o "-k $PGDATA -c listen_addresses='' -c fsync=off" start >/dev/null
+
+DATABASE_URL="postgres://hotel@/postgres?host=$PGDATA" python manage.py test "$@"